@@ -1,9 +1,23 @@
+import argparse
 import logging
+import time
+from collections import Counter
+from functools import partial
 from pathlib import Path
-from utils.extract_text import extract_elements
-from utils.title_detector import detect_title
-from utils.detect_headings import detect_heading_structure
-from utils.json_builder import build_outline_json
+from utils.extract_text import iter_page_elements, get_element_cache
+from utils.title_detector import detect_title, TITLE_WINDOW
+from utils.detect_headings import HeadingStructureBuilder
+from utils.json_builder import build_outline
+from utils.pipeline import (extract_outline_with_source, resolve_outline, pipeline_version, log_furniture,
+                            OUTLINE_MODES, DEFAULT_OUTLINE_MODE)
+from utils.pdf_backends import BACKENDS, DEFAULT_BACKEND
+from utils.batch import run_batch, DEFAULT_MAX_TASKS_PER_CHILD
+from utils.staged import run_staged, DEFAULT_BATCH_LINES, DEFAULT_MAX_WAIT
+from utils.sinks import open_sink, OUTPUT_FORMATS, DEFAULT_OUTPUT_FORMAT, DEFAULT_SHARD_RECORDS
+from utils.cache import file_digest
+from utils.deadline import Deadline, DEFAULT_DOC_BUDGET
+from utils import metrics
+from utils.manifest import Manifest, MANIFEST_NAME
 
 logging.basicConfig(
     level=logging.INFO,
@@ -11,21 +25,198 @@ logging.basicConfig(
     handlers=[logging.StreamHandler()]
 )
 
-def process_pdfs():
-    input_dir = Path("input")
-    output_dir = Path("output")
-    output_dir.mkdir(parents=True, exist_ok=True)
-
-    for pdf in input_dir.glob("*.pdf"):
-        logging.info(f"Processing: {pdf.name}")
-        try:
-            elements = extract_elements(pdf)
-            title = detect_title(elements, pdf)
-            outline = detect_heading_structure(elements)
-            build_outline_json(pdf, title, outline, output_dir)
-            logging.info(f"Successfully processed: {pdf.name}")
-        except Exception as e:
-            logging.error(f"Failed to process {pdf.name}: {e}", exc_info=True)
+def _finish_document(pdf, source, deadline, result):
+    # Count the document and hand back this process's metrics (None when
+    # metrics are off) so the parent can merge them across workers, with
+    # the outline for the parent to write.
+    metrics.count('documents')
+    metrics.count(f'source_{source}')
+    for step in deadline.degradations:
+        metrics.count(f'degradation_{step}')
+    if deadline.degradations:
+        stages = ", ".join(f"{name}={seconds:.2f}s" for name, seconds in deadline.stages.items())
+        logging.warning(f"{pdf.name} exceeded its time budget ({stages}); "
+                        f"applied {', '.join(deadline.degradations)}")
+    logging.info(f"Successfully processed: {pdf.name} ({source})")
+    return source, deadline.degradations, metrics.collect(), result
+
+def process_pdf(pdf, page_workers=1, use_cache=True, outline_mode=DEFAULT_OUTLINE_MODE,
+                doc_budget=DEFAULT_DOC_BUDGET, batch_expires_at=None, collect_metrics=False,
+                trace_memory=False, backend=DEFAULT_BACKEND):
+    logging.info(f"Processing: {pdf.name}")
+    if collect_metrics:
+        metrics.enable(trace_memory)
+    deadline = Deadline(doc_budget, batch_expires_at)
+    result, source = extract_outline_with_source(pdf, page_workers=page_workers, use_cache=use_cache,
+                                                 outline_mode=outline_mode, deadline=deadline,
+                                                 backend=backend)
+    return _finish_document(pdf, source, deadline, result)
+
+def process_pdf_streaming(pdf, outline_mode=DEFAULT_OUTLINE_MODE,
+                          doc_budget=DEFAULT_DOC_BUDGET, batch_expires_at=None, collect_metrics=False,
+                          trace_memory=False, backend=DEFAULT_BACKEND):
+    # Page-at-a-time variant of process_pdf: memory stays flat on very long
+    # documents because no page's lines are kept after they are consumed.
+    logging.info(f"Processing (streaming): {pdf.name}")
+    if collect_metrics:
+        metrics.enable(trace_memory)
+    deadline = Deadline(doc_budget, batch_expires_at)
+
+    def heuristic():
+        builder = HeadingStructureBuilder(deadline)
+        head = []
+        pages = iter_page_elements(pdf, backend)
+        while True:
+            # Extraction and detection interleave, so time each page's extraction
+            with deadline.stage('extract'):
+                lines = next(pages, None)
+            if lines is None:
+                break
+            if len(head) < TITLE_WINDOW:
+                head.extend(lines[:TITLE_WINDOW - len(head)])
+            builder.add_page(lines)
+        outline = builder.result()
+        log_furniture(pdf, outline)
+        return build_outline(detect_title(head, pdf), outline, deadline.degradations)
+
+    result, source = resolve_outline(pdf, heuristic, outline_mode)
+    return _finish_document(pdf, source, deadline, result)
+
+def process_pdfs(input_dir="input", output_dir="output", workers=1,
+                 max_tasks_per_child=DEFAULT_MAX_TASKS_PER_CHILD, page_workers=1, stream=False,
+                 use_cache=True, force=False, outline_mode=DEFAULT_OUTLINE_MODE,
+                 doc_budget=DEFAULT_DOC_BUDGET, batch_budget=None, metrics_json=None,
+                 metrics_prom=None, trace_memory=False, backend=DEFAULT_BACKEND, staged=False,
+                 batch_lines=DEFAULT_BATCH_LINES, batch_wait=DEFAULT_MAX_WAIT,
+                 output_format=DEFAULT_OUTPUT_FORMAT, shard_records=DEFAULT_SHARD_RECORDS, compress=False):
+    input_dir = Path(input_dir)
+    output_dir = Path(output_dir)
+    # Outlines are written here, in this process, as workers hand them back
+    sink = open_sink(output_format, output_dir, shard_records, compress)
+
+    # Only new, changed or previously failed documents are processed unless
+    # force is set; every attempt is recorded either way.
+    manifest = Manifest(output_dir / MANIFEST_NAME)
+    version = pipeline_version(outline_mode, backend, doc_budget, batch_budget)
+    digests = {pdf: file_digest(pdf) for pdf in input_dir.glob("*.pdf")}
+    pdf_files = [
+        pdf for pdf, digest in digests.items()
+        if force or manifest.needs_processing(pdf, digest, version, sink.has(pdf))
+    ]
+    if len(pdf_files) < len(digests):
+        logging.info(f"Skipping {len(digests) - len(pdf_files)} unchanged PDFs (use --force to redo)")
+    # Documents share the batch budget by wall-clock end time, so it also
+    # holds across worker processes.
+    batch_expires_at = time.time() + batch_budget if batch_budget is not None else None
+    collect_metrics = bool(metrics_json or metrics_prom)
+    run_metrics = metrics.Metrics(trace_memory) if collect_metrics else None
+    if collect_metrics:
+        # For this process's own spans (writing outlines)
+        metrics.enable(trace_memory)
+    options = dict(outline_mode=outline_mode, doc_budget=doc_budget,
+                   batch_expires_at=batch_expires_at, collect_metrics=collect_metrics,
+                   trace_memory=trace_memory, backend=backend)
+    if staged:
+        # Embedding and classification batched across documents; workers
+        # only extract
+        results = run_staged(pdf_files, workers=workers, use_cache=use_cache,
+                             outline_mode=outline_mode, backend=backend, batch_lines=batch_lines,
+                             max_wait=batch_wait, collect_metrics=collect_metrics,
+                             trace_memory=trace_memory)
+    else:
+        if stream:
+            task = partial(process_pdf_streaming, **options)
+        else:
+            task = partial(process_pdf, page_workers=page_workers, use_cache=use_cache, **options)
+        results = run_batch(pdf_files, task, workers=workers, max_tasks_per_child=max_tasks_per_child)
+    sources = Counter()
+    failed = degraded = 0
+    with sink:
+        for pdf, result, error, seconds in results:
+            if not error:
+                source, degradations, snapshot, outline = result
+                if run_metrics:
+                    run_metrics.merge(snapshot)
+                try:
+                    sink.write(pdf, outline)
+                except OSError as e:
+                    logging.error(f"Failed to write the outline of {pdf.name}: {e}")
+                    error = f"{type(e).__name__}: {e}"
+            if error:
+                failed += 1
+                status = 'failed'
+                if run_metrics:
+                    run_metrics.counters['documents_failed'] += 1
+            else:
+                sources[source] += 1
+                # Degraded outputs are redone once a budget changes
+                status = 'degraded' if degradations else 'ok'
+                degraded += bool(degradations)
+            manifest.record(pdf, digests[pdf], version, status, seconds, error)
+    manifest.compact()
+    if failed:
+        logging.warning(f"{failed} of {len(pdf_files)} PDFs failed")
+    if degraded:
+        logging.warning(f"{degraded} of {len(pdf_files)} PDFs were degraded to meet the time budget")
+    if run_metrics:
+        run_metrics.merge(metrics.collect())
+        run_metrics.write(metrics_json, metrics_prom)
+        logging.info(f"Metrics written to {', '.join(p for p in (metrics_json, metrics_prom) if p)}")
+    if pdf_files:
+        logging.info(f"Outline sources ({outline_mode}): {dict(sources)}; "
+                     f"{sources['bookmarks']} of {len(pdf_files)} PDFs took the bookmark fast path")
+    if workers <= 1 and use_cache and not stream:
+        # Pool workers keep their own counters; only the inline run reports here.
+        logging.info(f"Element cache: {get_element_cache().stats()}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract heading outlines from PDFs.")
+    parser.add_argument('--input_dir', default='input', help='Directory with input PDFs')
+    parser.add_argument('--output_dir', default='output', help='Directory for output JSONs')
+    parser.add_argument('--output_format', choices=OUTPUT_FORMATS, default=DEFAULT_OUTPUT_FORMAT,
+                        help='One JSON file per PDF, or compact records in rotating JSON-lines shards')
+    parser.add_argument('--shard_records', type=int, default=DEFAULT_SHARD_RECORDS,
+                        help='Documents per shard with --output_format jsonl')
+    parser.add_argument('--gzip', action='store_true', help='Gzip the shards of --output_format jsonl')
+    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes')
+    parser.add_argument('--max_tasks_per_child', type=int, default=DEFAULT_MAX_TASKS_PER_CHILD,
+                        help='Recycle each worker after this many PDFs')
+    parser.add_argument('--page_workers', type=int, default=1,
+                        help='Extract pages of long PDFs in this many processes (only with --workers 1)')
+    parser.add_argument('--stream', action='store_true',
+                        help='Process one page at a time to keep memory flat on very long PDFs')
+    parser.add_argument('--no_cache', action='store_true', help='Bypass the extracted-element cache')
+    parser.add_argument('--force', action='store_true',
+                        help='Reprocess every PDF, ignoring the processing manifest')
+    parser.add_argument('--outline_mode', choices=OUTLINE_MODES, default=DEFAULT_OUTLINE_MODE,
+                        help='Use embedded PDF bookmarks when sane, never, or both (verify)')
+    parser.add_argument('--doc_budget', type=float, default=DEFAULT_DOC_BUDGET,
+                        help='Seconds per document before cheaper modes are used (no limit by default)')
+    parser.add_argument('--batch_budget', type=float, default=None,
+                        help='Seconds for the whole batch (no limit by default)')
+    parser.add_argument('--metrics_json', help='Write per-stage timings and counters for the run as JSON')
+    parser.add_argument('--metrics_prom', help='Write the same metrics in Prometheus text format')
+    parser.add_argument('--trace_memory', action='store_true',
+                        help='Also record the peak traced Python memory (tracemalloc; slows the run)')
+    parser.add_argument('--staged', action='store_true',
+                        help='Batch embedding and classification across documents (many small PDFs); '
+                             '--workers then only extract, and time budgets do not apply')
+    parser.add_argument('--batch_lines', type=int, default=DEFAULT_BATCH_LINES,
+                        help='Lines per embedding/classifier batch with --staged')
+    parser.add_argument('--batch_wait_ms', type=float, default=DEFAULT_MAX_WAIT * 1000,
+                        help='Longest a document waits for its batch to fill with --staged')
+    parser.add_argument('--pdf_backend', choices=('auto',) + BACKENDS, default=DEFAULT_BACKEND,
+                        help='PDF text engine; pdfium (or auto, pdfium for long documents) is faster but approximate')
+    args = parser.parse_args()
+    process_pdfs(args.input_dir, args.output_dir, workers=args.workers,
+                 max_tasks_per_child=args.max_tasks_per_child, page_workers=args.page_workers,
+                 stream=args.stream, use_cache=not args.no_cache, force=args.force,
+                 outline_mode=args.outline_mode, doc_budget=args.doc_budget,
+                 batch_budget=args.batch_budget, metrics_json=args.metrics_json,
+                 metrics_prom=args.metrics_prom, trace_memory=args.trace_memory,
+                 backend=args.pdf_backend, staged=args.staged, batch_lines=args.batch_lines,
+                 batch_wait=args.batch_wait_ms / 1000, output_format=args.output_format,
+                 shard_records=args.shard_records, compress=args.gzip)
 
 if __name__ == "__main__":
-    process_pdfs()
+    main()
@@ -1,7 +1,12 @@
 import os
 import json
+import time
+from functools import partial
 from pathlib import Path
-from evaluate import evaluate, print_report
+
+import numpy as np
+
+from evaluate import evaluate, print_report, compute_metrics, extract_headings, load_json, LEVELS
 
 def find_pairs(pred_dir, gold_dir):
     pred_files = {f.stem: f for f in Path(pred_dir).glob('*.json')}
@@ -9,28 +14,168 @@ def find_pairs(pred_dir, gold_dir):
     pairs = [(pred_files[k], gold_files[k]) for k in pred_files if k in gold_files]
     return pairs
 
+def find_pdf_pairs(pdf_dir, gold_dir):
+    gold_files = {f.stem: f for f in Path(gold_dir).glob('*.json')}
+    return [(pdf, gold_files[pdf.stem]) for pdf in sorted(Path(pdf_dir).glob('*.pdf')) if pdf.stem in gold_files]
+
+def evaluate_pdf(pdf_file, gold_dir, pred_dir=None, use_cache=False, outline_mode=None, backend=None):
+    """Run the pipeline on one PDF, time it and score it against its gold JSON."""
+    from utils.pipeline import extract_outline, DEFAULT_OUTLINE_MODE
+    from utils.pdf_backends import DEFAULT_BACKEND
+    from utils.json_builder import write_json_atomic
+    start = time.perf_counter()
+    pred = extract_outline(pdf_file, use_cache=use_cache, outline_mode=outline_mode or DEFAULT_OUTLINE_MODE,
+                           backend=backend or DEFAULT_BACKEND)
+    latency = time.perf_counter() - start
+    if pred_dir:
+        write_json_atomic(Path(pred_dir) / f'{pdf_file.stem}.json', pred, indent=2)
+    gold = load_json(Path(gold_dir) / f'{pdf_file.stem}.json')
+    metrics = compute_metrics(extract_headings(pred), extract_headings(gold))
+    return {'latency_s': latency, 'metrics': metrics, 'degradations': pred.get('degradations', [])}
+
+def _prf(tp, fp, fn):
+    prec = tp / (tp + fp) if (tp + fp) > 0 else 0.0
+    rec = tp / (tp + fn) if (tp + fn) > 0 else 0.0
+    f1 = 2 * prec * rec / (prec + rec) if (prec + rec) > 0 else 0.0
+    return {'precision': prec, 'recall': rec, 'f1': f1, 'tp': tp, 'fp': fp, 'fn': fn}
+
+def aggregate(documents, wall_s=None):
+    """Micro (pooled counts) and macro (mean of F1s) aggregates plus latency stats."""
+    per_level = {}
+    for lvl in LEVELS:
+        counts = [sum(d['metrics'][lvl][k] for d in documents.values()) for k in ('tp', 'fp', 'fn')]
+        per_level[lvl] = _prf(*counts)
+    micro = _prf(*(sum(per_level[lvl][k] for lvl in LEVELS) for k in ('tp', 'fp', 'fn')))
+    summary = {
+        'files': len(documents),
+        'per_level': per_level,
+        'micro': micro,
+        'macro_f1': float(np.mean([per_level[lvl]['f1'] for lvl in LEVELS])),
+        'avg_macro_f1': float(np.mean([d['metrics']['macro_f1'] for d in documents.values()])) if documents else 0.0,
+    }
+    latencies = [d['latency_s'] for d in documents.values() if d.get('latency_s') is not None]
+    if latencies:
+        summary['latency_s'] = {
+            'p50': float(np.percentile(latencies, 50)),
+            'p95': float(np.percentile(latencies, 95)),
+            'max': float(np.max(latencies)),
+            'total': float(np.sum(latencies)),
+        }
+    if wall_s:
+        summary['wall_s'] = wall_s
+        summary['docs_per_s'] = len(documents) / wall_s
+    return summary
+
+def _delta(current, baseline):
+    if current is None or baseline is None:
+        return None
+    return {'baseline': baseline, 'current': current, 'delta': current - baseline}
+
+def diff_reports(report, baseline):
+    """Accuracy and latency/throughput changes against a baseline report."""
+    cur, old = report['summary'], baseline['summary']
+    diff = {
+        'macro_f1': _delta(cur['macro_f1'], old.get('macro_f1')),
+        'micro_f1': _delta(cur['micro']['f1'], old.get('micro', {}).get('f1')),
+        'per_level_f1': {lvl: _delta(cur['per_level'][lvl]['f1'], old.get('per_level', {}).get(lvl, {}).get('f1'))
+                         for lvl in LEVELS},
+        'latency_p50_s': _delta(cur.get('latency_s', {}).get('p50'), old.get('latency_s', {}).get('p50')),
+        'latency_p95_s': _delta(cur.get('latency_s', {}).get('p95'), old.get('latency_s', {}).get('p95')),
+        'docs_per_s': _delta(cur.get('docs_per_s'), old.get('docs_per_s')),
+        'documents': {},
+    }
+    for name, doc in report['documents'].items():
+        old_doc = baseline['documents'].get(name)
+        if old_doc is None:
+            diff['documents'][name] = 'new'
+            continue
+        f1 = doc['metrics']['macro_f1'] - old_doc['metrics']['macro_f1']
+        if f1:
+            diff['documents'][name] = {'macro_f1_delta': f1}
+    for name in baseline['documents']:
+        if name not in report['documents']:
+            diff['documents'][name] = 'missing'
+    return diff
+
+def print_diff(diff):
+    print('===== Change against baseline =====')
+    for key in ('macro_f1', 'micro_f1', 'latency_p50_s', 'latency_p95_s', 'docs_per_s'):
+        d = diff[key]
+        if d:
+            print(f"{key:>14}: {d['baseline']:.3f} -> {d['current']:.3f} ({d['delta']:+.3f})")
+    for lvl, d in diff['per_level_f1'].items():
+        if d and d['delta']:
+            print(f"{lvl + ' F1':>14}: {d['baseline']:.3f} -> {d['current']:.3f} ({d['delta']:+.3f})")
+    for name, change in sorted(diff['documents'].items()):
+        detail = change if isinstance(change, str) else f"macro-F1 {change['macro_f1_delta']:+.3f}"
+        print(f'  {name}: {detail}')
+    print('===================================')
+
 def main():
     import argparse
     parser = argparse.ArgumentParser(description='Batch evaluation of heading extraction.')
     parser.add_argument('--pred_dir', default='output', help='Directory with predicted JSONs')
     parser.add_argument('--gold_dir', default='gold', help='Directory with gold/reference JSONs')
+    parser.add_argument('--pdf_dir', default=None,
+                        help='Run the pipeline on these PDFs (timing each one) instead of reading --pred_dir')
+    parser.add_argument('--workers', type=int, default=1, help='Processes running the pipeline (with --pdf_dir)')
+    parser.add_argument('--use_cache', action='store_true',
+                        help='Allow cached elements (latency then excludes text extraction)')
+    parser.add_argument('--outline_mode', default=None, help='Outline mode passed to the pipeline')
+    parser.add_argument('--pdf_backend', default=None, help='PDF text engine passed to the pipeline')
+    parser.add_argument('--write_preds', action='store_true', help='Also write predictions to --pred_dir')
+    parser.add_argument('--baseline', default=None, help='Earlier --report to diff against')
     parser.add_argument('--report', default=None, help='Output metrics report as JSON')
+    parser.add_argument('--quiet', action='store_true', help='Skip the per-file reports')
     args = parser.parse_args()
 
-    pairs = find_pairs(args.pred_dir, args.gold_dir)
-    all_metrics = []
-    for pred, gold in pairs:
-        metrics, _ = evaluate(pred, gold)
-        print(f'File: {pred.name}')
-        print_report(metrics)
-        all_metrics.append(metrics)
-    # Compute average macro-F1
-    macro_f1s = [m['macro_f1'] for m in all_metrics]
-    avg_macro_f1 = sum(macro_f1s) / len(macro_f1s) if macro_f1s else 0.0
-    print(f'Average Macro-F1: {avg_macro_f1:.3f}')
+    documents = {}
+    wall_s = None
+    if args.pdf_dir:
+        from utils.batch import run_batch
+        pairs = find_pdf_pairs(args.pdf_dir, args.gold_dir)
+        if args.write_preds:
+            os.makedirs(args.pred_dir, exist_ok=True)
+        task = partial(evaluate_pdf, gold_dir=args.gold_dir,
+                       pred_dir=args.pred_dir if args.write_preds else None,
+                       use_cache=args.use_cache, outline_mode=args.outline_mode,
+                       backend=args.pdf_backend)
+        start = time.perf_counter()
+        for pdf, result, error, _ in run_batch([pdf for pdf, _ in pairs], task, workers=args.workers):
+            if error:
+                print(f'File: {pdf.name} failed: {error}')
+                continue
+            documents[pdf.name] = result
+        wall_s = time.perf_counter() - start
+    else:
+        for pred, gold in find_pairs(args.pred_dir, args.gold_dir):
+            metrics, _ = evaluate(pred, gold)
+            documents[pred.name] = {'latency_s': None, 'metrics': metrics}
+
+    for name in sorted(documents):
+        if not args.quiet:
+            latency = documents[name]['latency_s']
+            print(f'File: {name}' + (f' ({latency:.3f}s)' if latency is not None else ''))
+            print_report(documents[name]['metrics'])
+    summary = aggregate(documents, wall_s)
+    print(f"Average Macro-F1: {summary['avg_macro_f1']:.3f}")
+    print(f"Micro-F1: {summary['micro']['f1']:.3f}  Macro-F1 over levels: {summary['macro_f1']:.3f}")
+    if 'latency_s' in summary:
+        lat = summary['latency_s']
+        print(f"Latency: p50={lat['p50']:.3f}s p95={lat['p95']:.3f}s max={lat['max']:.3f}s"
+              + (f"  throughput={summary['docs_per_s']:.2f} docs/s" if wall_s else ''))
+
+    report = {'files': len(documents), 'avg_macro_f1': summary['avg_macro_f1'],
+              'summary': summary, 'documents': documents,
+              'all_metrics': [documents[name]['metrics'] for name in sorted(documents)]}
+    if args.baseline:
+        baseline = load_json(args.baseline)
+        report['baseline'] = args.baseline
+        report['baseline_diff'] = diff_reports(report, baseline)
+        print_diff(report['baseline_diff'])
     if args.report:
         with open(args.report, 'w', encoding='utf-8') as f:
-            json.dump({'files': len(all_metrics), 'avg_macro_f1': avg_macro_f1, 'all_metrics': all_metrics}, f, indent=2)
+            json.dump(report, f, indent=2)
 
 if __name__ == '__main__':
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from scipy.spatial.distance import cosine
+
+from utils.extract_text import extract_elements
+from utils.detect_headings import get_nlp, embed_texts, cosine_similarity
+
+def legacy_similarity(texts, candidates):
+    # Previous path: full pipeline per line, again per candidate, scipy per pair
+    nlp = get_nlp()
+    docs = [nlp(text) for text in texts]
+    avg_vector = sum(doc.vector for doc in docs) / len(docs)
+    return np.array([1 - cosine(nlp(text).vector, avg_vector) for text in candidates])
+
+def batched_similarity(texts, candidates):
+    vectors = embed_texts(texts)
+    avg_vector = vectors.mean(axis=0)
+    index = {t: i for i, t in enumerate(texts)}
+    return cosine_similarity(vectors[[index[t] for t in candidates]], avg_vector)
+
+def vector_difference(texts):
+    # Batched vectors (tagger, parser etc. disabled) against the full pipeline
+    nlp = get_nlp()
+    full = np.vstack([nlp(text).vector for text in texts])
+    return float(np.max(np.abs(embed_texts(texts) - full)))
+
+def best_of(fn, repeat):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark per-line vs batched spaCy embedding.')
+    parser.add_argument('--input_dir', default='input', help='Directory with PDFs')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per document (best is reported)')
+    parser.add_argument('--tolerance', type=float, default=1e-5,
+                        help='Largest allowed vector difference from the full pipeline')
+    args = parser.parse_args()
+
+    total_legacy = total_batched = 0.0
+    worst_vec_diff = 0.0
+    for pdf_file in sorted(Path(args.input_dir).glob('*.pdf')):
+        elements = extract_elements(pdf_file)
+        texts = [t.strip() for t in elements.texts if t.strip()]
+        if not texts:
+            continue
+        # Lines that pass the word-count filter reach the similarity check
+        candidates = [t for t in texts if 2 <= len(t.split()) <= 12]
+        t_legacy, legacy = best_of(lambda: legacy_similarity(texts, candidates), args.repeat)
+        t_batched, batched = best_of(lambda: batched_similarity(texts, candidates), args.repeat)
+        total_legacy += t_legacy
+        total_batched += t_batched
+        max_diff = float(np.nanmax(np.abs(legacy - batched))) if candidates else 0.0
+        vec_diff = vector_difference(texts)
+        worst_vec_diff = max(worst_vec_diff, vec_diff)
+        print(f'{pdf_file.name}: lines={len(texts)} candidates={len(candidates)} '
+              f'legacy={t_legacy:.3f}s batched={t_batched:.3f}s '
+              f'speedup={t_legacy / t_batched:.1f}x max_sim_diff={max_diff:.2e} '
+              f'max_vec_diff={vec_diff:.2e}')
+    if total_batched:
+        print(f'Total: legacy={total_legacy:.3f}s batched={total_batched:.3f}s '
+              f'speedup={total_legacy / total_batched:.1f}x max_vec_diff={worst_vec_diff:.2e}')
+    if worst_vec_diff > args.tolerance:
+        print(f'Batched vectors differ from the full pipeline by more than {args.tolerance:g}')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
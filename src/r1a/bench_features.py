@@ -0,0 +1,61 @@
+import argparse
+import time
+
+import numpy as np
+
+from utils.elements import DocumentElements
+from utils.extract_text import extract_elements
+from utils.features import extract_features
+
+def legacy_extract_features(elements, lang='en'):
+    # Previous per-line implementation, kept as the reference
+    features = []
+    for el in elements:
+        text = el['text']
+        if lang in ['ja', 'hi']:
+            cap_ratio = 0.0
+        else:
+            cap_ratio = sum(1 for c in text if c.isupper()) / (len(text) or 1)
+        num_pattern = 0
+        if any([text.strip().startswith(p) for p in ['1.', '1.1', '1.1.1', 'I.', 'A.']]):
+            num_pattern = 1
+        features.append([
+            el.get('font_size', 12.0), el.get('is_bold', 0), el.get('is_italic', 0), len(text),
+            cap_ratio, el.get('whitespace_above', 0), el.get('top', 0) / (el.get('page_height', 1) or 1),
+            num_pattern,
+        ])
+    return np.array(features)
+
+def synthetic_document(pdf_path, n_lines):
+    # Repeat a real document's lines until it has n_lines
+    base = extract_elements(pdf_path)
+    reps = -(-n_lines // len(base))
+    return DocumentElements.concat([base] * reps)[:n_lines]
+
+def best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description='Microbenchmark feature extraction.')
+    parser.add_argument('--pdf', default='input/E0H1CM114.pdf', help='PDF whose lines are repeated')
+    parser.add_argument('--lines', type=int, default=10000, help='Lines in the synthetic document')
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per implementation (best is reported)')
+    args = parser.parse_args()
+
+    elements = synthetic_document(args.pdf, args.lines)
+    records = elements.to_records()
+    assert np.array_equal(legacy_extract_features(records), extract_features(elements)), \
+        'vectorized features differ from the reference implementation'
+
+    t_legacy = best_of(lambda: legacy_extract_features(records), args.repeat)
+    t_vector = best_of(lambda: extract_features(elements), args.repeat)
+    print(f'{len(elements)} lines: legacy={t_legacy * 1000:.1f}ms vectorized={t_vector * 1000:.1f}ms '
+          f'speedup={t_legacy / t_vector:.1f}x')
+
+if __name__ == '__main__':
+    main()
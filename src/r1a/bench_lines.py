@@ -0,0 +1,90 @@
+import argparse
+import time
+from collections import Counter
+from pathlib import Path
+
+import pdfplumber
+
+from utils.elements import DocumentElements
+from utils.extract_text import _build_page_lines, _extract_page_lines_from_words
+from utils.detect_headings import detect_heading_structure
+
+def char_agreement(old, new):
+    # Share of non-space characters both builders produced, ignoring word
+    # breaks and line order
+    a = Counter(''.join(old.texts).replace(' ', ''))
+    b = Counter(''.join(new.texts).replace(' ', ''))
+    total = max(sum(a.values()), sum(b.values()))
+    return sum((a & b).values()) / total if total else 1.0
+
+def line_agreement(old, new):
+    # F1 over lines matched by page and text (spaces ignored), so lines one
+    # builder splits or merges where the other does not count against it
+    a = Counter(zip(old.page.tolist(), (t.replace(' ', '') for t in old.texts)))
+    b = Counter(zip(new.page.tolist(), (t.replace(' ', '') for t in new.texts)))
+    total = sum(a.values()) + sum(b.values())
+    return 2 * sum((a & b).values()) / total if total else 1.0
+
+def heading_f1(reference, candidate):
+    ref = {(' '.join(h['text'].split()), h['page']) for h in reference['headings']}
+    cand = {(' '.join(h['text'].split()), h['page']) for h in candidate['headings']}
+    if not ref and not cand:
+        return 1.0
+    tp = len(ref & cand)
+    return 2 * tp / (len(ref) + len(cand))
+
+def _extract_page_lines(page):
+    return _build_page_lines(page.chars, page.page_number)
+
+def time_builder(pages, builder, repeat):
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = DocumentElements.concat([builder(page) for page in pages])
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the character line builder with the word-grouping one.')
+    parser.add_argument('--input_dir', default='input', help='Directory with PDFs')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per builder (best is reported)')
+    parser.add_argument('--no_headings', action='store_true',
+                        help='Skip comparing detected headings (which loads spaCy)')
+    args = parser.parse_args()
+
+    totals = Counter()
+    agreement = Counter()
+    for pdf_file in sorted(Path(args.input_dir).glob('*.pdf')):
+        with pdfplumber.open(pdf_file) as pdf:
+            pages = pdf.pages
+            for page in pages:
+                # Parse characters up front so only line assembly is timed
+                page.chars
+            t_words, old = time_builder(pages, _extract_page_lines_from_words, args.repeat)
+            t_chars, new = time_builder(pages, _extract_page_lines, args.repeat)
+        totals['words'] += t_words
+        totals['chars'] += t_chars
+        totals['old_lines'] += len(old)
+        totals['new_lines'] += len(new)
+        line = (f'{pdf_file.name}: lines {len(old)} -> {len(new)}  '
+                f'words={t_words * 1000:.1f}ms chars={t_chars * 1000:.1f}ms '
+                f'speedup={t_words / t_chars:.1f}x  char_agreement={char_agreement(old, new):.3f}')
+        lines_f1 = line_agreement(old, new)
+        agreement['lines'] += lines_f1
+        line += f'  line_agreement={lines_f1:.3f}'
+        if not args.no_headings:
+            f1 = heading_f1(detect_heading_structure(old), detect_heading_structure(new))
+            agreement['headings'] += f1
+            line += f'  heading_f1={f1:.3f}'
+        agreement['documents'] += 1
+        print(line)
+    if totals['chars']:
+        print(f"Total: lines {totals['old_lines']} -> {totals['new_lines']}  "
+              f"words={totals['words'] * 1000:.1f}ms chars={totals['chars'] * 1000:.1f}ms "
+              f"speedup={totals['words'] / totals['chars']:.1f}x  "
+              f"mean line_agreement={agreement['lines'] / agreement['documents']:.3f}"
+              + ('' if args.no_headings else
+                 f"  mean heading_f1={agreement['headings'] / agreement['documents']:.3f}"))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,211 @@
+import argparse
+import json
+import multiprocessing
+import platform
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+from utils.synthetic_pdf import make_spec, write_corpus
+
+STAGES = ['extract_elements', 'detect_title', 'detect_language', 'furniture', 'embedding',
+          'classifier', 'headings', 'build_outline_json']
+
+# Deterministic corpora: page counts, heading density, font mixes,
+# multi-column layouts and non-Latin scripts.
+SUITES = {
+    'quick': [
+        make_spec('latin-1p', pages=1),
+        make_spec('latin-10p-mixed', pages=10, fonts='mixed'),
+        make_spec('latin-10p-dense', pages=10, heading_density=0.3),
+        make_spec('latin-30p-2col', pages=30, columns=2),
+        make_spec('cjk-10p', pages=10, script='cjk'),
+        make_spec('devanagari-10p', pages=10, script='devanagari'),
+    ],
+}
+SUITES['full'] = SUITES['quick'] + [
+    make_spec('latin-100p-3col', pages=100, columns=3, fonts='mixed'),
+    make_spec('cjk-100p-2col', pages=100, script='cjk', columns=2),
+    make_spec('latin-1000p', pages=1000, heading_density=0.05),
+]
+
+DEFAULT_CORPUS_DIR = '.cache/bench_corpus'
+DEFAULT_MAX_REGRESSION = 0.25
+# Stages faster than this are too noisy to gate on
+MIN_GATED_SECONDS = 0.01
+
+def timed(timings, stage, fn, *args, **kwargs):
+    start = time.perf_counter()
+    result = fn(*args, **kwargs)
+    timings[stage] = time.perf_counter() - start
+    return result
+
+def run_pipeline_once(pdf_path, out_dir):
+    """Run every stage once on pdf_path and return {stage: seconds}."""
+    from utils.extract_text import extract_elements
+    from utils.title_detector import detect_title
+    from utils.detect_headings import (detect_language, embed_texts, get_classifier,
+                                       HeadingStructureBuilder)
+    from utils.features import extract_features
+    from utils.furniture import furniture_mask
+    from utils.language import page_language
+    from utils.tree_model import predict_with_proba
+    from utils.json_builder import build_outline_json
+
+    timings = {}
+    elements = timed(timings, 'extract_elements', extract_elements, pdf_path, use_cache=False)
+    title = timed(timings, 'detect_title', detect_title, elements, pdf_path)
+    lang = timed(timings, 'detect_language', detect_language, elements)
+    furniture = timed(timings, 'furniture', furniture_mask, elements)
+    # As in detect_heading_structure: furniture is blanked, and blank lines
+    # are neither embedded nor classified
+    texts = ['' if f else t.strip() for t, f in zip(elements.texts, furniture.tolist())]
+    vectors = timed(timings, 'embedding', embed_texts, texts)
+    clf, label_map = get_classifier()
+    labels = probs = None
+
+    def classify():
+        # Page by page, as HeadingStructureBuilder does
+        labels, probs = ['O'] * len(elements), [1.0] * len(elements)
+        for start, stop in elements.page_bounds():
+            rows = np.flatnonzero([bool(t) for t in texts[start:stop]])
+            if not len(rows):
+                continue
+            page = elements[start:stop]
+            predicted, probas = predict_with_proba(clf, extract_features(page, page_language(page, lang))[rows])
+            for row, idx, prob in zip((rows + start).tolist(), predicted.tolist(), np.max(probas, axis=1).tolist()):
+                labels[row] = label_map.get(idx, 'O')
+                probs[row] = prob
+        return labels, probs
+    if clf is not None:
+        labels, probs = timed(timings, 'classifier', classify)
+
+    def headings():
+        # detect_heading_structure minus the stages timed above
+        builder = HeadingStructureBuilder(lang=lang)
+        for start, stop in elements.page_bounds():
+            builder.add_page(elements[start:stop], vectors[start:stop], furniture[start:stop],
+                             None if labels is None else (labels[start:stop], probs[start:stop]))
+        return builder.result()
+    outline = timed(timings, 'headings', headings)
+    timed(timings, 'build_outline_json', build_outline_json, pdf_path, title, outline, out_dir)
+    return timings, len(elements)
+
+def measure_document(pdf_path, runs):
+    """Time runs of the pipeline in this (fresh) worker and report peak RSS."""
+    from utils.detect_headings import warm_up
+    warm_up()
+    rss_after_load = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    samples = []
+    with tempfile.TemporaryDirectory() as out_dir:
+        for _ in range(runs):
+            timings, n_lines = run_pipeline_once(pdf_path, Path(out_dir))
+            samples.append(timings)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return {'samples': samples, 'lines': n_lines,
+            'peak_rss_mb': round(peak / scale, 1),
+            'peak_rss_over_models_mb': round((peak - rss_after_load) / scale, 1)}
+
+def summarize(spec, measured):
+    samples = measured['samples']
+    stages = {}
+    for stage in STAGES:
+        values = [s[stage] for s in samples if stage in s]
+        if values:
+            stages[stage] = {'p50': float(np.percentile(values, 50)), 'p95': float(np.percentile(values, 95))}
+    totals = [sum(s.values()) for s in samples]
+    p50 = float(np.percentile(totals, 50))
+    return {
+        'spec': spec,
+        'lines': measured['lines'],
+        'runs': len(samples),
+        'stages': stages,
+        'total': {'p50': p50, 'p95': float(np.percentile(totals, 95))},
+        'pages_per_s': spec['pages'] / p50 if p50 else None,
+        'peak_rss_mb': measured['peak_rss_mb'],
+        'peak_rss_over_models_mb': measured['peak_rss_over_models_mb'],
+    }
+
+def compare_to_baseline(results, baseline, max_regression):
+    """Return one message per p50 latency or peak memory that regressed past max_regression."""
+    regressions = []
+    old_docs = baseline.get('documents', {})
+    for name, doc in results['documents'].items():
+        old = old_docs.get(name)
+        if old is None:
+            continue
+        if old['spec'] != doc['spec']:
+            regressions.append(f'{name}: corpus spec changed; re-save the baseline')
+            continue
+        checks = [('total p50', old['total']['p50'], doc['total']['p50'])]
+        checks += [(f'{stage} p50', old['stages'][stage]['p50'], stats['p50'])
+                   for stage, stats in doc['stages'].items()
+                   if stage in old['stages'] and old['stages'][stage]['p50'] >= MIN_GATED_SECONDS]
+        checks.append(('peak RSS MB', old['peak_rss_mb'], doc['peak_rss_mb']))
+        for label, before, after in checks:
+            if before and after > before * (1 + max_regression):
+                regressions.append(f'{name}: {label} {before:.3f} -> {after:.3f} '
+                                   f'(+{(after / before - 1) * 100:.0f}%)')
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark each pipeline stage on a synthetic PDF corpus.')
+    parser.add_argument('--suite', choices=sorted(SUITES), default='quick', help='Corpus to generate and run')
+    parser.add_argument('--corpus_dir', default=DEFAULT_CORPUS_DIR, help='Where the synthetic PDFs are written')
+    parser.add_argument('--runs', type=int, default=3, help='Timed runs per document')
+    parser.add_argument('--output', default='bench_results.json', help='Where to write the results')
+    parser.add_argument('--baseline', help='Results JSON to compare against')
+    parser.add_argument('--max_regression', type=float, default=DEFAULT_MAX_REGRESSION,
+                        help='Fail if a p50 latency or peak memory grows by more than this fraction')
+    args = parser.parse_args()
+
+    specs = SUITES[args.suite]
+    paths = write_corpus(specs, args.corpus_dir)
+    documents = {}
+    # One fresh process per document, so peak RSS is that document's own
+    ctx = multiprocessing.get_context('spawn')
+    for spec, path in zip(specs, paths):
+        with ctx.Pool(1) as pool:
+            measured = pool.apply(measure_document, (str(path), args.runs))
+        doc = summarize(spec, measured)
+        documents[spec['name']] = doc
+        print(f"{spec['name']:>18}: {spec['pages']:>4} pages {doc['lines']:>6} lines  "
+              f"p50={doc['total']['p50']:.3f}s p95={doc['total']['p95']:.3f}s  "
+              f"{doc['pages_per_s']:.1f} pages/s  peak={doc['peak_rss_mb']:.0f}MB")
+        for stage, stats in doc['stages'].items():
+            print(f"{'':>20}{stage:>20}: p50={stats['p50'] * 1000:.1f}ms p95={stats['p95'] * 1000:.1f}ms")
+
+    total_pages = sum(spec['pages'] for spec in specs)
+    total_time = sum(doc['total']['p50'] for doc in documents.values())
+    results = {
+        'suite': args.suite,
+        'runs': args.runs,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'machine': {'python': platform.python_version(), 'platform': platform.platform(),
+                    'cpus': multiprocessing.cpu_count()},
+        'pages_per_s': total_pages / total_time if total_time else None,
+        'documents': documents,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f'Overall: {results["pages_per_s"]:.1f} pages/s; results written to {args.output}')
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare_to_baseline(results, baseline, args.max_regression)
+        if regressions:
+            print(f'Regressions against {args.baseline} (threshold {args.max_regression:.0%}):')
+            for message in regressions:
+                print(f'  {message}')
+            sys.exit(1)
+        print(f'No regressions against {args.baseline}')
+
+if __name__ == '__main__':
+    main()
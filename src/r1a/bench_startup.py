@@ -0,0 +1,68 @@
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+PHASES = ['import', 'warm_up', 'first_document', 'second_document']
+
+def measure_once(pdf_path, warm_up):
+    """Time one cold start in this (fresh) interpreter."""
+    timings = {}
+    start = time.perf_counter()
+    from utils.extract_text import extract_elements
+    from utils.title_detector import detect_title
+    from utils.detect_headings import detect_heading_structure, warm_up as load_models
+    from utils.json_builder import build_outline_json
+    timings['import'] = time.perf_counter() - start
+
+    if warm_up:
+        start = time.perf_counter()
+        load_models()
+        timings['warm_up'] = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        for phase in ['first_document', 'second_document']:
+            start = time.perf_counter()
+            elements = extract_elements(pdf_path, use_cache=False)
+            title = detect_title(elements, pdf_path)
+            outline = detect_heading_structure(elements)
+            build_outline_json(pdf_path, title, outline, Path(out_dir))
+            timings[phase] = time.perf_counter() - start
+    return timings
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure import time and first-document latency.')
+    parser.add_argument('--pdf', default='input/sample.pdf', help='PDF to process')
+    parser.add_argument('--runs', type=int, default=3, help='Cold starts to measure (median is reported)')
+    parser.add_argument('--warm_up', action='store_true', help='Call warm_up() before the first document')
+    parser.add_argument('--once', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.once:
+        print(json.dumps(measure_once(args.pdf, args.warm_up)))
+        return
+
+    runs = []
+    for _ in range(args.runs):
+        # A fresh interpreter per run so imports and model loads are really cold
+        cmd = [sys.executable, __file__, '--once', '--pdf', args.pdf]
+        if args.warm_up:
+            cmd.append('--warm_up')
+        start = time.perf_counter()
+        out = subprocess.run(cmd, check=True, capture_output=True, text=True).stdout
+        timings = json.loads(out.strip().splitlines()[-1])
+        timings['process_total'] = time.perf_counter() - start
+        runs.append(timings)
+
+    print(f'Cold start for {args.pdf} (median of {len(runs)} runs):')
+    for phase in PHASES + ['process_total']:
+        values = [r[phase] for r in runs if phase in r]
+        if values:
+            print(f'  {phase:>16}: {statistics.median(values):.3f}s')
+
+if __name__ == '__main__':
+    main()
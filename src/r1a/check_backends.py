@@ -0,0 +1,93 @@
+import argparse
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from utils.elements import DocumentElements
+from utils.extract_text import _build_page_lines
+from utils.pdf_backends import BACKENDS, EXACT_BACKENDS, _BACKEND_CLASSES
+
+REFERENCE = 'pdfplumber'
+CHAR_FIELDS = ('text', 'x0', 'x1', 'top', 'bottom', 'size', 'fontname')
+
+def read_chars(backend, pdf_file):
+    with _BACKEND_CLASSES[backend](pdf_file) as document:
+        return [(number, [{k: c[k] for k in CHAR_FIELDS} for c in chars])
+                for number, chars in document.iter_page_chars()]
+
+def timed_read(backend, pdf_file, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        pages = read_chars(backend, pdf_file)
+        best = min(best, time.perf_counter() - start)
+    return best, pages
+
+def build_lines(pages):
+    return DocumentElements.concat([_build_page_lines(chars, number) for number, chars in pages])
+
+def line_agreement(reference, candidate):
+    """Share of reference lines found with the same text, page and rounded font size."""
+    def keyed(elements):
+        return {(text, page, round(size)) for text, page, size
+                in zip(elements.texts, elements.page.tolist(), elements.font_size.tolist())}
+    ref = keyed(reference)
+    return len(ref & keyed(candidate)) / len(ref) if ref else 1.0
+
+def max_position_delta(reference, candidate):
+    # Largest top difference between matching lines (nearest same-text line
+    # on the page, as text can repeat)
+    positions = defaultdict(list)
+    for text, page, top in zip(reference.texts, reference.page.tolist(), reference.top.tolist()):
+        positions[(text, page)].append(top)
+    deltas = [min(abs(ref_top - top) for ref_top in positions[(text, page)])
+              for text, page, top in zip(candidate.texts, candidate.page.tolist(), candidate.top.tolist())
+              if (text, page) in positions]
+    return max(deltas, default=0.0)
+
+def main():
+    parser = argparse.ArgumentParser(description='Check every PDF backend against the pdfplumber reference.')
+    parser.add_argument('--input_dir', default='input', help='Directory with PDFs')
+    parser.add_argument('--repeat', type=int, default=3, help='Reads per backend (best is reported)')
+    parser.add_argument('--min_line_agreement', type=float, default=0.95,
+                        help='Fail if an approximate backend reproduces fewer reference lines than this')
+    args = parser.parse_args()
+
+    failures = []
+    totals = dict.fromkeys(BACKENDS, 0.0)
+    for pdf_file in sorted(Path(args.input_dir).glob('*.pdf')):
+        t_ref, ref_pages = timed_read(REFERENCE, pdf_file, args.repeat)
+        totals[REFERENCE] += t_ref
+        ref_lines = build_lines(ref_pages)
+        print(f'{pdf_file.name}: {REFERENCE}={t_ref * 1000:.0f}ms')
+        for backend in BACKENDS:
+            if backend == REFERENCE:
+                continue
+            seconds, pages = timed_read(backend, pdf_file, args.repeat)
+            totals[backend] += seconds
+            line = f'  {backend:>10}={seconds * 1000:.0f}ms ({t_ref / seconds:.1f}x)'
+            if backend in EXACT_BACKENDS:
+                same = pages == ref_pages
+                line += '  identical characters' if same else '  CHARACTERS DIFFER'
+                if not same:
+                    failures.append(f'{pdf_file.name}: {backend} characters differ from {REFERENCE}')
+            else:
+                lines = build_lines(pages)
+                agreement = line_agreement(ref_lines, lines)
+                line += (f'  lines {len(ref_lines)} -> {len(lines)}  agreement={agreement:.3f}'
+                         f'  max_top_delta={max_position_delta(ref_lines, lines):.2f}pt')
+                if agreement < args.min_line_agreement:
+                    failures.append(f'{pdf_file.name}: {backend} line agreement {agreement:.3f} '
+                                    f'< {args.min_line_agreement}')
+            print(line)
+    if totals[REFERENCE]:
+        print('Total: ' + '  '.join(f'{name}={seconds * 1000:.0f}ms' for name, seconds in totals.items()))
+    if failures:
+        for message in failures:
+            print(f'FAIL {message}')
+        sys.exit(1)
+    print('All backends agree with the reference')
+
+if __name__ == '__main__':
+    main()
@@ -24,10 +24,14 @@ def extract_headings(data):
     result = defaultdict(set)
     if "title" in data and data["title"]:
         result["title"].add((normalize(data["title"]), 1))
-    for h in data.get("outline", []):
+    pending = list(data.get("outline", []))
+    while pending:
+        h = pending.pop()
         lvl = h["level"].upper()
         if lvl in LEVELS:
             result[lvl].add((normalize(h["text"]), h["page"]))
+        # build_outline nests H2/H3 entries under their parent's children
+        pending.extend(h.get("children", []))
     return result
 
 def compute_metrics(pred, gold):
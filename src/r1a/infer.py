@@ -5,18 +5,25 @@ Uses hybrid heuristic + ML approach if model is available.
 """
 
 import os
-import json
 import time
 import logging
 import pickle
+import argparse
+from functools import partial
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 
 # Import utility functions
 from utils.extract_text import extract_elements
 from utils.title_detector import detect_title
 from utils.detect_headings import detect_heading_structure
-from utils.json_builder import build_outline_json
+from utils.json_builder import build_outline
+from utils.batch import run_batch, init_worker, DEFAULT_MAX_TASKS_PER_CHILD
+from utils.sinks import open_sink, OUTPUT_FORMATS, DEFAULT_OUTPUT_FORMAT, DEFAULT_SHARD_RECORDS
+from utils.features import check_feature_schema
+from utils.tree_model import CompiledForest, predict_with_proba
+from utils.deadline import Deadline, DEFAULT_DOC_BUDGET, SKIP_LANGDETECT
+from utils import metrics
 
 logging.basicConfig(
     level=logging.INFO,
@@ -24,11 +31,18 @@ logging.basicConfig(
 )
 
 def load_model(model_path: str) -> Optional[Dict]:
-    """Load the trained LightGBM model if available."""
+    """Load the trained model if available, preferring its compiled array export."""
     try:
+        compiled_path = Path(model_path).with_name(Path(model_path).stem + '_trees')
+        if (compiled_path / 'meta.json').exists():
+            forest = CompiledForest.load(compiled_path)
+            check_feature_schema(forest.meta)
+            logging.info(f"Loaded compiled model from {compiled_path}")
+            return {'model': forest, **forest.meta}
         if os.path.exists(model_path):
             with open(model_path, 'rb') as f:
                 model_data = pickle.load(f)
+            check_feature_schema(model_data)
             logging.info(f"Loaded model from {model_path}")
             return model_data
         else:
@@ -38,67 +52,90 @@ def load_model(model_path: str) -> Optional[Dict]:
         logging.error(f"Error loading model: {e}")
         return None
 
-def predict_with_model(elements: List[Dict], model_data: Dict) -> Dict:
+def predict_with_model(elements: List[Dict], model_data: Dict,
+                       deadline: Optional[Deadline] = None) -> Dict:
     """Use trained model to predict heading structure."""
+    deadline = deadline or Deadline()
     try:
-        from utils.detect_headings import extract_features
-        import numpy as np
-        import lightgbm as lgb
+        from utils.features import extract_features
+        from utils.detect_headings import detect_language
+        from utils.language import line_languages
         
-        # Extract features
-        features = extract_features(elements)
+        # Extract features (same language-dependent rules as training)
+        deadline.checkpoint()
+        with metrics.span('language'):
+            # Script only, no langdetect, once the document falls behind
+            statistical = not deadline.degraded(SKIP_LANGDETECT)
+            lang = detect_language(elements, statistical)
         
         # Make predictions
         model = model_data['model']
         label_map = model_data['label_map']
-        predictions = model.predict(features)
+        with metrics.span('predict'):
+            features = extract_features(elements, line_languages(elements, lang, statistical))
+            predictions, probas = predict_with_proba(model, features)
+        metrics.count('lines', len(features))
         
         # Convert predictions back to labels
         reverse_label_map = {v: k for k, v in label_map.items()}
-        predicted_labels = [reverse_label_map[pred] for pred in predictions]
+        predicted_labels = [reverse_label_map[pred] for pred in predictions.tolist()]
+        confidences = probas.max(axis=1).tolist()
         
         # Build heading structure
         headings = []
-        for i, (element, label) in enumerate(zip(elements, predicted_labels)):
+        for element, label, confidence in zip(elements, predicted_labels, confidences):
             if label != 'O':
                 headings.append({
                     'level': label,
                     'text': element['text'],
                     'page': element.get('page', 1),
-                    'confidence': 0.8,  # Default confidence for model predictions
+                    'confidence': confidence,
                     'children': []
                 })
         
-        return {'headings': headings, 'language': 'en'}
+        metrics.count('headings_kept', len(headings))
+        return {'headings': headings, 'language': lang}
         
     except Exception as e:
         logging.error(f"Error in model prediction: {e}")
         return {'headings': [], 'language': 'en'}
 
-def infer_single_pdf(pdf_path: Path, output_dir: Path, model_data: Optional[Dict] = None) -> Dict:
-    """Process a single PDF and return results."""
+def infer_single_pdf(pdf_path: Path, model_data: Optional[Dict] = None,
+                     use_cache: bool = True, deadline: Optional[Deadline] = None) -> Dict:
+    """Process a single PDF and return its outline JSON (the caller writes it).
+
+    With a deadline, cheaper modes are used once the document falls behind
+    its budget; they are listed under "degradations" in the result.
+    """
     start_time = time.time()
+    deadline = deadline or Deadline()
     
     try:
         # Extract text elements
-        elements = extract_elements(pdf_path)
+        with deadline.stage('extract'):
+            elements = extract_elements(pdf_path, use_cache=use_cache)
         
         # Detect title
-        title = detect_title(elements, pdf_path)
+        with deadline.stage('title'):
+            title = detect_title(elements, pdf_path)
         
         # Detect heading structure
         if model_data:
             # Use hybrid approach with model
-            outline = predict_with_model(elements, model_data)
+            with deadline.stage('headings'):
+                outline = predict_with_model(elements, model_data, deadline)
         else:
             # Use heuristic-only approach
-            outline = detect_heading_structure(elements)
+            outline = detect_heading_structure(elements, deadline)
         
         # Build output JSON
-        result = build_outline_json(pdf_path, title, outline, output_dir)
+        result = build_outline(title, outline, deadline.degradations)
         
         runtime = time.time() - start_time
         logging.info(f"Processed {pdf_path.name} in {runtime:.2f}s")
+        if deadline.degradations:
+            logging.warning(f"{pdf_path.name} exceeded its time budget; "
+                            f"applied {', '.join(deadline.degradations)}")
         
         return result
         
@@ -111,39 +148,103 @@ def infer_single_pdf(pdf_path: Path, output_dir: Path, model_data: Optional[Dict
             'error': str(e)
         }
 
+# Per-worker model, loaded once by the pool initializer
+_worker_model_data = None
+
+def init_infer_worker(model_path: str) -> None:
+    """Load spaCy and the classifier once per worker process."""
+    global _worker_model_data
+    init_worker()
+    _worker_model_data = load_model(model_path)
+
+def infer_document(pdf_file: Path, use_cache: bool = True,
+                   doc_budget: Optional[float] = DEFAULT_DOC_BUDGET,
+                   batch_expires_at: Optional[float] = None, collect_metrics: bool = False,
+                   trace_memory: bool = False) -> Tuple[Dict, Optional[Dict]]:
+    """Run inference on one PDF with the worker's model.
+
+    Returns the outline JSON, which the parent process writes, and this
+    process's metrics for the document (None when disabled).
+    """
+    logging.info(f"Processing: {pdf_file.name}")
+    if collect_metrics:
+        metrics.enable(trace_memory)
+    deadline = Deadline(doc_budget, batch_expires_at)
+    result = infer_single_pdf(pdf_file, _worker_model_data, use_cache, deadline)
+    metrics.count('documents')
+    if 'error' in result:
+        metrics.count('documents_failed')
+    return result, metrics.collect()
+
 def main():
     """Main inference function."""
-    input_dir = Path("input")
-    output_dir = Path("output")
-    model_path = Path("models/heading_classifier.pkl")
-    
-    # Ensure output directory exists
-    output_dir.mkdir(parents=True, exist_ok=True)
-    
-    # Load model if available
-    model_data = load_model(str(model_path))
+    parser = argparse.ArgumentParser(description="Run heading extraction on input PDFs.")
+    parser.add_argument('--input_dir', default='input', help='Directory with input PDFs')
+    parser.add_argument('--output_dir', default='output', help='Directory for output JSONs')
+    parser.add_argument('--output_format', choices=OUTPUT_FORMATS, default=DEFAULT_OUTPUT_FORMAT,
+                        help='One JSON file per PDF, or compact records in rotating JSON-lines shards')
+    parser.add_argument('--shard_records', type=int, default=DEFAULT_SHARD_RECORDS,
+                        help='Documents per shard with --output_format jsonl')
+    parser.add_argument('--gzip', action='store_true', help='Gzip the shards of --output_format jsonl')
+    parser.add_argument('--model', default='models/heading_classifier.pkl', help='Trained model path')
+    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes')
+    parser.add_argument('--max_tasks_per_child', type=int, default=DEFAULT_MAX_TASKS_PER_CHILD,
+                        help='Recycle each worker after this many PDFs')
+    parser.add_argument('--no_cache', action='store_true', help='Bypass the extracted-element cache')
+    parser.add_argument('--doc_budget', type=float, default=DEFAULT_DOC_BUDGET,
+                        help='Seconds per document before cheaper modes are used (no limit by default)')
+    parser.add_argument('--batch_budget', type=float, default=None,
+                        help='Seconds for the whole batch (no limit by default)')
+    parser.add_argument('--metrics_json', help='Write per-stage timings and counters for the run as JSON')
+    parser.add_argument('--metrics_prom', help='Write the same metrics in Prometheus text format')
+    parser.add_argument('--trace_memory', action='store_true',
+                        help='Also record the peak traced Python memory (tracemalloc; slows the run)')
+    args = parser.parse_args()
+
+    input_dir = Path(args.input_dir)
+    output_dir = Path(args.output_dir)
+    model_path = Path(args.model)
     
     # Process all PDFs in input directory
     pdf_files = list(input_dir.glob("*.pdf"))
     if not pdf_files:
-        logging.warning("No PDF files found in input/ directory")
+        logging.warning(f"No PDF files found in {input_dir}/ directory")
         return
     
     total_start = time.time()
     
-    for pdf_file in pdf_files:
-        logging.info(f"Processing: {pdf_file.name}")
-        result = infer_single_pdf(pdf_file, output_dir, model_data)
-        
-        # Save result to JSON file
-        output_file = output_dir / f"{pdf_file.stem}.json"
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(result, f, indent=2, ensure_ascii=False)
-        
-        logging.info(f"Saved results to {output_file}")
+    # Each worker (or this process, when workers == 1) loads the model once
+    batch_expires_at = total_start + args.batch_budget if args.batch_budget is not None else None
+    collect_metrics = bool(args.metrics_json or args.metrics_prom)
+    task = partial(infer_document, use_cache=not args.no_cache,
+                   doc_budget=args.doc_budget, batch_expires_at=batch_expires_at,
+                   collect_metrics=collect_metrics, trace_memory=args.trace_memory)
+    results = run_batch(pdf_files, task, workers=args.workers,
+                        initializer=init_infer_worker, initargs=(str(model_path),),
+                        max_tasks_per_child=args.max_tasks_per_child)
+    run_metrics = metrics.Metrics(args.trace_memory)
+    if collect_metrics:
+        # For this process's own spans (writing outlines)
+        metrics.enable(args.trace_memory)
+    failed = 0
+    with open_sink(args.output_format, output_dir, args.shard_records, args.gzip,
+                   ensure_ascii=False) as sink:
+        for pdf_file, outcome, error, _ in results:
+            failed += bool(error)
+            if error:
+                continue
+            result, snapshot = outcome
+            run_metrics.merge(snapshot)
+            sink.write(pdf_file, result)
+            logging.info(f"Saved results for {pdf_file.name}")
+    run_metrics.merge(metrics.collect())
+    if failed:
+        logging.warning(f"{failed} of {len(pdf_files)} PDFs failed")
     
     total_runtime = time.time() - total_start
     logging.info(f"Total processing time: {total_runtime:.2f}s")
+    if collect_metrics:
+        run_metrics.write(args.metrics_json, args.metrics_prom)
     
     # Validate runtime constraint (≤10s for typical PDFs)
     if total_runtime > 10.0:
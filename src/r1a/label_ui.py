@@ -2,7 +2,7 @@ import argparse
 import csv
 import json
 from pathlib import Path
-from utils.extract_text import extract_elements
+from utils.weak_labels import load_elements, read_review_csv, DEFAULT_WEAK_DIR
 
 LEVELS = ['O', 'title', 'H1', 'H2', 'H3']
 
@@ -14,13 +14,10 @@ def export_csv(elements, csv_path):
             writer.writerow([i, el['text'], 'O'])
     print(f'Exported to {csv_path}')
 
-def import_csv(csv_path):
-    labels = []
-    with open(csv_path, 'r', encoding='utf-8') as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            labels.append(row.get('level', 'O'))
-    return labels
+def import_csv(csv_path, n_lines=None):
+    # Rows are matched by idx, so weak-label CSVs sorted by uncertainty
+    # (src/r1a/weak_label.py) import as well
+    return read_review_csv(csv_path, n_lines)
 
 def save_gold(elements, labels, pdf_path, out_path):
     title = ''
@@ -41,14 +38,19 @@ def main():
     parser.add_argument('--csv', required=True, help='CSV for export/import')
     parser.add_argument('--out', required=True, help='Output gold JSON file')
     parser.add_argument('--import_csv', action='store_true', help='Import labels from CSV')
+    parser.add_argument('--no_cache', action='store_true', help='Bypass the extracted-element cache')
+    parser.add_argument('--weak_dir', default=DEFAULT_WEAK_DIR,
+                        help='Reuse the lines weak_label.py saved here instead of parsing the PDF')
     args = parser.parse_args()
 
-    elements = extract_elements(args.pdf)
+    # Export and import re-read the same PDF; the lines weak_label.py saved
+    # or the element cache spare parsing it again
+    elements = load_elements(args.pdf, args.weak_dir, use_cache=not args.no_cache)
     if not args.import_csv:
         export_csv(elements, args.csv)
         print('Fill in the CSV and rerun with --import_csv')
         return
-    labels = import_csv(args.csv)
+    labels = import_csv(args.csv, len(elements))
     save_gold(elements, labels, args.pdf, args.out)
 
 if __name__ == '__main__':
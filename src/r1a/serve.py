@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+"""
+Resident outline-extraction service.
+
+Keeps spaCy and the heading classifier loaded in a pool of warm worker
+processes and serves outlines over localhost HTTP:
+
+    POST /outline   {"path": "/abs/path/file.pdf"}       (application/json)
+    POST /outline   <raw PDF bytes>  [?name=file.pdf]    (application/pdf)
+    GET  /health    queue depth, counters and latency percentiles
+
+The response body is the same JSON that build_outline_json writes.
+"""
+
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from collections import deque
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+from utils.batch import init_worker, DEFAULT_MAX_TASKS_PER_CHILD, POOL_START_METHOD
+from utils.deadline import Deadline
+from utils.pipeline import extract_outline, OUTLINE_MODES, DEFAULT_OUTLINE_MODE
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s %(levelname)s %(message)s'
+)
+
+MAX_BODY_BYTES = 100 * 1024 * 1024
+LATENCY_WINDOW = 1000
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    idx = min(len(sorted_values) - 1, int(round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[idx]
+
+def outline_task(pdf_path, name, outline_mode, expires_at):
+    """Worker side of one request, bounded by the request's own timeout.
+
+    expires_at is the absolute time the client stops waiting. A request
+    that waited that long in the queue is dropped without being opened; one
+    that runs late degrades like any other over-budget document.
+    """
+    if time.time() >= expires_at:
+        raise TimeoutError('expired while queued')
+    return extract_outline(pdf_path, name=name, outline_mode=outline_mode,
+                           deadline=Deadline(expires_at=expires_at))
+
+class OutlineService:
+    """Worker pool plus a bounded admission queue and request statistics."""
+
+    def __init__(self, workers=2, max_queue=32, timeout=30.0,
+                 max_tasks_per_child=DEFAULT_MAX_TASKS_PER_CHILD, outline_mode=DEFAULT_OUTLINE_MODE):
+        self.workers = workers
+        self.outline_mode = outline_mode
+        self.timeout = timeout
+        self.capacity = workers + max_queue
+        # Workers are started (and recycled) while request threads run
+        self.pool = multiprocessing.get_context(POOL_START_METHOD).Pool(
+            processes=workers, initializer=init_worker, maxtasksperchild=max_tasks_per_child)
+        # A slot is held from admission until the worker finishes, even if
+        # the client already got a timeout, so the queue bound stays real.
+        self._slots = threading.BoundedSemaphore(self.capacity)
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self.counters = {'completed': 0, 'failed': 0, 'timeouts': 0, 'rejected': 0}
+        self.started = time.time()
+
+    def _count(self, key):
+        with self._lock:
+            self.counters[key] += 1
+
+    def _release(self, cleanup=None, _result=None):
+        with self._lock:
+            self._pending -= 1
+        self._slots.release()
+        if cleanup is not None:
+            try:
+                os.unlink(cleanup)
+            except FileNotFoundError:
+                pass
+
+    def submit(self, pdf_path, name=None, cleanup=None):
+        """Return (status, payload) for one document.
+
+        cleanup names a file to delete once the worker is done with it (or
+        at once if the request is rejected); the worker may still be running
+        after the client got its timeout.
+        """
+        if not self._slots.acquire(blocking=False):
+            self._count('rejected')
+            if cleanup is not None:
+                os.unlink(cleanup)
+            return 503, {'error': 'queue full'}
+        with self._lock:
+            self._pending += 1
+        start = time.perf_counter()
+        release = partial(self._release, cleanup)
+        async_result = self.pool.apply_async(
+            outline_task, (pdf_path, name, self.outline_mode, time.time() + self.timeout),
+            callback=release, error_callback=release,
+        )
+        try:
+            result = async_result.get(self.timeout)
+        except (multiprocessing.TimeoutError, TimeoutError):
+            self._count('timeouts')
+            return 504, {'error': f'timed out after {self.timeout:.1f}s'}
+        except Exception as e:
+            self._count('failed')
+            logging.error(f"Failed to process {name or pdf_path}: {e}")
+            return 500, {'error': f'{type(e).__name__}: {e}'}
+        with self._lock:
+            self._latencies.append(time.perf_counter() - start)
+        self._count('completed')
+        return 200, result
+
+    def stats(self):
+        with self._lock:
+            pending = self._pending
+            latencies = sorted(self._latencies)
+            counters = dict(self.counters)
+        return {
+            'status': 'ok',
+            'uptime_s': round(time.time() - self.started, 1),
+            'workers': self.workers,
+            'in_flight': min(pending, self.workers),
+            'queue_depth': max(0, pending - self.workers),
+            'queue_capacity': self.capacity - self.workers,
+            **counters,
+            'latency_ms': {
+                f'p{q}': round(percentile(latencies, q) * 1000, 1) for q in (50, 90, 95, 99)
+            },
+        }
+
+    def close(self):
+        self.pool.terminate()
+        self.pool.join()
+
+class OutlineHandler(BaseHTTPRequestHandler):
+    service = None
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, indent=2).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if urlparse(self.path).path in ('/health', '/stats'):
+            self._send_json(200, self.service.stats())
+        else:
+            self._send_json(404, {'error': 'not found'})
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != '/outline':
+            self._send_json(404, {'error': 'not found'})
+            return
+        length = int(self.headers.get('Content-Length', 0))
+        if length <= 0 or length > MAX_BODY_BYTES:
+            self._send_json(413 if length else 400, {'error': 'missing or oversized body'})
+            return
+        body = self.rfile.read(length)
+
+        if self.headers.get('Content-Type', '').startswith('application/json'):
+            try:
+                pdf_path = json.loads(body)['path']
+            except (ValueError, KeyError, TypeError):
+                self._send_json(400, {'error': 'expected {"path": "..."}'})
+                return
+            if not Path(pdf_path).is_file():
+                self._send_json(404, {'error': f'no such file: {pdf_path}'})
+                return
+            self._send_json(*self.service.submit(pdf_path))
+            return
+
+        # Raw PDF bytes: spool to a temporary file the workers can open
+        name = parse_qs(url.query).get('name', ['document.pdf'])[0]
+        fd, tmp_path = tempfile.mkstemp(suffix='.pdf')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(body)
+        except OSError:
+            os.unlink(tmp_path)
+            raise
+        self._send_json(*self.service.submit(tmp_path, name=name, cleanup=tmp_path))
+
+    def log_message(self, format, *args):
+        logging.debug(format % args)
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve PDF outlines over localhost HTTP.')
+    parser.add_argument('--host', default='127.0.0.1', help='Bind address')
+    parser.add_argument('--port', type=int, default=8088, help='Bind port')
+    parser.add_argument('--workers', type=int, default=2, help='Concurrent documents (worker processes)')
+    parser.add_argument('--max_queue', type=int, default=32, help='Requests allowed to wait for a worker')
+    parser.add_argument('--timeout', type=float, default=30.0, help='Per-request timeout in seconds')
+    parser.add_argument('--max_tasks_per_child', type=int, default=DEFAULT_MAX_TASKS_PER_CHILD,
+                        help='Recycle each worker after this many PDFs')
+    parser.add_argument('--outline_mode', choices=OUTLINE_MODES, default=DEFAULT_OUTLINE_MODE,
+                        help='Use embedded PDF bookmarks when sane, never, or both (verify)')
+    args = parser.parse_args()
+
+    service = OutlineService(args.workers, args.max_queue, args.timeout, args.max_tasks_per_child,
+                             args.outline_mode)
+    OutlineHandler.service = service
+    server = ThreadingHTTPServer((args.host, args.port), OutlineHandler)
+    logging.info(f"Serving outlines on http://{args.host}:{args.port} with {args.workers} workers")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+
+if __name__ == '__main__':
+    main()
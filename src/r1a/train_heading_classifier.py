@@ -1,87 +1,189 @@
 import os
 import json
 import pickle
+import argparse
+from functools import partial
 from pathlib import Path
 import numpy as np
 import pandas as pd
 import lightgbm as lgb
 from tqdm import tqdm
 
-# --- Feature extraction helpers ---
-def extract_features(elements):
-    features = []
-    for i, el in enumerate(elements):
-        text = el['text']
-        font_size = el.get('font_size', 12.0)
-        # Placeholder: bold/italic detection (not available, set to 0)
-        is_bold = 0
-        is_italic = 0
-        text_len = len(text)
-        cap_ratio = sum(1 for c in text if c.isupper()) / (len(text) or 1)
-        whitespace_above = 0  # Placeholder: not available
-        y_pos = el.get('y', 0)
-        y_pct = y_pos / (el.get('page_height', 1) or 1)
-        num_pattern = 0
-        if any([text.strip().startswith(p) for p in ['1.', '1.1', '1.1.1', 'I.', 'A.']]):
-            num_pattern = 1
-        features.append([
-            font_size, is_bold, is_italic, text_len, cap_ratio, whitespace_above, y_pct, num_pattern
-        ])
-    return np.array(features)
-
-def get_labels(elements, gold_headings):
-    # gold_headings: set of (normalized text, page, level)
-    labels = []
-    for el in elements:
-        text = el['text'].strip().lower()
-        page = el['page']
-        label = 'O'
-        for (gtext, gpage, glevel) in gold_headings:
-            if text == gtext and page == gpage:
-                label = glevel
-                break
-        labels.append(label)
-    return labels
-
-def load_gold_headings(gold_json):
-    gold = set()
-    if 'title' in gold_json and gold_json['title']:
-        gold.add((gold_json['title'].strip().lower(), 1, 'title'))
-    for h in gold_json.get('outline', []):
-        gold.add((h['text'].strip().lower(), h['page'], h['level']))
-    return gold
+from utils.dataset import DEFAULT_SPLITS_DIR, DEFAULT_VALIDATION_FRACTION
+from utils.model_sweep import DEFAULT_TREES, DEFAULT_DEPTHS, DEFAULT_LEAVES, DEFAULT_SUBSETS, FEATURE_SUBSETS
+
+# Labeling (a (normalized text, page) index over the gold outline) and the
+# cached feature shards live in utils.dataset; features come from
+# utils.features, the same code inference uses.
+
+def labelled_pairs(input_dir, gold_dir):
+    """(pdf, gold json) for every PDF that has a gold outline."""
+    pairs = []
+    for pdf_file in sorted(Path(input_dir).glob('*.pdf')):
+        json_file = Path(gold_dir) / (pdf_file.stem + '.json')
+        if json_file.exists():
+            pairs.append((pdf_file, json_file))
+    return pairs
+
+def label_pdf(pdf_file, gold_dir, use_cache=True):
+    from utils.dataset import label_document
+    json_file = Path(gold_dir) / (pdf_file.stem + '.json')
+    return (pdf_file.name, *label_document(pdf_file, json_file, use_cache))
+
+def build_dataset(pairs, gold_dir, splits_dir, validation_fraction, workers, use_cache):
+    """Extract and label every document (in parallel) and write the split shards."""
+    from utils.batch import run_batch
+    from utils.dataset import write_splits
+    task = partial(label_pdf, gold_dir=gold_dir, use_cache=use_cache)
+    # Documents are labelled in worker processes; spaCy is never needed, so
+    # workers skip the model warm-up.
+    results = run_batch([pdf for pdf, _ in pairs], task, workers=workers, initializer=None)
+    documents = []
+    for pdf_file, result, error, _ in tqdm(results, total=len(pairs), desc='Labelling'):
+        if error:
+            raise RuntimeError(f'Could not label {pdf_file.name}: {error}')
+        documents.append(result)
+    # Shards are written in a stable order whatever order workers finish in
+    documents.sort(key=lambda doc: doc[0])
+    return write_splits(splits_dir, documents, pairs, validation_fraction)
+
+def _ints(text):
+    return tuple(int(v) for v in text.split(','))
+
+def _subsets(text):
+    names = tuple(text.split(','))
+    unknown = [n for n in names if n not in FEATURE_SUBSETS]
+    if unknown:
+        raise argparse.ArgumentTypeError(f'unknown feature subsets {unknown}; expected {list(FEATURE_SUBSETS)}')
+    return names
+
+def sweep_models(args, X, y_num, X_val, y_val_num, label_map):
+    """Fit the sweep grid, write the Pareto report and return (chosen model, its result)."""
+    from utils.dataset import split_documents
+    from utils.model_sweep import candidates, early_stopping_rows, select, sweep
+
+    grid = candidates(args.sweep_trees, args.sweep_depths, args.sweep_leaves, args.sweep_features)
+    heading_labels = [i for label, i in label_map.items() if label != 'O']
+    stop_rows = early_stopping_rows(split_documents(args.splits_dir, 'train'))
+    print(f'Sweeping {len(grid)} candidates ({int(stop_rows.sum())} training lines held out for early stopping)')
+    bar = tqdm(total=len(grid), desc='Sweep')
+    results, models = sweep(grid, X, y_num, X_val, y_val_num, heading_labels, stop_rows,
+                            progress=lambda _: bar.update())
+    bar.close()
+    max_size = args.max_model_kb * 1024 if args.max_model_kb is not None else None
+    chosen, fits = select(results, args.max_latency_ms, max_size)
+
+    print(f"{'features':<12} {'rounds':>9} {'depth':>5} {'leaves':>6} {'macro_f1':>8} {'ms/1k':>7} {'KB':>7}")
+    for r in sorted(results, key=lambda r: (-r['macro_f1'], r['ms_per_1k'])):
+        mark = '<' if r is chosen else ('*' if r['pareto'] else '')
+        print(f"{r['features']:<12} {r['rounds']:>4}/{r['n_estimators']:<4} {r['max_depth']:>5} "
+              f"{r['num_leaves']:>6} {r['macro_f1']:>8.3f} {r['ms_per_1k']:>7.2f} "
+              f"{r['size_bytes'] / 1024:>7.1f} {mark}")
+    print('* Pareto front, < chosen')
+    if not fits:
+        print('No candidate fits the latency and size budgets; chose the fastest.')
+    report = {
+        'budgets': {'max_latency_ms_per_1k_lines': args.max_latency_ms, 'max_model_kb': args.max_model_kb},
+        'validation_lines': len(X_val),
+        'chosen': chosen,
+        'within_budgets': fits,
+        'candidates': results,
+    }
+    Path(args.sweep_report).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.sweep_report, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f'Sweep report written to {args.sweep_report}')
+    return models[results.index(chosen)], chosen
 
 # --- Main training script ---
 def main():
-    input_dir = Path('input')
-    output_dir = Path('output')
-    X, y = [], []
-    for pdf_file in tqdm(list(input_dir.glob('*.pdf'))):
-        json_file = output_dir / (pdf_file.stem + '.json')
-        if not json_file.exists():
-            continue
-        # Use extract_text from utils
-        from utils.extract_text import extract_elements
-        elements = extract_elements(pdf_file)
-        with open(json_file, 'r', encoding='utf-8') as f:
-            gold_json = json.load(f)
-        gold_headings = load_gold_headings(gold_json)
-        feats = extract_features(elements)
-        labels = get_labels(elements, gold_headings)
-        X.append(feats)
-        y.extend(labels)
-    if not X:
+    parser = argparse.ArgumentParser(description='Train the LightGBM heading classifier.')
+    parser.add_argument('--input_dir', default='input', help='Directory with training PDFs')
+    parser.add_argument('--gold_dir', default='output', help='Directory with gold outline JSONs')
+    parser.add_argument('--splits_dir', default=DEFAULT_SPLITS_DIR, help='Where feature shards are cached')
+    parser.add_argument('--validation_fraction', type=float, default=DEFAULT_VALIDATION_FRACTION,
+                        help='Share of documents held out for validation')
+    parser.add_argument('--workers', type=int, default=1, help='Processes extracting and labelling PDFs')
+    parser.add_argument('--rebuild', action='store_true', help='Rebuild the feature shards even if fresh')
+    parser.add_argument('--n_estimators', type=int, default=100, help='LightGBM trees')
+    parser.add_argument('--max_depth', type=int, default=7, help='LightGBM maximum tree depth')
+    parser.add_argument('--no_cache', action='store_true', help='Bypass the extracted-element cache')
+    parser.add_argument('--sweep', action='store_true',
+                        help='Sweep model sizes and keep the most accurate within the budgets below')
+    parser.add_argument('--sweep_trees', type=_ints, default=DEFAULT_TREES,
+                        help='Comma-separated tree counts (caps; early stopping may use fewer)')
+    parser.add_argument('--sweep_depths', type=_ints, default=DEFAULT_DEPTHS, help='Comma-separated max depths')
+    parser.add_argument('--sweep_leaves', type=_ints, default=DEFAULT_LEAVES, help='Comma-separated leaf counts')
+    parser.add_argument('--sweep_features', type=_subsets, default=DEFAULT_SUBSETS,
+                        help=f"Comma-separated feature subsets out of {','.join(FEATURE_SUBSETS)}")
+    parser.add_argument('--max_latency_ms', type=float, default=None,
+                        help='Budget in ms of classifier time per 1,000 lines for --sweep')
+    parser.add_argument('--max_model_kb', type=float, default=None,
+                        help='Budget for the exported model size in KB for --sweep')
+    parser.add_argument('--sweep_report', default='models/model_sweep.json',
+                        help='Where --sweep writes every candidate and the Pareto front')
+    args = parser.parse_args()
+
+    # Use extract_text and the shared feature builder from utils
+    from utils.extract_text import get_element_cache
+    from utils.features import FEATURE_NAMES, FEATURE_SCHEMA_VERSION
+    from utils.tree_model import export_lgbm, check_compiled_model
+    from utils.dataset import splits_are_fresh, load_split, dataset_dir
+
+    pairs = labelled_pairs(args.input_dir, args.gold_dir)
+    if not pairs:
         print('No training data found.')
         return
-    X = np.vstack(X)
-    label_map = {l: i for i, l in enumerate(sorted(set(y)))}
-    y_num = np.array([label_map[l] for l in y])
-    clf = lgb.LGBMClassifier(n_estimators=100, max_depth=7)
-    clf.fit(X, y_num)
+    if args.rebuild or not splits_are_fresh(args.splits_dir, pairs, args.validation_fraction):
+        meta = build_dataset(pairs, args.gold_dir, args.splits_dir, args.validation_fraction, args.workers,
+                             use_cache=not args.no_cache)
+        print(f'Wrote {dataset_dir(args.splits_dir)} '
+              f"({len(meta['splits']['train']['documents'])} train / "
+              f"{len(meta['splits']['validation']['documents'])} validation documents)")
+        if args.workers <= 1:
+            print(f'Element cache: {get_element_cache().stats()}')
+    else:
+        print(f'Using cached dataset {dataset_dir(args.splits_dir)}')
+
+    X, y = load_split(args.splits_dir, 'train')
+    X_val, y_val = load_split(args.splits_dir, 'validation')
+    if not len(X):
+        print('Training split is empty; lower --validation_fraction or add documents.')
+        return
+    label_map = {l: i for i, l in enumerate(sorted(set(y.tolist()) | set(y_val.tolist())))}
+    y_num = np.array([label_map[l] for l in y.tolist()])
+    y_val_num = np.array([label_map[l] for l in y_val.tolist()], dtype=int)
+    selection = {}
+    if args.sweep:
+        clf, chosen = sweep_models(args, X, y_num, X_val, y_val_num, label_map)
+        selection = {'selection': {k: chosen[k] for k in ('n_estimators', 'max_depth', 'num_leaves',
+                                                          'features', 'rounds', 'macro_f1',
+                                                          'ms_per_1k', 'size_bytes')}}
+        print(f"Chose {chosen['features']} features, {chosen['rounds']} rounds, depth {chosen['max_depth']}, "
+              f"{chosen['num_leaves']} leaves: macro-F1 {chosen['macro_f1']:.3f}, "
+              f"{chosen['ms_per_1k']:.2f} ms per 1k lines, {chosen['size_bytes'] / 1024:.1f} KB")
+    else:
+        clf = lgb.LGBMClassifier(n_estimators=args.n_estimators, max_depth=args.max_depth)
+        clf.fit(X, y_num)
+    if len(X_val):
+        accuracy = float(np.mean(clf.predict(X_val) == y_val_num))
+        print(f'Validation accuracy: {accuracy:.3f} on {len(X_val)} lines')
     os.makedirs('models', exist_ok=True)
     with open('models/heading_classifier.pkl', 'wb') as f:
-        pickle.dump({'model': clf, 'label_map': label_map}, f)
+        pickle.dump({
+            'model': clf,
+            'label_map': label_map,
+            'feature_schema': FEATURE_SCHEMA_VERSION,
+            'feature_names': FEATURE_NAMES,
+            **selection,
+        }, f)
     print('Model saved to models/heading_classifier.pkl')
 
+    # Array export used at inference (no lightgbm import, memory-mapped load)
+    compiled = export_lgbm(clf, 'models/heading_classifier_trees', label_map=label_map,
+                           feature_schema=FEATURE_SCHEMA_VERSION, feature_names=FEATURE_NAMES, **selection)
+    max_diff = check_compiled_model(clf, compiled, X)
+    print(f'Compiled model saved to models/heading_classifier_trees (max prob diff {max_diff:.1e})')
+
 if __name__ == '__main__':
     main() 
\ No newline at end of file
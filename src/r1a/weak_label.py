@@ -0,0 +1,58 @@
+import argparse
+import csv
+import logging
+from functools import partial
+from pathlib import Path
+
+from utils.batch import run_batch
+from utils.pipeline import OUTLINE_MODES, DEFAULT_OUTLINE_MODE
+from utils.weak_labels import weak_label_document, DEFAULT_WEAK_DIR, UNCERTAIN_BELOW
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+
+QUEUE_NAME = 'review_queue.csv'
+
+def write_queue(summaries, path):
+    # Documents with the most uncertain lines first
+    order = sorted(summaries, key=lambda s: (-s['uncertain'], s['min_confidence'], s['file']))
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['file', 'uncertain', 'min_confidence', 'lines', 'headings'])
+        for s in order:
+            writer.writerow([s['file'], s['uncertain'], s['min_confidence'], s['lines'], s['headings']])
+
+def main():
+    parser = argparse.ArgumentParser(description='Pre-label raw PDFs for review in annotate.py / label_ui.py.')
+    parser.add_argument('--raw_dir', default='data/raw', help='Directory with PDFs to label')
+    parser.add_argument('--weak_dir', default=DEFAULT_WEAK_DIR, help='Directory for weak CSVs and JSONs')
+    parser.add_argument('--workers', type=int, default=1, help='Number of worker processes')
+    parser.add_argument('--outline_mode', choices=OUTLINE_MODES, default=DEFAULT_OUTLINE_MODE,
+                        help='Take sane bookmarks as weak labels, or always use heading detection')
+    parser.add_argument('--uncertain_below', type=float, default=UNCERTAIN_BELOW,
+                        help='Confidence under which a line counts as uncertain in the review queue')
+    parser.add_argument('--no_cache', action='store_true', help='Bypass the extracted-element cache')
+    parser.add_argument('--force', action='store_true', help='Relabel PDFs whose weak files are up to date')
+    args = parser.parse_args()
+
+    pdf_files = sorted(Path(args.raw_dir).glob('*.pdf'))
+    if not pdf_files:
+        logging.warning(f'No PDF files found in {args.raw_dir}/')
+        return
+    task = partial(weak_label_document, weak_dir=args.weak_dir, use_cache=not args.no_cache,
+                   outline_mode=args.outline_mode, force=args.force, uncertain_below=args.uncertain_below)
+    summaries = []
+    for pdf, summary, error, seconds in run_batch(pdf_files, task, workers=args.workers):
+        if error:
+            continue
+        summaries.append(summary)
+        logging.info(f"{pdf.name}: {summary['status']}, {summary['uncertain']} of {summary['lines']} "
+                     f"lines uncertain ({seconds:.2f}s)")
+    Path(args.weak_dir).mkdir(parents=True, exist_ok=True)
+    queue_path = Path(args.weak_dir) / QUEUE_NAME
+    write_queue(summaries, queue_path)
+    labelled = sum(s['status'] == 'labelled' for s in summaries)
+    logging.info(f'Labelled {labelled}, reused {len(summaries) - labelled}, failed '
+                 f'{len(pdf_files) - len(summaries)}; review order in {queue_path}')
+
+if __name__ == '__main__':
+    main()
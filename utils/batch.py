@@ -0,0 +1,67 @@
+import logging
+import multiprocessing
+import time
+from pathlib import Path
+
+# Recycle each worker after this many documents; pdfplumber keeps growing
+# its caches over a long-lived process.
+DEFAULT_MAX_TASKS_PER_CHILD = 20
+# Start method for pools created while other threads run (and which, with
+# maxtasksperchild, keep starting replacement workers). A process forked
+# from a threaded one can deadlock on locks those threads held (logging,
+# spaCy), so such pools take their workers from a fork server.
+POOL_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+
+def init_worker():
+    # Load en_core_web_sm and the heading classifier once per worker
+    # instead of on the worker's first document.
+    from utils.detect_headings import warm_up
+    warm_up()
+
+
+def order_largest_first(pdf_files):
+    # Schedule big documents first so they don't end up as a long tail.
+    return sorted(pdf_files, key=lambda p: Path(p).stat().st_size, reverse=True)
+
+
+def _run_task(args):
+    task, pdf = args
+    start = time.time()
+    try:
+        result = task(pdf)
+        return pdf, result, None, time.time() - start
+    except Exception as e:
+        logging.error(f"Failed to process {Path(pdf).name}: {e}", exc_info=True)
+        return pdf, None, f"{type(e).__name__}: {e}", time.time() - start
+
+
+def run_batch(pdf_files, task, workers=1, initializer=init_worker, initargs=(),
+              max_tasks_per_child=DEFAULT_MAX_TASKS_PER_CHILD, start_method=None):
+    """Run task(pdf) for every file, yielding (pdf, result, error, seconds) as each finishes.
+
+    With workers > 1 the files go to a process pool, largest first, so
+    results must be picklable. start_method picks the pool's
+    multiprocessing start method (the platform default when None). A
+    failing document yields its error message (and result None) instead
+    of aborting the batch. With no files nothing runs, not even the
+    initializer, so a rerun that skips everything loads no models.
+    """
+    pdf_files = list(pdf_files)
+    if not pdf_files:
+        return
+    if workers <= 1:
+        if initializer is not None:
+            initializer(*initargs)
+        for pdf in pdf_files:
+            yield _run_task((task, pdf))
+        return
+
+    jobs = [(task, pdf) for pdf in order_largest_first(pdf_files)]
+    with multiprocessing.get_context(start_method).Pool(
+        processes=workers,
+        initializer=initializer,
+        initargs=initargs,
+        maxtasksperchild=max_tasks_per_child,
+    ) as pool:
+        yield from pool.imap_unordered(_run_task, jobs, chunksize=1)
@@ -0,0 +1,114 @@
+import re
+from pathlib import Path
+
+from pdfminer.pdfdocument import PDFDocument, PDFNoOutlines
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfparser import PDFParser
+from pdfminer.pdftypes import PDFObjRef, resolve1
+from pdfminer.psparser import PSLiteral
+from pdfminer.utils import decode_text
+
+# The output schema has three heading levels; deeper bookmarks are dropped.
+MAX_BOOKMARK_LEVEL = 3
+MIN_BOOKMARKS = 2
+# Fraction of bookmarks that must point at a page of this document
+MIN_RESOLVED_RATIO = 0.9
+# Metadata titles that are really file names or generator defaults
+JUNK_TITLE_RE = re.compile(r'^(untitled|microsoft \w+ - .*|.*\.(docx?|pptx?|xlsx?|cdr|pdf|indd|qxd))$', re.I)
+
+
+def _page_of(dest, doc, page_numbers):
+    # A destination is [page_ref, /XYZ, ...], a named destination, or a
+    # dict/action wrapping one of those under /D.
+    dest = resolve1(dest)
+    if isinstance(dest, (str, bytes, PSLiteral)):
+        name = dest.name if isinstance(dest, PSLiteral) else dest
+        try:
+            dest = resolve1(doc.get_dest(name))
+        except Exception:
+            return None
+    if isinstance(dest, dict):
+        dest = resolve1(dest.get('D'))
+    if isinstance(dest, list) and dest:
+        target = dest[0]
+        if isinstance(target, PDFObjRef):
+            return page_numbers.get(target.objid)
+        if isinstance(target, int):
+            # Remote-style destinations give a 0-based page index
+            return target + 1
+    return None
+
+
+def _metadata_title(doc):
+    for info in doc.info:
+        title = resolve1(info.get('Title'))
+        if isinstance(title, bytes):
+            title = decode_text(title)
+        if isinstance(title, str) and title.strip() and not JUNK_TITLE_RE.match(title.strip()):
+            return title.strip()
+    return None
+
+
+def read_bookmarks(pdf_path):
+    """Return (metadata title or None, bookmarks, page count) from the /Outlines tree.
+
+    Each bookmark is {"level", "text", "page"} with a 1-based page, or page
+    None when its destination cannot be resolved. Only the document
+    catalogue and page tree are parsed; no page content is read. Returns
+    None when the PDF has no outline.
+    """
+    with open(pdf_path, 'rb') as fp:
+        doc = PDFDocument(PDFParser(fp))
+        # Most PDFs have no outline; skip the page-tree walk for them
+        if 'Outlines' not in doc.catalog:
+            return None
+        page_numbers = {page.pageid: i + 1 for i, page in enumerate(PDFPage.create_pages(doc))}
+        try:
+            outlines = list(doc.get_outlines())
+        except PDFNoOutlines:
+            return None
+        bookmarks = []
+        for level, text, dest, action, _ in outlines:
+            if dest is None and action is not None:
+                dest = action
+            bookmarks.append({
+                "level": level,
+                "text": (text or "").strip(),
+                "page": _page_of(dest, doc, page_numbers) if dest is not None else None,
+            })
+        return _metadata_title(doc), bookmarks, len(page_numbers)
+
+
+def check_bookmarks(bookmarks, n_pages):
+    """Return the reason the outline cannot stand in for heading detection, or None."""
+    if len(bookmarks) < MIN_BOOKMARKS:
+        return f"only {len(bookmarks)} bookmark(s)"
+    resolved = [b["page"] for b in bookmarks if b["page"] is not None and 1 <= b["page"] <= n_pages]
+    if len(resolved) < MIN_RESOLVED_RATIO * len(bookmarks):
+        return f"{len(bookmarks) - len(resolved)} of {len(bookmarks)} bookmarks have no valid target page"
+    if n_pages > 1 and len(resolved) > 2 and len(set(resolved)) == 1:
+        return "every bookmark targets the same page"
+    if not any(b["text"] for b in bookmarks):
+        return "bookmarks have no titles"
+    return None
+
+
+def bookmarks_to_headings(bookmarks):
+    """Map bookmarks onto the heading dicts that build_outline expects.
+
+    Text gets the trailing space detect_heading_structure gives every
+    heading, so the output does not depend on the outline's source.
+    """
+    return [
+        {"level": f"H{b['level']}", "text": b["text"] + " ", "page": b["page"], "confidence": 1.0}
+        for b in bookmarks
+        if b["text"] and b["page"] is not None and b["level"] <= MAX_BOOKMARK_LEVEL
+    ]
+
+
+def bookmark_title(metadata_title, pdf_path):
+    # Same trailing spacing as detect_title; without usable metadata fall
+    # back to the file name, as detect_title does for text-less PDFs.
+    if metadata_title:
+        return metadata_title + "  "
+    return Path(pdf_path).stem.replace("_", " ").title()
@@ -0,0 +1,88 @@
+import hashlib
+import logging
+import os
+from pathlib import Path
+from utils.elements import DocumentElements
+
+DEFAULT_CACHE_DIR = '.cache/elements'
+DEFAULT_CACHE_MAX_MB = 512
+
+
+def file_digest(path, chunk_size=1 << 20):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class ElementCache:
+    """On-disk cache of extracted elements keyed by PDF content and extractor version.
+
+    Entries are compressed .npz archives. Once the directory grows past
+    max_bytes, the least recently used entries are deleted; reading an entry
+    refreshes its mtime.
+    """
+
+    def __init__(self, directory, version, max_bytes=DEFAULT_CACHE_MAX_MB * 1024 * 1024):
+        self.directory = Path(directory)
+        self.version = version
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, pdf_path, variant=None):
+        # variant separates extractions that differ for the same version
+        # (e.g. an approximate PDF backend)
+        key = f"{file_digest(pdf_path)}-v{self.version}"
+        return f"{key}-{variant}" if variant else key
+
+    def _path(self, key):
+        return self.directory / f"{key}.npz"
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            elements = DocumentElements.load(path)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        except Exception as e:
+            logging.warning(f"Discarding unreadable cache entry {path.name}: {e}")
+            path.unlink(missing_ok=True)
+            self.misses += 1
+            return None
+        os.utime(path)
+        self.hits += 1
+        return elements
+
+    def put(self, key, elements):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self._path(key)
+        # Write under a unique name first; concurrent workers may store the same key.
+        tmp_path = path.with_name(f"{path.stem}.{os.getpid()}.tmp.npz")
+        elements.save(tmp_path)
+        os.replace(tmp_path, path)
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for path in self.directory.glob('*.npz'):
+            if '.tmp.' in path.name:
+                continue
+            try:
+                st = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            self.evictions += 1
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions}
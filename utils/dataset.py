@@ -0,0 +1,169 @@
+import hashlib
+import json
+import logging
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+from utils.cache import file_digest
+from utils.extract_text import extract_elements, EXTRACTOR_VERSION
+from utils.features import extract_features, FEATURE_NAMES, FEATURE_SCHEMA_VERSION
+
+# Bump when labeling or the shard layout changes; cached splits built by an
+# older version (or another feature schema/extractor) are rebuilt.
+DATASET_VERSION = 2
+DEFAULT_SPLITS_DIR = 'data/splits'
+SPLITS = ('train', 'validation')
+DEFAULT_VALIDATION_FRACTION = 0.2
+# Rows per shard file; keeps any single memory map to ~100 MB of features
+SHARD_ROWS = 1_000_000
+
+
+def normalize_heading_text(text):
+    return text.strip().lower()
+
+
+def load_gold_headings(gold_json):
+    """Return {(normalized text, page): level} for the title and every outline entry."""
+    gold = {}
+    if gold_json.get('title'):
+        gold[(normalize_heading_text(gold_json['title']), 1)] = 'title'
+    pending = list(gold_json.get('outline', []))
+    while pending:
+        h = pending.pop(0)
+        # Outlines written by build_outline nest H2/H3 entries under children
+        gold.setdefault((normalize_heading_text(h['text']), h['page']), h['level'])
+        pending.extend(h.get('children', []))
+    return gold
+
+
+def get_labels(elements, gold_index):
+    """Label each line by looking up (normalized text, page) in the gold index; 'O' if absent."""
+    return [gold_index.get((normalize_heading_text(text), page), 'O')
+            for text, page in zip(elements.texts, elements.page.tolist())]
+
+
+def assign_split(name, validation_fraction=DEFAULT_VALIDATION_FRACTION):
+    # Split by document, stable across runs and as documents are added
+    bucket = int(hashlib.sha1(name.encode('utf-8')).hexdigest(), 16) % 1000
+    return 'validation' if bucket < validation_fraction * 1000 else 'train'
+
+
+def label_document(pdf_path, gold_path, use_cache=True):
+    """Return (features, labels) for one PDF and its gold outline JSON."""
+    from utils.detect_headings import detect_language
+    from utils.language import line_languages
+    elements = extract_elements(pdf_path, use_cache=use_cache)
+    with open(gold_path, 'r', encoding='utf-8') as f:
+        gold_index = load_gold_headings(json.load(f))
+    features = extract_features(elements, line_languages(elements, detect_language(elements)))
+    return features, np.array(get_labels(elements, gold_index), dtype=str)
+
+
+def _dataset_version():
+    return {'dataset': DATASET_VERSION, 'feature_schema': FEATURE_SCHEMA_VERSION,
+            'extractor': EXTRACTOR_VERSION}
+
+
+def dataset_dir(splits_dir=DEFAULT_SPLITS_DIR):
+    """Versioned subdirectory of splits_dir holding the shards for this code."""
+    return Path(splits_dir) / f"d{DATASET_VERSION}.f{FEATURE_SCHEMA_VERSION}.x{EXTRACTOR_VERSION}"
+
+
+def source_fingerprints(pairs):
+    """sha256 of every (pdf, gold json) pair, keyed by document name."""
+    return {Path(pdf).name: [file_digest(pdf), file_digest(gold)] for pdf, gold in pairs}
+
+
+def splits_are_fresh(splits_dir, pairs, validation_fraction):
+    meta_path = dataset_dir(splits_dir) / 'meta.json'
+    if not meta_path.exists():
+        return False
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    return (meta.get('version') == _dataset_version()
+            and meta.get('validation_fraction') == validation_fraction
+            and meta.get('sources') == source_fingerprints(pairs))
+
+
+def write_splits(splits_dir, documents, pairs, validation_fraction):
+    """Write labelled documents as .npy shards per split plus meta.json.
+
+    documents is an iterable of (name, features, labels). Everything is
+    written to a temporary directory that replaces the versioned dataset
+    directory at the end, so an interrupted build never leaves a
+    half-written dataset.
+    """
+    splits_dir = dataset_dir(splits_dir)
+    tmp_dir = splits_dir.with_name(splits_dir.name + '.tmp')
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    buffers = {split: {'X': [], 'y': [], 'rows': 0, 'shards': [], 'documents': []} for split in SPLITS}
+
+    def flush(split):
+        buf = buffers[split]
+        if not buf['X']:
+            return
+        shard = f"{split}/shard-{len(buf['shards']):05d}"
+        (tmp_dir / split).mkdir(parents=True, exist_ok=True)
+        np.save(tmp_dir / f'{shard}.features.npy', np.vstack(buf['X']))
+        np.save(tmp_dir / f'{shard}.labels.npy', np.concatenate(buf['y']))
+        buf['shards'].append({'path': shard, 'rows': buf['rows']})
+        buf['X'], buf['y'], buf['rows'] = [], [], 0
+
+    for name, features, labels in documents:
+        split = assign_split(name, validation_fraction)
+        buf = buffers[split]
+        buf['X'].append(features)
+        buf['y'].append(labels)
+        buf['rows'] += len(labels)
+        buf['documents'].append({'name': name, 'rows': len(labels)})
+        if buf['rows'] >= SHARD_ROWS:
+            flush(split)
+    for split in SPLITS:
+        flush(split)
+
+    tmp_dir.mkdir(parents=True, exist_ok=True)
+    meta = {
+        'version': _dataset_version(),
+        'feature_names': FEATURE_NAMES,
+        'validation_fraction': validation_fraction,
+        'sources': source_fingerprints(pairs),
+        'splits': {split: {'shards': buffers[split]['shards'], 'documents': buffers[split]['documents']}
+                   for split in SPLITS},
+    }
+    with open(tmp_dir / 'meta.json', 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    shutil.rmtree(splits_dir, ignore_errors=True)
+    tmp_dir.rename(splits_dir)
+    return meta
+
+
+def split_documents(splits_dir, split):
+    """(name, start row, stop row) of every document in a split, in load_split's row order."""
+    with open(dataset_dir(splits_dir) / 'meta.json', 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    bounds, start = [], 0
+    for doc in meta['splits'][split]['documents']:
+        bounds.append((doc['name'], start, start + doc['rows']))
+        start += doc['rows']
+    return bounds
+
+
+def load_split(splits_dir, split):
+    """Return (features, labels) for a split, memory-mapped when it is a single shard."""
+    splits_dir = dataset_dir(splits_dir)
+    with open(splits_dir / 'meta.json', 'r', encoding='utf-8') as f:
+        meta = json.load(f)
+    if meta.get('version') != _dataset_version():
+        raise ValueError(f"{splits_dir} was built with {meta.get('version')}, expected "
+                         f"{_dataset_version()}; rebuild it")
+    shards = meta['splits'][split]['shards']
+    if not shards:
+        return np.empty((0, len(FEATURE_NAMES))), np.empty(0, dtype=str)
+    X = [np.load(splits_dir / f"{s['path']}.features.npy", mmap_mode='r') for s in shards]
+    y = [np.load(splits_dir / f"{s['path']}.labels.npy", mmap_mode='r') for s in shards]
+    if len(shards) == 1:
+        return X[0], y[0]
+    logging.info(f"Concatenating {len(shards)} {split} shards")
+    return np.concatenate(X), np.concatenate(y)
@@ -0,0 +1,69 @@
+import time
+from contextlib import contextmanager
+from utils import metrics
+
+# Budgets are opt-in: a degraded outline depends on machine load, so by
+# default every document runs in full. The hackathon constraint (an
+# outline within 10 seconds per document) is HACKATHON_DOC_BUDGET, which
+# the container passes as --doc_budget.
+DEFAULT_DOC_BUDGET = None
+HACKATHON_DOC_BUDGET = 10.0
+
+# Cheaper modes, in the order they are switched on, and the fraction of
+# the budget that must be used up before each one applies.
+SKIP_SIMILARITY = 'skip_similarity'
+SKIP_LANGDETECT = 'skip_langdetect'
+SAMPLE_FONT_PAGES = 'sample_font_pages'
+DEGRADATION_LADDER = (
+    (SKIP_SIMILARITY, 0.5),
+    (SKIP_LANGDETECT, 0.7),
+    (SAMPLE_FONT_PAGES, 0.85),
+)
+
+
+class Deadline:
+    """Time budget for one document, checked between pipeline stages.
+
+    budget is in seconds from now; expires_at is an absolute time.time()
+    (the end of a batch budget, which can be shared across processes). The
+    tighter of the two applies; with neither, nothing is ever degraded.
+    Stage durations are recorded so a slow document shows where its time
+    went.
+    """
+
+    def __init__(self, budget=None, expires_at=None):
+        self.start = time.perf_counter()
+        limits = [b for b in (budget, expires_at and max(0.0, expires_at - time.time()))
+                  if b is not None]
+        self.budget = min(limits) if limits else None
+        self.degradations = []
+        self.stages = {}
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def remaining(self):
+        if self.budget is None:
+            return float('inf')
+        return self.budget - self.elapsed()
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            with metrics.span(name):
+                yield
+        finally:
+            self.stages[name] = self.stages.get(name, 0.0) + time.perf_counter() - start
+
+    def checkpoint(self):
+        """Switch on every degradation whose share of the budget is used up."""
+        if self.budget is None:
+            return
+        used = self.elapsed() / self.budget if self.budget > 0 else 1.0
+        for step, threshold in DEGRADATION_LADDER:
+            if used >= threshold and step not in self.degradations:
+                self.degradations.append(step)
+
+    def degraded(self, step):
+        return step in self.degradations
@@ -1,123 +1,399 @@
 import re
-import spacy
-from scipy.spatial.distance import cosine
 import os
+import logging
 import pickle
+import time
 import numpy as np
-from langdetect import detect
-
-# Load lightweight spaCy model
-nlp = spacy.load("en_core_web_sm")
+from collections import Counter, deque
+from utils.elements import as_document_elements
+from utils.features import extract_features, check_feature_schema, NO_CASE_LANGS
+from utils.tree_model import CompiledForest, predict_with_proba
+from utils.deadline import Deadline, SKIP_SIMILARITY, SKIP_LANGDETECT, SAMPLE_FONT_PAGES
+from utils.furniture import FurnitureIndex, furniture_mask
+from utils.language import detect_language_sample, page_language, LANG_SAMPLE_LINES
+from utils import metrics
 
+# spaCy, langdetect and the classifier (which pulls in lightgbm when
+# unpickled) are loaded on first use, so importing this module is cheap.
+SPACY_MODEL = "en_core_web_sm"
 MODEL_PATH = 'models/heading_classifier.pkl'
-if os.path.exists(MODEL_PATH):
-    with open(MODEL_PATH, 'rb') as f:
-        _ml = pickle.load(f)
-    clf = _ml['model']
-    label_map = {v: k for k, v in _ml['label_map'].items()}
-else:
-    clf = None
-    label_map = None
-
-def extract_features(elements, lang='en'):
-    features = []
-    for i, el in enumerate(elements):
-        text = el['text']
-        font_size = el.get('font_size', 12.0)
-        is_bold = el.get('is_bold', 0)
-        is_italic = el.get('is_italic', 0)
-        text_len = len(text)
-        if lang in ['ja', 'hi']:
-            cap_ratio = 0.0
-        else:
-            cap_ratio = sum(1 for c in text if c.isupper()) / (len(text) or 1)
-        whitespace_above = el.get('whitespace_above', 0)
-        y_pos = el.get('top', 0)
-        y_pct = y_pos / (el.get('page_height', 1) or 1)
-        num_pattern = 0
-        if any([text.strip().startswith(p) for p in ['1.', '1.1', '1.1.1', 'I.', 'A.']]):
-            num_pattern = 1
-        features.append([
-            font_size, is_bold, is_italic, text_len, cap_ratio, whitespace_above, y_pct, num_pattern
-        ])
-    return np.array(features)
-
-def detect_language(elements):
-    # Use langdetect on the first 10 lines with text
-    texts = [el['text'] for el in elements if el['text'].strip()]
-    sample = ' '.join(texts[:10])
-    try:
-        lang = detect(sample)
-    except Exception:
-        lang = 'en'
-    return lang
-
-def detect_heading_structure(elements):
-    headings = []
-    seen = set()
-    lang = detect_language(elements)
-
-    texts = [el["text"].strip() for el in elements if el["text"].strip()]
-    docs = [nlp(text) for text in texts]
-    avg_vector = sum(doc.vector for doc in docs) / len(docs)
-    font_sizes = sorted({round(el["font_size"], 1) for el in elements}, reverse=True)[:2]
-
-    # ML prediction if model is available
-    ml_preds = None
-    ml_probs = None
-    if clf is not None:
-        feats = extract_features(elements, lang)
-        ml_pred_idx = clf.predict(feats)
-        ml_preds = [label_map.get(idx, 'O') for idx in ml_pred_idx]
-        probas = clf.predict_proba(feats)
-        ml_probs = [float(np.max(p)) for p in probas]
+# Array export of the same model; preferred because it loads instantly
+# (memory-mapped) and needs no lightgbm import.
+COMPILED_MODEL_PATH = 'models/heading_classifier_trees'
+
+_nlp = None
+_classifier = None
+
+def get_nlp():
+    global _nlp
+    if _nlp is None:
+        import spacy
+        # Load lightweight spaCy model
+        _nlp = spacy.load(SPACY_MODEL)
+    return _nlp
+
+def _load_classifier():
+    if os.path.exists(os.path.join(COMPILED_MODEL_PATH, 'meta.json')):
+        forest = CompiledForest.load(COMPILED_MODEL_PATH)
+        check_feature_schema(forest.meta)
+        label_map = {int(v): k for k, v in forest.meta['label_map'].items()}
+        return forest, label_map
+    if os.path.exists(MODEL_PATH):
+        with open(MODEL_PATH, 'rb') as f:
+            _ml = pickle.load(f)
+        check_feature_schema(_ml)
+        return _ml['model'], {v: k for k, v in _ml['label_map'].items()}
+    return None, None
+
+def get_classifier():
+    """Return (clf, label_map), or (None, None) when no usable model has been trained.
+
+    The model is loaded and its feature schema checked once; a model that
+    fails either is reported once and detection falls back to the
+    heuristics, as infer.load_model does.
+    """
+    global _classifier
+    if _classifier is None:
+        try:
+            _classifier = _load_classifier()
+        except Exception as e:
+            logging.warning(f"Not using the heading classifier, falling back to heuristics: {e}")
+            _classifier = (None, None)
+    return _classifier
+
+def model_fingerprint():
+    """Short content hash of the model in use, or 'heuristic' when there is none."""
+    from utils.cache import file_digest
+    meta_path = os.path.join(COMPILED_MODEL_PATH, 'meta.json')
+    if os.path.exists(meta_path):
+        paths = [meta_path, os.path.join(COMPILED_MODEL_PATH, 'value.npy'),
+                 os.path.join(COMPILED_MODEL_PATH, 'threshold.npy')]
+    elif os.path.exists(MODEL_PATH):
+        paths = [MODEL_PATH]
     else:
-        ml_preds = ['O'] * len(elements)
-        ml_probs = [1.0] * len(elements)
-
-    for idx, el in enumerate(elements):
-        text = el["text"].strip()
-        font_size = round(el["font_size"], 1)
-        top = el.get("top", 0)
-        if not text or text in seen:
-            continue
-        word_count = len(text.split())
-        if lang in ['ja', 'hi']:
+        return 'heuristic'
+    return '-'.join(file_digest(p)[:8] for p in paths)
+
+def warm_up():
+    """Load every lazily loaded model now, e.g. before a long-running caller takes work."""
+    from langdetect.detector_factory import init_factory
+    get_nlp()
+    get_classifier()
+    init_factory()
+
+def __getattr__(name):
+    # Keep `detect_headings.nlp`, `.clf` and `.label_map` working, loaded lazily.
+    if name == 'nlp':
+        return get_nlp()
+    if name == 'clf':
+        return get_classifier()[0]
+    if name == 'label_map':
+        return get_classifier()[1]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Components that do not contribute to Doc.vector. In en_core_web_sm the
+# vector is the mean of the tok2vec tensor, so only tok2vec has to run.
+NON_VECTOR_PIPES = ('tagger', 'parser', 'senter', 'morphologizer', 'attribute_ruler',
+                    'lemmatizer', 'ner')
+EMBED_BATCH_SIZE = 256
+
+def embed_texts(texts, batch_size=EMBED_BATCH_SIZE):
+    """Return one vector per text, running the pipeline once per distinct text.
+
+    Empty strings get a zero row and are never sent to spaCy.
+    """
+    unique = {t: None for t in texts if t}
+    nlp = get_nlp()
+    disable = [name for name in nlp.pipe_names if name in NON_VECTOR_PIPES]
+    rows = [doc.vector for doc in nlp.pipe(unique, batch_size=batch_size, disable=disable)]
+    if not rows:
+        return np.zeros((len(texts), 0), dtype=np.float32)
+    index = {t: i for i, t in enumerate(unique)}
+    matrix = np.vstack(rows + [np.zeros_like(rows[0])])
+    return matrix[[index.get(t, len(rows)) for t in texts]]
+
+def cosine_similarity(matrix, vector):
+    # Rows or vectors with zero norm give nan, as scipy's cosine does.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (matrix @ vector) / (np.linalg.norm(matrix, axis=1) * np.linalg.norm(vector))
+
+# Under the sample_font_pages degradation, only every n-th page feeds the
+# font-size histogram.
+FONT_SAMPLE_STRIDE = 4
+
+def detect_language(elements, statistical=True):
+    # By script from the first 10 lines with text (see utils.language)
+    texts = [t for t in as_document_elements(elements).texts if t.strip()]
+    return detect_language_sample(texts, statistical)
+
+def _heuristic_level(text):
+    if re.match(r"^\d+\.\d+\.\d+\.\d+\s", text):
+        return "H4"
+    elif re.match(r"^\d+\.\d+\.\d+\s", text):
+        return "H3"
+    elif re.match(r"^\d+\.\s", text):
+        return "H1"
+    elif text.endswith(":"):
+        return "H3"
+    return "H2"
+
+class HeadingStructureBuilder:
+    """Builds the heading structure from pages fed one at a time.
+
+    Only running statistics are kept (a font-size histogram and the sum of
+    line vectors) plus the lines that can still become headings, so memory
+    does not grow with the amount of body text.
+
+    With a deadline, cheaper modes are switched on as the document falls
+    behind: no similarity filter (and no embedding), English for Latin
+    text instead of langdetect, and font statistics from every FONT_SAMPLE_STRIDE-th page.
+
+    Page furniture (see utils.furniture) is neither embedded, classified nor
+    considered as a heading. Pages fed without a furniture mask are held
+    back until FURNITURE_WINDOW more pages (or the end of the document) are
+    seen, and are then marked exactly as furniture_mask would.
+
+    The document language is detected from its first lines; each page then
+    gets its own by script (utils.language.page_language), which picks the
+    feature and word-count rules for that page.
+
+    With keep_probabilities, the result also holds the classifier's class
+    probabilities for every line ("probabilities", one row per line, nan
+    for lines it did not score), or None without a classifier.
+    """
+
+    def __init__(self, deadline=None, lang=None, keep_probabilities=False):
+        self.deadline = deadline or Deadline()
+        self.lang = lang
+        self._probabilities = [] if keep_probabilities else None
+        self.font_sizes = Counter()
+        self.candidates = []
+        self._pending_pages = []
+        self._lang_sample = []
+        self._vector_sum = None
+        self._vector_count = 0
+        self._line_count = 0
+        self._pages_seen = 0
+        self._furniture = FurnitureIndex()
+        self._furniture_pending = deque()
+        self.furniture_lines = 0
+        # Time spent embedding and classifying, and the lines it covered
+        self.model_seconds = 0.0
+        self.model_lines = 0
+
+    def add_page(self, lines, vectors=None, furniture=None, predictions=None):
+        """Feed one page.
+
+        vectors, if given, are its precomputed embed_texts rows, furniture
+        its rows of a whole-document furniture_mask and predictions its
+        (labels, probabilities) from the classifier, one per line.
+        """
+        lines = as_document_elements(lines)
+        if not len(lines):
+            return
+        if furniture is None:
+            self._furniture.add_page(lines)
+            self._furniture_pending.append((lines, vectors, predictions))
+            self._add_decided_pages()
+            return
+        self._add_page(lines, vectors, furniture, predictions)
+
+    def _add_decided_pages(self):
+        for furniture in self._furniture.ready():
+            lines, vectors, predictions = self._furniture_pending.popleft()
+            self._add_page(lines, vectors, furniture, predictions)
+
+    def _add_page(self, lines, vectors, furniture, predictions):
+        if self.lang is None:
+            # Word-count rules depend on the language, which is detected
+            # from the first lines; hold pages back until it is known.
+            self._pending_pages.append((lines, vectors, furniture, predictions))
+            self._lang_sample.extend(t for t in lines.texts if t.strip())
+            if len(self._lang_sample) >= LANG_SAMPLE_LINES:
+                self._resolve_language()
+            return
+        self._process_page(lines, vectors, furniture, predictions)
+
+    def _resolve_language(self):
+        self.deadline.checkpoint()
+        with metrics.span('language'):
+            self.lang = detect_language_sample(self._lang_sample,
+                                               statistical=not self.deadline.degraded(SKIP_LANGDETECT))
+        pending, self._pending_pages = self._pending_pages, []
+        for lines, vectors, furniture, predictions in pending:
+            self._process_page(lines, vectors, furniture, predictions)
+
+    def _top_font_floor(self):
+        # Headings must use one of the two largest font sizes seen so far.
+        # The floor only ever rises, so candidates below it can be dropped.
+        top_sizes = sorted(self.font_sizes, reverse=True)[:2]
+        return top_sizes[-1] if top_sizes else 0.0
+
+    def _process_page(self, lines, vectors, furniture, predictions=None):
+        self.deadline.checkpoint()
+        rounded = np.round(lines.font_size, 1)
+        if not self.deadline.degraded(SAMPLE_FONT_PAGES) or self._pages_seen % FONT_SAMPLE_STRIDE == 0:
+            sizes, counts = np.unique(rounded, return_counts=True)
+            self.font_sizes.update(dict(zip(sizes.tolist(), counts.tolist())))
+        self._pages_seen += 1
+        metrics.count('pages')
+        metrics.count('lines', len(lines))
+
+        # Furniture lines are blanked: embed_texts skips empty strings and
+        # blank lines never become candidates.
+        texts = [t.strip() for t in lines.texts]
+        n_furniture = int(furniture.sum())
+        if n_furniture:
+            texts = ['' if f else t for t, f in zip(texts, furniture.tolist())]
+            self.furniture_lines += n_furniture
+            metrics.count('furniture_lines', n_furniture)
+        has_text = np.fromiter(map(bool, texts), dtype=bool, count=len(texts))
+        lang = page_language(lines, self.lang, statistical=not self.deadline.degraded(SKIP_LANGDETECT))
+        started = time.perf_counter()
+        if self.deadline.degraded(SKIP_SIMILARITY):
+            vectors = None
+        elif vectors is None:
+            with metrics.span('embed'):
+                vectors = embed_texts(texts)
+        self._line_count += int(has_text.sum())
+        if vectors is not None and has_text.any():
+            page_sum = vectors[has_text].sum(axis=0)
+            self._vector_sum = page_sum if self._vector_sum is None else self._vector_sum + page_sum
+            self._vector_count += int(has_text.sum())
+
+        # ML prediction if model is available
+        clf, label_map = get_classifier()
+        ml_preds = ['O'] * len(lines)
+        ml_probs = [1.0] * len(lines)
+        rows = np.flatnonzero(has_text)
+        if self._probabilities is not None and clf is not None:
+            page_probas = np.full((len(lines), len(label_map)), np.nan)
+            self._probabilities.append(page_probas)
+        if predictions is not None:
+            ml_preds, ml_probs = predictions
+        elif clf is not None and len(rows):
+            with metrics.span('predict'):
+                # Features need the whole page (neighbouring lines), the
+                # model only the lines that can become headings.
+                feats = extract_features(lines, lang)
+                ml_pred_idx, probas = predict_with_proba(clf, feats[rows])
+            for row, idx, prob in zip(rows.tolist(), ml_pred_idx.tolist(), np.max(probas, axis=1).tolist()):
+                ml_preds[row] = label_map.get(idx, 'O')
+                ml_probs[row] = prob
+            if self._probabilities is not None:
+                page_probas[rows] = probas
+        self.model_seconds += time.perf_counter() - started
+        self.model_lines += len(rows)
+
+        floor = self._top_font_floor()
+        kept = [c for c in self.candidates if c["font_size"] >= floor]
+        metrics.count('candidates_pruned', len(self.candidates) - len(kept))
+        self.candidates = kept
+        n_candidates = len(kept)
+        if lang in NO_CASE_LANGS:
             # Japanese/Hindi: skip capitalization, allow shorter/longer headings
-            if word_count < 1 or word_count > 20:
-                continue
+            min_words, max_words = 1, 20
         else:
-            if word_count < 2 or word_count > 12:
+            min_words, max_words = 2, 12
+        for idx in np.flatnonzero(rounded >= floor).tolist():
+            text = texts[idx]
+            if not text:
+                continue
+            word_count = len(text.split())
+            if word_count < min_words or word_count > max_words:
+                continue
+            if text[0] in {"-", "•", "—", "|"} or re.search(r"\.{5,}", text):
                 continue
-        if text[0] in {"-", "•", "—", "|"} or re.search(r"\.{5,}", text):
-            continue
-        if font_size not in font_sizes:
-            continue
-        sim = 1 - cosine(nlp(text).vector, avg_vector)
-        if sim > 0.9:
-            continue
-        # Heuristic level
-        if re.match(r"^\d+\.\d+\.\d+\.\d+\s", text):
-            level = "H4"
-        elif re.match(r"^\d+\.\d+\.\d+\s", text):
-            level = "H3"
-        elif re.match(r"^\d+\.\s", text):
-            level = "H1"
-        elif text.endswith(":"):
-            level = "H3"
+            self.candidates.append({
+                "text": text,
+                "font_size": float(rounded[idx]),
+                "page": int(lines.page[idx]),
+                "top": float(lines.top[idx]),
+                "vector": vectors[idx] if vectors is not None else None,
+                "ml_level": ml_preds[idx],
+                "ml_prob": ml_probs[idx],
+            })
+        metrics.count('candidates', len(self.candidates) - n_candidates)
+
+    def result(self):
+        self._furniture.finish()
+        self._add_decided_pages()
+        if self.lang is None:
+            self._resolve_language()
+        furniture = self.furniture_stats()
+        if not self._line_count:
+            return self._result({"language": self.lang or 'en', "headings": [], "furniture": furniture})
+
+        floor = self._top_font_floor()
+        if self.deadline.degraded(SKIP_SIMILARITY):
+            sims = [0.0] * len(self.candidates)
+        elif self.candidates:
+            avg_vector = self._vector_sum / self._vector_count
+            sims = cosine_similarity(np.vstack([c["vector"] for c in self.candidates]), avg_vector)
         else:
-            level = "H2"
-        # ML adjustment
-        ml_level = ml_preds[idx]
-        confidence = ml_probs[idx] if ml_level != 'O' else 1.0
-        if ml_level != 'O':
-            level = ml_level
-        headings.append({
-            "level": level,
-            "text": text if text.endswith(" ") else text + " ",
-            "page": el["page"],
-            "confidence": confidence,
-            "top": top
-        })
-        seen.add(text)
-    return {"language": lang, "headings": headings}
+            sims = []
+        headings = []
+        seen = set()
+        for c, sim in zip(self.candidates, sims):
+            text = c["text"]
+            if text in seen:
+                metrics.count('headings_rejected_duplicate')
+                continue
+            if c["font_size"] < floor:
+                metrics.count('headings_rejected_font')
+                continue
+            if sim > 0.9:
+                metrics.count('headings_rejected_similarity')
+                continue
+            # Heuristic level
+            level = _heuristic_level(text)
+            # ML adjustment
+            ml_level = c["ml_level"]
+            confidence = c["ml_prob"] if ml_level != 'O' else 1.0
+            if ml_level != 'O':
+                level = ml_level
+            headings.append({
+                "level": level,
+                "text": text if text.endswith(" ") else text + " ",
+                "page": c["page"],
+                "confidence": confidence,
+                "top": c["top"]
+            })
+            seen.add(text)
+        metrics.count('headings_kept', len(headings))
+        return self._result({"language": self.lang, "headings": headings, "furniture": furniture})
+
+    def _result(self, result):
+        if self._probabilities is not None:
+            result["probabilities"] = np.vstack(self._probabilities) if self._probabilities else None
+        return result
+
+    def furniture_stats(self):
+        # Lines pruned as furniture and the embedding/classifier time that
+        # saved, estimated from the per-line cost of the processed lines
+        per_line = self.model_seconds / self.model_lines if self.model_lines else 0.0
+        saved = self.furniture_lines * per_line
+        metrics.count('furniture_ms_saved', round(saved * 1000))
+        return {"lines_pruned": self.furniture_lines, "seconds_saved": round(saved, 6)}
+
+def detect_heading_structure(elements, deadline=None, keep_probabilities=False):
+    elements = as_document_elements(elements)
+    deadline = deadline or Deadline()
+    deadline.checkpoint()
+    with metrics.span('furniture'):
+        furniture = furniture_mask(elements)
+    builder = HeadingStructureBuilder(deadline, keep_probabilities=keep_probabilities)
+    vectors = None
+    if not deadline.degraded(SKIP_SIMILARITY):
+        # Embed the whole document in one batched pass, then feed it page by page.
+        texts = [t.strip() for t in elements.texts]
+        texts = ['' if f else t for t, f in zip(texts, furniture.tolist())]
+        started = time.perf_counter()
+        with deadline.stage('embed'):
+            vectors = embed_texts(texts)
+        builder.model_seconds += time.perf_counter() - started
+    with deadline.stage('headings'):
+        for start, stop in elements.page_bounds():
+            builder.add_page(elements[start:stop], None if vectors is None else vectors[start:stop],
+                             furniture[start:stop])
+        return builder.result()
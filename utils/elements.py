@@ -0,0 +1,239 @@
+import numpy as np
+
+
+class DocumentElements:
+    """Columnar store for the text lines of a document.
+
+    Numeric attributes live in NumPy arrays, every line's text shares one
+    string buffer addressed by offsets, and font names are interned into a
+    small table. Indexing with an int returns the familiar element dict;
+    slices and index/boolean arrays return another DocumentElements.
+    """
+
+    __slots__ = ("font_size", "top", "bottom", "whitespace_above", "page",
+                 "is_bold", "is_italic", "font_id", "fontnames",
+                 "_text_buffer", "_text_offsets")
+
+    def __init__(self, text_buffer, text_offsets, font_size, top, bottom,
+                 whitespace_above, page, is_bold, is_italic, font_id, fontnames):
+        self._text_buffer = text_buffer
+        self._text_offsets = text_offsets
+        self.font_size = font_size
+        self.top = top
+        self.bottom = bottom
+        self.whitespace_above = whitespace_above
+        self.page = page
+        self.is_bold = is_bold
+        self.is_italic = is_italic
+        self.font_id = font_id
+        self.fontnames = fontnames
+
+    @classmethod
+    def from_columns(cls, texts, font_size, fontname, is_bold, is_italic, top, bottom,
+                     whitespace_above, page):
+        font_ids = {}
+        font_id = np.fromiter((font_ids.setdefault(name, len(font_ids)) for name in fontname),
+                              dtype=np.int32, count=len(fontname))
+        offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, texts), dtype=np.int64, count=len(texts)), out=offsets[1:])
+        return cls(
+            "".join(texts), offsets,
+            np.asarray(font_size, dtype=np.float64),
+            np.asarray(top, dtype=np.float64),
+            np.asarray(bottom, dtype=np.float64),
+            np.asarray(whitespace_above, dtype=np.float64),
+            np.asarray(page, dtype=np.int32),
+            np.asarray(is_bold, dtype=bool),
+            np.asarray(is_italic, dtype=bool),
+            font_id, list(font_ids),
+        )
+
+    @classmethod
+    def from_records(cls, records):
+        records = list(records)
+        return cls.from_columns(
+            [el["text"] for el in records],
+            [el.get("font_size", 12.0) for el in records],
+            [el.get("fontname", "") for el in records],
+            [el.get("is_bold", 0) for el in records],
+            [el.get("is_italic", 0) for el in records],
+            [el.get("top", 0.0) for el in records],
+            [el.get("bottom", 0.0) for el in records],
+            [el.get("whitespace_above", 0.0) for el in records],
+            [el.get("page", 1) for el in records],
+        )
+
+    @classmethod
+    def empty(cls):
+        return cls.from_columns([], [], [], [], [], [], [], [], [])
+
+    @classmethod
+    def concat(cls, parts):
+        parts = [p for p in parts if len(p)]
+        if not parts:
+            return cls.empty()
+        if len(parts) == 1:
+            return parts[0]
+        font_ids = {}
+        font_id = []
+        for p in parts:
+            remap = np.array([font_ids.setdefault(name, len(font_ids)) for name in p.fontnames],
+                             dtype=np.int32)
+            font_id.append(remap[p.font_id])
+        offsets = [parts[0]._text_offsets]
+        shift = parts[0]._text_offsets[-1]
+        for p in parts[1:]:
+            offsets.append(p._text_offsets[1:] + shift)
+            shift += p._text_offsets[-1]
+        return cls(
+            "".join(p._text_buffer for p in parts),
+            np.concatenate(offsets),
+            np.concatenate([p.font_size for p in parts]),
+            np.concatenate([p.top for p in parts]),
+            np.concatenate([p.bottom for p in parts]),
+            np.concatenate([p.whitespace_above for p in parts]),
+            np.concatenate([p.page for p in parts]),
+            np.concatenate([p.is_bold for p in parts]),
+            np.concatenate([p.is_italic for p in parts]),
+            np.concatenate(font_id),
+            list(font_ids),
+        )
+
+    def __len__(self):
+        return len(self.page)
+
+    def text(self, i):
+        return self._text_buffer[self._text_offsets[i]:self._text_offsets[i + 1]]
+
+    @property
+    def texts(self):
+        buf, off = self._text_buffer, self._text_offsets.tolist()
+        return [buf[off[i]:off[i + 1]] for i in range(len(off) - 1)]
+
+    @property
+    def text_buffer(self):
+        return self._text_buffer
+
+    @property
+    def text_offsets(self):
+        return self._text_offsets
+
+    @property
+    def text_lengths(self):
+        return np.diff(self._text_offsets)
+
+    @property
+    def fontname(self):
+        return [self.fontnames[i] for i in self.font_id.tolist()]
+
+    @property
+    def nbytes(self):
+        arrays = (self._text_offsets, self.font_size, self.top, self.bottom,
+                  self.whitespace_above, self.page, self.is_bold, self.is_italic, self.font_id)
+        return sum(a.nbytes for a in arrays) + len(self._text_buffer.encode("utf-8"))
+
+    def _row(self, i):
+        return {
+            "text": self.text(i),
+            "font_size": float(self.font_size[i]),
+            "fontname": self.fontnames[self.font_id[i]],
+            "is_bold": int(self.is_bold[i]),
+            "is_italic": int(self.is_italic[i]),
+            "top": float(self.top[i]),
+            "bottom": float(self.bottom[i]),
+            "whitespace_above": float(self.whitespace_above[i]),
+            "page": int(self.page[i]),
+        }
+
+    def _slice(self, start, stop):
+        off0, off1 = self._text_offsets[start], self._text_offsets[stop]
+        return DocumentElements(
+            self._text_buffer[off0:off1],
+            self._text_offsets[start:stop + 1] - off0,
+            self.font_size[start:stop], self.top[start:stop], self.bottom[start:stop],
+            self.whitespace_above[start:stop], self.page[start:stop],
+            self.is_bold[start:stop], self.is_italic[start:stop],
+            self.font_id[start:stop], self.fontnames,
+        )
+
+    def take(self, indices):
+        indices = np.asarray(indices)
+        if indices.dtype == bool:
+            indices = np.flatnonzero(indices)
+        texts = [self.text(i) for i in indices.tolist()]
+        offsets = np.zeros(len(texts) + 1, dtype=np.int64)
+        np.cumsum(np.fromiter(map(len, texts), dtype=np.int64, count=len(texts)), out=offsets[1:])
+        return DocumentElements(
+            "".join(texts), offsets,
+            self.font_size[indices], self.top[indices], self.bottom[indices],
+            self.whitespace_above[indices], self.page[indices],
+            self.is_bold[indices], self.is_italic[indices],
+            self.font_id[indices], self.fontnames,
+        )
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(len(self))
+            if step == 1:
+                return self._slice(start, max(start, stop))
+            return self.take(np.arange(start, stop, step))
+        if isinstance(key, (int, np.integer)):
+            if key < 0:
+                key += len(self)
+            if not 0 <= key < len(self):
+                raise IndexError("element index out of range")
+            return self._row(key)
+        return self.take(key)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._row(i)
+
+    def to_records(self):
+        return list(self)
+
+    def page_bounds(self):
+        """Return (start, stop) row ranges of each page, in document order."""
+        if not len(self):
+            return []
+        bounds = np.flatnonzero(np.diff(self.page)) + 1
+        starts = [0] + bounds.tolist()
+        stops = bounds.tolist() + [len(self)]
+        return list(zip(starts, stops))
+
+    def split_pages(self):
+        """Yield one DocumentElements view per page, in document order."""
+        for start, stop in self.page_bounds():
+            yield self._slice(start, stop)
+
+    def save(self, file):
+        """Write the columns to an .npz archive (no pickling)."""
+        np.savez_compressed(
+            file,
+            text=np.frombuffer(self._text_buffer.encode("utf-8"), dtype=np.uint8),
+            text_offsets=self._text_offsets,
+            font_size=self.font_size, top=self.top, bottom=self.bottom,
+            whitespace_above=self.whitespace_above, page=self.page,
+            is_bold=self.is_bold, is_italic=self.is_italic,
+            font_id=self.font_id, fontnames=np.array(self.fontnames, dtype=str),
+        )
+
+    @classmethod
+    def load(cls, file):
+        with np.load(file, allow_pickle=False) as data:
+            return cls(
+                data["text"].tobytes().decode("utf-8"), data["text_offsets"],
+                data["font_size"], data["top"], data["bottom"], data["whitespace_above"],
+                data["page"], data["is_bold"], data["is_italic"], data["font_id"],
+                data["fontnames"].tolist(),
+            )
+
+    def __repr__(self):
+        return f"DocumentElements(lines={len(self)}, pages={len(np.unique(self.page))})"
+
+
+def as_document_elements(elements):
+    """Accept a DocumentElements or an iterable of element dicts."""
+    if isinstance(elements, DocumentElements):
+        return elements
+    return DocumentElements.from_records(elements)
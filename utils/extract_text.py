@@ -1,39 +1,302 @@
-import pdfplumber
-from collections import defaultdict
-
-def extract_elements(pdf_path):
-    elements = []
-    with pdfplumber.open(pdf_path) as pdf:
-        for i, page in enumerate(pdf.pages):
-            words = page.extract_words(extra_attrs=["fontname", "size", "top", "bottom"], use_text_flow=True)
-            lines_by_top = defaultdict(list)
-            for word in words:
-                key = round(word['top'], 1)
-                lines_by_top[key].append(word)
-
-            prev_bottom = None
-            for top in sorted(lines_by_top):
-                line_words = sorted(lines_by_top[top], key=lambda w: w['x0'])
-                line_text = " ".join(w['text'] for w in line_words)
-                font_size = float(line_words[0].get('size', 12.0))
-                fontname = line_words[0].get('fontname', '')
-                is_bold = int('bold' in fontname.lower())
-                is_italic = int('italic' in fontname.lower() or 'oblique' in fontname.lower())
-                line_top = float(line_words[0].get('top', 0))
-                line_bottom = float(line_words[0].get('bottom', 0))
-                whitespace_above = 0.0
-                if prev_bottom is not None:
-                    whitespace_above = max(0.0, line_top - prev_bottom)
-                prev_bottom = line_bottom
-                elements.append({
-                    "text": line_text.strip(),
-                    "font_size": font_size,
-                    "fontname": fontname,
-                    "is_bold": is_bold,
-                    "is_italic": is_italic,
-                    "top": line_top,
-                    "bottom": line_bottom,
-                    "whitespace_above": whitespace_above,
-                    "page": page.page_number
-                })
+import math
+import multiprocessing
+import os
+import numpy as np
+from collections import Counter, defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from utils.elements import DocumentElements
+from utils.cache import ElementCache, DEFAULT_CACHE_DIR, DEFAULT_CACHE_MAX_MB
+from utils.pdf_backends import open_pdf, resolve_backend, DEFAULT_BACKEND, EXACT_BACKENDS
+
+# Only shard documents at least this long; below it the cost of starting
+# workers and re-opening the file outweighs the gain.
+PARALLEL_MIN_PAGES = 64
+MIN_CHUNK_PAGES = 16
+
+# Bump whenever a change here alters the extracted elements; cached
+# extractions from other versions are then ignored.
+EXTRACTOR_VERSION = 3
+
+# Line assembly from characters. Characters whose bottoms lie within this
+# fraction of the font size of a line's first character join that line, so
+# small baseline jitter no longer splits it. Inside a line, a horizontal gap
+# wider than COLUMN_GAP_RATIO font sizes starts a separate line (another
+# column) when the text on both sides of it has more than one word or the
+# two sides' baselines differ by over COLUMN_BASELINE_RATIO font sizes, so a
+# bullet and its item, or a table row of one-word cells, stay one line. A
+# font size change of more than SIZE_CHANGE_RATIO at a word break (a run-in
+# heading) also starts a new line. A gap wider than WORD_GAP points, or a
+# space character, separates words, as in pdfplumber's extract_words.
+LINE_TOLERANCE_RATIO = 0.3
+COLUMN_GAP_RATIO = 1.5
+COLUMN_BASELINE_RATIO = 0.1
+SIZE_CHANGE_RATIO = 0.1
+WORD_GAP = 3.0
+# The same glyph drawn again within this many points (fake bold, shadows)
+# is kept once.
+DUPLICATE_CHAR_TOLERANCE = 1.0
+
+_element_cache = None
+
+
+def get_element_cache():
+    """Process-wide element cache, configured by R1A_CACHE_DIR / R1A_CACHE_MAX_MB."""
+    global _element_cache
+    if _element_cache is None:
+        max_mb = int(os.environ.get('R1A_CACHE_MAX_MB', DEFAULT_CACHE_MAX_MB))
+        _element_cache = ElementCache(os.environ.get('R1A_CACHE_DIR', DEFAULT_CACHE_DIR),
+                                      EXTRACTOR_VERSION, max_mb * 1024 * 1024)
+    return _element_cache
+
+
+def _word_starts(chars, run):
+    # Positions in run of the characters that begin a word
+    starts = []
+    pending_space = True
+    prev_x1 = None
+    for k, i in enumerate(run):
+        c = chars[i]
+        if not c['text'].strip():
+            pending_space = True
+            continue
+        if pending_space or c['x0'] - prev_x1 > WORD_GAP:
+            starts.append(k)
+        pending_space = False
+        prev_x1 = c['x1']
+    return starts
+
+
+def _baseline_shift(a, b):
+    return abs(a['bottom'] - b['bottom']) > COLUMN_BASELINE_RATIO * min(a['size'], b['size'])
+
+
+def _line_segments(chars, order):
+    # Split one baseline cluster, sorted by x0, into lines: first into runs
+    # at column-sized gaps, then keep the column breaks between multi-word
+    # runs or runs on different baselines, and add breaks where the font
+    # size changes at a word start.
+    runs = [[order[0]]]
+    for prev, i in zip(order, order[1:]):
+        if chars[i]['x0'] - chars[prev]['x1'] > COLUMN_GAP_RATIO * chars[prev]['size']:
+            runs.append([])
+        runs[-1].append(i)
+    sizes = [chars[i]['size'] for i in order]
+    if len(runs) == 1 and max(sizes) - min(sizes) <= SIZE_CHANGE_RATIO * min(sizes):
+        # The common case: one column, one size
+        yield order
+        return
+    starts = [_word_starts(chars, run) for run in runs]
+    segment, size = [], None
+    for n, run in enumerate(runs):
+        if n and segment and starts[n] and starts[n - 1] and (
+                len(starts[n - 1]) > 1 and len(starts[n]) > 1
+                or _baseline_shift(chars[runs[n - 1][starts[n - 1][0]]], chars[run[starts[n][0]]])):
+            yield segment
+            segment = []
+        run_starts = set(starts[n])
+        for k, i in enumerate(run):
+            c = chars[i]
+            if c['text'].strip():
+                if (k in run_starts and segment and size is not None
+                        and abs(c['size'] - size) > SIZE_CHANGE_RATIO * min(c['size'], size)):
+                    yield segment
+                    segment = []
+                size = c['size']
+            segment.append(i)
+    if segment:
+        yield segment
+
+
+def _segment_line(chars, segment):
+    # Text with word breaks, plus the dominant (size, font) by character count
+    parts = []
+    styles = Counter()
+    pending_space = False
+    prev_x1 = prev = None
+    top, bottom = float('inf'), float('-inf')
+    for i in segment:
+        c = chars[i]
+        text = c['text']
+        if not text.strip():
+            pending_space = True
+            continue
+        if (prev is not None and text == prev['text']
+                and abs(c['x0'] - prev['x0']) <= DUPLICATE_CHAR_TOLERANCE):
+            continue
+        prev = c
+        if parts and (pending_space or c['x0'] - prev_x1 > WORD_GAP):
+            parts.append(' ')
+        parts.append(text)
+        pending_space = False
+        prev_x1 = c['x1']
+        styles[(c['size'], c['fontname'])] += len(text)
+        top = min(top, c['top'])
+        bottom = max(bottom, c['bottom'])
+    if not styles:
+        return None
+    (size, fontname), _ = styles.most_common(1)[0]
+    return ''.join(parts), float(size), fontname, float(top), float(bottom), chars[segment[0]]['x0'], prev_x1
+
+
+def _build_page_lines(chars, page_number):
+    """Build the page's lines in one pass over its characters.
+
+    Characters are sorted by bottom edge and swept into baseline clusters
+    with a tolerance relative to font size; each cluster is ordered by x and
+    split into columns at wide gaps. Font size and name are the ones covering
+    most characters of the line. whitespace_above is the gap to the nearest
+    earlier line that overlaps horizontally, i.e. the line above in the same
+    column.
+    """
+    lines = []
+    if chars:
+        bottoms = np.fromiter((c['bottom'] for c in chars), dtype=np.float64, count=len(chars))
+        order = np.argsort(bottoms, kind='stable').tolist()
+        cluster = [order[0]]
+        limit = bottoms[order[0]] + LINE_TOLERANCE_RATIO * chars[order[0]]['size']
+        clusters = []
+        for i in order[1:]:
+            if bottoms[i] > limit:
+                clusters.append(cluster)
+                cluster = []
+                limit = bottoms[i] + LINE_TOLERANCE_RATIO * chars[i]['size']
+            cluster.append(i)
+        clusters.append(cluster)
+        for cluster in clusters:
+            cluster.sort(key=lambda i: chars[i]['x0'])
+            for segment in _line_segments(chars, cluster):
+                line = _segment_line(chars, segment)
+                if line is not None:
+                    lines.append(line)
+        lines.sort(key=lambda line: (line[3], line[5]))
+
+    texts, font_sizes, fontnames, bold, italic = [], [], [], [], []
+    tops, bottoms_out, whitespace = [], [], []
+    for n, (text, size, fontname, top, bottom, x0, x1) in enumerate(lines):
+        whitespace_above = 0.0
+        for j in range(n - 1, -1, -1):
+            prev = lines[j]
+            if prev[5] < x1 and x0 < prev[6]:
+                whitespace_above = max(0.0, top - prev[4])
+                break
+        texts.append(text)
+        font_sizes.append(size)
+        fontnames.append(fontname)
+        bold.append('bold' in fontname.lower())
+        italic.append('italic' in fontname.lower() or 'oblique' in fontname.lower())
+        tops.append(top)
+        bottoms_out.append(bottom)
+        whitespace.append(whitespace_above)
+    return DocumentElements.from_columns(
+        texts, font_sizes, fontnames, bold, italic, tops, bottoms_out, whitespace,
+        [page_number] * len(texts)
+    )
+
+
+def _extract_page_lines_from_words(page):
+    # Previous line builder (EXTRACTOR_VERSION 1): words bucketed by top
+    # rounded to 0.1pt, font from each line's first word. Kept as the
+    # reference for src/r1a/bench_lines.py. Takes a pdfplumber page.
+    words = page.extract_words(extra_attrs=["fontname", "size", "top", "bottom"], use_text_flow=True)
+    lines_by_top = defaultdict(list)
+    for word in words:
+        key = round(word['top'], 1)
+        lines_by_top[key].append(word)
+
+    texts, font_sizes, fontnames, bold, italic = [], [], [], [], []
+    tops, bottoms, whitespace = [], [], []
+    prev_bottom = None
+    for top in sorted(lines_by_top):
+        line_words = sorted(lines_by_top[top], key=lambda w: w['x0'])
+        line_text = " ".join(w['text'] for w in line_words)
+        fontname = line_words[0].get('fontname', '')
+        line_top = float(line_words[0].get('top', 0))
+        line_bottom = float(line_words[0].get('bottom', 0))
+        whitespace_above = 0.0
+        if prev_bottom is not None:
+            whitespace_above = max(0.0, line_top - prev_bottom)
+        prev_bottom = line_bottom
+        texts.append(line_text.strip())
+        font_sizes.append(float(line_words[0].get('size', 12.0)))
+        fontnames.append(fontname)
+        bold.append('bold' in fontname.lower())
+        italic.append('italic' in fontname.lower() or 'oblique' in fontname.lower())
+        tops.append(line_top)
+        bottoms.append(line_bottom)
+        whitespace.append(whitespace_above)
+    return DocumentElements.from_columns(
+        texts, font_sizes, fontnames, bold, italic, tops, bottoms, whitespace,
+        [page.page_number] * len(texts)
+    )
+
+
+def _iter_page_lines(document, start=0, stop=None):
+    for page_number, chars in document.iter_page_chars(start, stop):
+        yield _build_page_lines(chars, page_number)
+
+
+def iter_page_elements(pdf_path, backend=DEFAULT_BACKEND):
+    """Yield a DocumentElements for one page at a time.
+
+    Each page's characters are dropped as soon as its lines are built, so
+    peak memory stays flat regardless of document length.
+    """
+    with open_pdf(pdf_path, backend) as document:
+        yield from _iter_page_lines(document)
+
+
+def _extract_page_range(pdf_path, start, stop, backend):
+    # Runs in a worker process; each worker opens its own handle.
+    with open_pdf(pdf_path, backend) as document:
+        return DocumentElements.concat(list(_iter_page_lines(document, start, stop)))
+
+
+def _page_chunks(n_pages, workers):
+    size = max(MIN_CHUNK_PAGES, math.ceil(n_pages / (workers * 4)))
+    return [(start, min(start + size, n_pages)) for start in range(0, n_pages, size)]
+
+
+def _can_shard(n_pages, workers):
+    # Pool workers are daemonic and may not start processes of their own,
+    # so documents handled inside a batch worker are extracted inline.
+    return (workers > 1 and n_pages >= PARALLEL_MIN_PAGES
+            and not multiprocessing.current_process().daemon)
+
+
+def extract_elements(pdf_path, workers=1, use_cache=True, backend=DEFAULT_BACKEND):
+    """Extract one element per text line, in page order, as a DocumentElements.
+
+    backend names the PDF engine from utils.pdf_backends ('auto' picks one
+    by page count, which is only counted on a cache miss). Results are
+    looked up in and stored to the on-disk element cache unless use_cache
+    is False or R1A_NO_CACHE is set; the exact backends share cache entries.
+
+    With workers > 1 and at least PARALLEL_MIN_PAGES pages, page ranges are
+    extracted in parallel processes and merged back in order. Chunks always
+    split on page boundaries and whitespace_above restarts at 0.0 on every
+    page, so the result is identical to sequential extraction.
+    """
+    if not use_cache or os.environ.get('R1A_NO_CACHE'):
+        return _extract_uncached(pdf_path, workers, backend)
+    cache = get_element_cache()
+    # 'auto' is keyed as itself: resolving it would open the PDF on every hit
+    key = cache.key(pdf_path, None if backend in EXACT_BACKENDS else backend)
+    elements = cache.get(key)
+    if elements is None:
+        elements = _extract_uncached(pdf_path, workers, backend)
+        cache.put(key, elements)
     return elements
+
+
+def _extract_uncached(pdf_path, workers, backend):
+    backend = resolve_backend(backend, pdf_path)
+    with open_pdf(pdf_path, backend) as document:
+        n_pages = len(document)
+        if not _can_shard(n_pages, workers):
+            return DocumentElements.concat(list(_iter_page_lines(document)))
+
+    chunks = _page_chunks(n_pages, workers)
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks))) as pool:
+        futures = [pool.submit(_extract_page_range, pdf_path, start, stop, backend)
+                   for start, stop in chunks]
+        return DocumentElements.concat([future.result() for future in futures])
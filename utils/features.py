@@ -0,0 +1,93 @@
+import re
+import numpy as np
+from utils.elements import as_document_elements
+
+# Bump whenever a feature is added, removed, reordered or computed
+# differently. The version is stored with the trained model and checked at
+# load time, so training and inference features cannot silently diverge.
+FEATURE_SCHEMA_VERSION = 2
+FEATURE_NAMES = [
+    'font_size', 'is_bold', 'is_italic', 'text_len', 'cap_ratio',
+    'whitespace_above', 'y_pct', 'num_pattern',
+]
+
+# Same as text.strip().startswith(('1.', '1.1', '1.1.1', 'I.', 'A.'))
+NUMBERING_RE = re.compile(r'\s*(?:1\.|I\.|A\.)')
+
+NO_CASE_LANGS = ('ja', 'hi')
+
+
+_BMP_UPPER = None
+
+
+def _is_upper(codepoints):
+    global _BMP_UPPER
+    if _BMP_UPPER is None:
+        # str.isupper for every code point in the Basic Multilingual Plane
+        _BMP_UPPER = np.fromiter((chr(c).isupper() for c in range(0x10000)), dtype=bool, count=0x10000)
+    mask = np.zeros(len(codepoints), dtype=bool)
+    in_bmp = codepoints < 0x10000
+    mask[in_bmp] = _BMP_UPPER[codepoints[in_bmp]]
+    if not in_bmp.all():
+        rest = np.flatnonzero(~in_bmp)
+        mask[rest] = [chr(c).isupper() for c in codepoints[rest].tolist()]
+    return mask
+
+
+def _uppercase_counts(elements):
+    # Look up each code point of the shared text buffer in a table, then
+    # count per line with a cumulative sum.
+    buffer = elements.text_buffer
+    offsets = elements.text_offsets
+    if not buffer:
+        return np.zeros(len(elements))
+    codepoints = np.frombuffer(buffer.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+    cumulative = np.concatenate([[0], np.cumsum(_is_upper(codepoints))])
+    return (cumulative[offsets[1:]] - cumulative[offsets[:-1]]).astype(np.float64)
+
+
+def _numbering_flags(elements):
+    buffer = elements.text_buffer
+    offsets = elements.text_offsets.tolist()
+    match = NUMBERING_RE.match
+    return np.fromiter(
+        (match(buffer, offsets[i], offsets[i + 1]) is not None for i in range(len(offsets) - 1)),
+        dtype=np.float64, count=len(offsets) - 1,
+    )
+
+
+def extract_features(elements, lang='en'):
+    """Build the (n_lines, len(FEATURE_NAMES)) feature matrix in one pass over the columns.
+
+    lang is one language code for every line, or one per line (see
+    utils.language.line_languages).
+    """
+    elements = as_document_elements(elements)
+    n = len(elements)
+    if n == 0:
+        return np.empty((0, len(FEATURE_NAMES)))
+    text_len = elements.text_lengths.astype(np.float64)
+    if isinstance(lang, str):
+        if lang in NO_CASE_LANGS:
+            cap_ratio = np.zeros(n)
+        else:
+            cap_ratio = _uppercase_counts(elements) / np.maximum(text_len, 1)
+    else:
+        cap_ratio = _uppercase_counts(elements) / np.maximum(text_len, 1)
+        cap_ratio[np.isin(lang, NO_CASE_LANGS)] = 0.0
+    # Elements carry no page height, so y_pct is the raw top coordinate.
+    y_pct = elements.top
+    return np.column_stack([
+        elements.font_size, elements.is_bold, elements.is_italic, text_len, cap_ratio,
+        elements.whitespace_above, y_pct, _numbering_flags(elements),
+    ]).astype(np.float64)
+
+
+def check_feature_schema(model_data):
+    """Raise ValueError if a model artifact was trained on a different feature schema."""
+    version = model_data.get('feature_schema', 1)
+    if version != FEATURE_SCHEMA_VERSION:
+        raise ValueError(
+            f"Model was trained with feature schema v{version}, but this code builds "
+            f"v{FEATURE_SCHEMA_VERSION}; retrain with src/r1a/train_heading_classifier.py"
+        )
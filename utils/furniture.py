@@ -0,0 +1,111 @@
+"""
+Page furniture: running headers, footers, page numbers and banners.
+
+Each line is fingerprinted by its normalized text (case folded, whitespace
+collapsed, digit runs masked so "Page 3 of 40" and "Page 4 of 40" match)
+plus the vertical band it sits in. A hash index records the pages every
+fingerprint occurs on; lines whose fingerprint recurs on a large fraction
+of the pages around their own are furniture and are skipped by the
+embedding and classifier stages.
+
+Judging each line by a window of pages rather than the whole document lets
+a page-at-a-time caller decide a page once FURNITURE_WINDOW more have been
+seen, with exactly the whole-document result, and catches running headers
+that change from chapter to chapter.
+"""
+
+import re
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, deque
+
+import numpy as np
+
+from utils.elements import as_document_elements
+
+# Height in points of the vertical bands lines are bucketed into
+FURNITURE_BAND = 18.0
+# A line is furniture when its fingerprint occurs on at least this fraction
+# of the pages within FURNITURE_WINDOW pages of its own (clipped to the
+# document), and on no fewer than FURNITURE_MIN_PAGES of them. Documents of
+# up to FURNITURE_WINDOW + 1 pages are thus judged as a whole.
+FURNITURE_PAGE_FRACTION = 0.5
+FURNITURE_MIN_PAGES = 3
+FURNITURE_WINDOW = 8
+
+_DIGITS_RE = re.compile(r'\d+')
+
+
+def fingerprint(text, top):
+    return (_DIGITS_RE.sub('#', ' '.join(text.split()).casefold()), int(top // FURNITURE_BAND))
+
+
+class FurnitureIndex:
+    """Pages each fingerprint occurs on, fed one page at a time.
+
+    After add_page, ready() yields the furniture masks of the pages that
+    can now be decided, oldest first; after finish(), those of all the
+    rest. Only the fingerprints of the pages some pending window still
+    covers are kept.
+    """
+
+    def __init__(self, window=FURNITURE_WINDOW):
+        self.window = window
+        self.n_pages = 0
+        self._pages = defaultdict(deque)  # fingerprint -> page numbers, ascending
+        self._prints = deque()            # fingerprints of the kept pages
+        self._first_kept = 0
+        self._next = 0                    # first page not yet decided
+        self._finished = False
+
+    def add_page(self, lines):
+        """Index the next page."""
+        prints = [fingerprint(text, top) if text.strip() else None
+                  for text, top in zip(lines.texts, lines.top.tolist())]
+        for p in set(prints) - {None}:
+            self._pages[p].append(self.n_pages)
+        self._prints.append(prints)
+        self.n_pages += 1
+
+    def finish(self):
+        """No more pages follow; every remaining page can be decided."""
+        self._finished = True
+
+    def ready(self):
+        """Yield the masks of the pages decided since the last call."""
+        while self._next < self.n_pages and (self._finished or self.n_pages > self._next + self.window):
+            yield self._mask(self._next)
+            self._next += 1
+            self._forget(self._next - self.window)
+
+    def _mask(self, page):
+        lo = max(0, page - self.window)
+        hi = min(self.n_pages - 1, page + self.window)
+        min_pages = max(FURNITURE_MIN_PAGES, FURNITURE_PAGE_FRACTION * (hi - lo + 1))
+        prints = self._prints[page - self._first_kept]
+        mask = np.zeros(len(prints), dtype=bool)
+        for i, p in enumerate(prints):
+            if p is not None:
+                pages = self._pages[p]
+                mask[i] = bisect_right(pages, hi) - bisect_left(pages, lo) >= min_pages
+        return mask
+
+    def _forget(self, before):
+        # Pages before `before` lie outside every window still to be decided
+        while self._first_kept < before:
+            for p in set(self._prints.popleft()) - {None}:
+                pages = self._pages[p]
+                pages.popleft()
+                if not pages:
+                    del self._pages[p]
+            self._first_kept += 1
+
+
+def furniture_mask(elements):
+    """Mark the furniture lines of a whole document."""
+    elements = as_document_elements(elements)
+    index = FurnitureIndex()
+    for start, stop in elements.page_bounds():
+        index.add_page(elements[start:stop])
+    index.finish()
+    masks = list(index.ready())
+    return np.concatenate(masks) if masks else np.zeros(0, dtype=bool)
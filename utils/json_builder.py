@@ -1,7 +1,13 @@
 import json
+import os
 from pathlib import Path
+from utils import metrics
+
+def build_outline(title, outline, degradations=None):
+    # detect_heading_structure returns {"language": ..., "headings": [...]}
+    if isinstance(outline, dict):
+        outline = outline.get("headings", [])
 
-def build_outline_json(pdf_path, title, outline, output_dir):
     # Sort headings by page, then by y-position if available, else as-is
     outline_sorted = sorted(
         outline,
@@ -44,7 +50,33 @@ def build_outline_json(pdf_path, title, outline, output_dir):
         "title": title,
         "outline": hierarchy
     }
+    if degradations:
+        # Cheaper modes used to meet the time budget (see utils/deadline.py)
+        result["degradations"] = list(degradations)
+    return result
+
+def write_json_atomic(path, data, **dump_kwargs):
+    # Write to a sibling temp file and rename it into place, so a crash
+    # never leaves a truncated JSON behind.
+    path = Path(path)
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    try:
+        with metrics.span('write_json'), open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, **dump_kwargs)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+def outline_json_path(pdf_path, output_dir):
+    return Path(output_dir) / f"{Path(pdf_path).stem}.json"
+
+def save_outline_json(pdf_path, result, output_dir):
+    write_json_atomic(outline_json_path(pdf_path, output_dir), result, indent=2)
 
-    output_path = output_dir / f"{Path(pdf_path).stem}.json"
-    with open(output_path, "w") as f:
-        json.dump(result, f, indent=2)
+def build_outline_json(pdf_path, title, outline, output_dir, degradations=None):
+    result = build_outline(title, outline, degradations)
+    save_outline_json(pdf_path, result, output_dir)
+    return result
@@ -0,0 +1,126 @@
+"""
+Language detection by Unicode script.
+
+Most of what the heading rules need to know about a language follows from
+its script: CJK and Devanagari text has no letter case and few or no word
+spaces. A histogram of the letters' scripts settles every non-Latin sample
+without a statistical model: Han and Kana map to 'ja', Devanagari to 'hi',
+Hangul to 'ko' and so on. Only Latin-script samples, where the script says
+nothing about the language, go to langdetect (seeded, so results repeat,
+and cached per sample). Samples with too few letters for langdetect to be
+reliable, such as a page of short headings, are taken as English.
+
+Detection works per page, so a Japanese document with an English appendix
+gets cased-language rules on the appendix pages.
+"""
+
+from functools import lru_cache
+
+import numpy as np
+
+from utils.elements import as_document_elements
+
+# Lines of text a language sample is taken from
+LANG_SAMPLE_LINES = 10
+# Fewer letters than this in its dominant script and a sample has no
+# language of its own
+MIN_SCRIPT_LETTERS = 3
+# Latin samples shorter than this are not worth asking langdetect about
+MIN_STATISTICAL_LETTERS = 40
+DEFAULT_LANGUAGE = 'en'
+
+# (first code point, last code point + 1, script), sorted and disjoint
+_SCRIPT_RANGES = (
+    (0x0041, 0x005B, 'Latin'), (0x0061, 0x007B, 'Latin'), (0x00C0, 0x0250, 'Latin'),
+    (0x0370, 0x0400, 'Greek'), (0x0400, 0x0530, 'Cyrillic'), (0x0590, 0x0600, 'Hebrew'),
+    (0x0600, 0x0700, 'Arabic'), (0x0750, 0x0780, 'Arabic'), (0x0900, 0x0980, 'Devanagari'),
+    (0x0980, 0x0A00, 'Bengali'), (0x0B80, 0x0C00, 'Tamil'), (0x0E00, 0x0E80, 'Thai'),
+    (0x1100, 0x1200, 'Hangul'), (0x1E00, 0x1F00, 'Latin'), (0x3040, 0x3100, 'Kana'),
+    (0x3130, 0x3190, 'Hangul'), (0x31F0, 0x3200, 'Kana'), (0x3400, 0x4DC0, 'Han'),
+    (0x4E00, 0xA000, 'Han'), (0xAC00, 0xD7B0, 'Hangul'), (0xF900, 0xFB00, 'Han'),
+    (0xFF66, 0xFFA0, 'Kana'),
+)
+# Language of every script but Latin
+SCRIPT_LANGUAGES = {
+    'Han': 'ja', 'Kana': 'ja', 'Devanagari': 'hi', 'Hangul': 'ko', 'Bengali': 'bn',
+    'Tamil': 'ta', 'Thai': 'th', 'Arabic': 'ar', 'Hebrew': 'he', 'Greek': 'el',
+    'Cyrillic': 'ru',
+}
+_NON_LATIN_LANGUAGES = frozenset(SCRIPT_LANGUAGES.values())
+
+SCRIPTS = tuple(dict.fromkeys(script for _, _, script in _SCRIPT_RANGES))
+_STARTS = np.array([start for start, _, _ in _SCRIPT_RANGES], dtype=np.uint32)
+_ENDS = np.array([end for _, end, _ in _SCRIPT_RANGES], dtype=np.uint32)
+_RANGE_SCRIPT = np.array([SCRIPTS.index(script) for _, _, script in _SCRIPT_RANGES])
+
+
+def script_counts(text):
+    """Number of letters of every script in SCRIPTS found in text."""
+    if not text:
+        return np.zeros(len(SCRIPTS), dtype=np.int64)
+    codepoints = np.frombuffer(text.encode('utf-32-le', 'surrogatepass'), dtype=np.uint32)
+    index = np.searchsorted(_STARTS, codepoints, side='right') - 1
+    inside = (index >= 0) & (codepoints < _ENDS[np.maximum(index, 0)])
+    return np.bincount(_RANGE_SCRIPT[index[inside]], minlength=len(SCRIPTS))
+
+
+def dominant_script(text):
+    """The script most of text's letters are in, or None if it has too few letters."""
+    counts = script_counts(text)
+    best = int(np.argmax(counts))
+    return SCRIPTS[best] if counts[best] >= MIN_SCRIPT_LETTERS else None
+
+
+@lru_cache(maxsize=1024)
+def _detect_latin(sample):
+    try:
+        from langdetect import DetectorFactory, detect
+        DetectorFactory.seed = 0
+        return detect(sample)
+    except Exception:
+        return DEFAULT_LANGUAGE
+
+
+def detect_language_sample(texts, statistical=True):
+    """Language of the first LANG_SAMPLE_LINES of texts.
+
+    With statistical=False, Latin-script samples are taken as English
+    instead of going to langdetect.
+    """
+    sample = ' '.join(texts[:LANG_SAMPLE_LINES])
+    counts = script_counts(sample)
+    best = int(np.argmax(counts))
+    if counts[best] < MIN_SCRIPT_LETTERS:
+        return DEFAULT_LANGUAGE
+    script = SCRIPTS[best]
+    if script != 'Latin':
+        return SCRIPT_LANGUAGES[script]
+    if not statistical or counts[best] < MIN_STATISTICAL_LETTERS:
+        return DEFAULT_LANGUAGE
+    return _detect_latin(sample)
+
+
+def page_language(lines, document_lang, statistical=True):
+    """Language of one page's lines; document_lang where the page does not tell.
+
+    A Latin page in a Latin-script document keeps the document's language,
+    so langdetect only runs for pages that switch script.
+    """
+    lines = as_document_elements(lines)
+    script = dominant_script(lines.text_buffer)
+    if script is None:
+        return document_lang
+    if script != 'Latin':
+        return SCRIPT_LANGUAGES[script]
+    if document_lang not in _NON_LATIN_LANGUAGES:
+        return document_lang
+    return detect_language_sample([t for t in lines.texts if t.strip()], statistical)
+
+
+def line_languages(elements, document_lang, statistical=True):
+    """page_language of every line, for extract_features."""
+    elements = as_document_elements(elements)
+    langs = np.empty(len(elements), dtype=object)
+    for start, stop in elements.page_bounds():
+        langs[start:stop] = page_language(elements[start:stop], document_lang, statistical)
+    return langs
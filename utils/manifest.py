@@ -0,0 +1,69 @@
+import json
+import logging
+import os
+import time
+from pathlib import Path
+
+MANIFEST_NAME = '.manifest.jsonl'
+# Statuses whose output is kept by the next incremental run
+COMPLETE_STATUSES = ('ok', 'degraded')
+
+
+class Manifest:
+    """Append-only JSON-lines log of processed PDFs, one record per attempt.
+
+    The latest record for a file wins. A document is skipped on the next run
+    only if its last attempt succeeded with the same content hash and
+    pipeline version and its output still exists (has_output, as the
+    caller's output sink reports it). Degraded outputs count as succeeded:
+    the version names the time budgets, so they are redone only when a
+    budget changes, not on every run.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.entries = {}
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # A crash mid-append can leave one partial line
+                        continue
+                    self.entries[record['file']] = record
+
+    def needs_processing(self, pdf, digest, version, has_output):
+        record = self.entries.get(Path(pdf).name)
+        return (record is None
+                or record.get('status') not in COMPLETE_STATUSES
+                or record.get('sha256') != digest
+                or record.get('version') != version
+                or not has_output)
+
+    def record(self, pdf, digest, version, status, seconds, error=None):
+        record = {
+            'file': Path(pdf).name,
+            'sha256': digest,
+            'version': version,
+            'status': status,
+            'seconds': round(seconds, 3),
+            'finished_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        if error:
+            record['error'] = error
+        self.entries[record['file']] = record
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+
+    def compact(self):
+        """Rewrite the log with only the latest record per file."""
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for record in self.entries.values():
+                f.write(json.dumps(record) + '\n')
+        os.replace(tmp_path, self.path)
+        logging.debug(f"Compacted manifest to {len(self.entries)} records")
@@ -0,0 +1,142 @@
+"""
+Lightweight per-stage timing spans and counters.
+
+Instrumentation is off by default: span() then returns a shared no-op
+context manager and count() returns immediately, so the calls left in the
+pipeline cost next to nothing. enable() turns on recording in the current
+process (optionally with tracemalloc peak-memory sampling). Worker
+processes hand their numbers back with collect() after each document and
+the caller merges them into one Metrics for the run, which is written as
+JSON and/or Prometheus text format.
+"""
+
+import json
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from contextlib import contextmanager, nullcontext
+
+import numpy as np
+
+PROMETHEUS_PREFIX = 'r1a'
+
+_NULL_SPAN = nullcontext()
+_registry = None
+
+
+class Metrics:
+    """Span durations, counters and the peak traced memory of one or more documents."""
+
+    def __init__(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        self.spans = defaultdict(list)
+        self.counters = Counter()
+        self.peak_memory = 0
+        self.started = time.time()
+
+    @contextmanager
+    def span(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.spans[name].append(time.perf_counter() - start)
+
+    def snapshot(self):
+        if self.trace_memory and tracemalloc.is_tracing():
+            self.peak_memory = max(self.peak_memory, tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+        return {'spans': dict(self.spans), 'counters': dict(self.counters), 'peak_memory': self.peak_memory}
+
+    def merge(self, snapshot):
+        if not snapshot:
+            return
+        for name, durations in snapshot['spans'].items():
+            self.spans[name].extend(durations)
+        self.counters.update(snapshot['counters'])
+        self.peak_memory = max(self.peak_memory, snapshot['peak_memory'])
+
+    def summary(self):
+        spans = {}
+        for name, durations in sorted(self.spans.items()):
+            values = np.asarray(durations)
+            spans[name] = {
+                'count': len(values),
+                'total_s': round(float(values.sum()), 6),
+                'p50_s': round(float(np.percentile(values, 50)), 6),
+                'p95_s': round(float(np.percentile(values, 95)), 6),
+                'max_s': round(float(values.max()), 6),
+            }
+        result = {
+            'wall_s': round(time.time() - self.started, 3),
+            'spans': spans,
+            'counters': dict(sorted(self.counters.items())),
+        }
+        if self.trace_memory:
+            result['peak_traced_memory_bytes'] = self.peak_memory
+        return result
+
+    def to_prometheus(self, prefix=PROMETHEUS_PREFIX):
+        summary = self.summary()
+        lines = [
+            f'# HELP {prefix}_stage_seconds Time spent per pipeline stage.',
+            f'# TYPE {prefix}_stage_seconds summary',
+        ]
+        for name, stats in summary['spans'].items():
+            label = f'stage="{name}"'
+            lines.append(f'{prefix}_stage_seconds{{{label},quantile="0.5"}} {stats["p50_s"]}')
+            lines.append(f'{prefix}_stage_seconds{{{label},quantile="0.95"}} {stats["p95_s"]}')
+            lines.append(f'{prefix}_stage_seconds_sum{{{label}}} {stats["total_s"]}')
+            lines.append(f'{prefix}_stage_seconds_count{{{label}}} {stats["count"]}')
+        for name, value in summary['counters'].items():
+            lines.append(f'# TYPE {prefix}_{name}_total counter')
+            lines.append(f'{prefix}_{name}_total {value}')
+        if self.trace_memory:
+            lines.append(f'# TYPE {prefix}_peak_traced_memory_bytes gauge')
+            lines.append(f'{prefix}_peak_traced_memory_bytes {self.peak_memory}')
+        lines.append(f'# TYPE {prefix}_run_wall_seconds gauge')
+        lines.append(f'{prefix}_run_wall_seconds {summary["wall_s"]}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, json_path=None, prometheus_path=None):
+        if json_path:
+            with open(json_path, 'w', encoding='utf-8') as f:
+                json.dump(self.summary(), f, indent=2)
+        if prometheus_path:
+            with open(prometheus_path, 'w', encoding='utf-8') as f:
+                f.write(self.to_prometheus())
+
+
+def enable(trace_memory=False):
+    """Start recording in this process; a no-op if already enabled."""
+    global _registry
+    if _registry is None:
+        _registry = Metrics(trace_memory)
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+
+def enabled():
+    return _registry is not None
+
+
+def span(name):
+    """Time the enclosed block under name, when enabled."""
+    if _registry is None:
+        return _NULL_SPAN
+    return _registry.span(name)
+
+
+def count(name, n=1):
+    if _registry is not None:
+        _registry.counters[name] += n
+
+
+def collect():
+    """Return this process's numbers since the last collect() and start afresh (None when disabled)."""
+    global _registry
+    if _registry is None:
+        return None
+    snapshot = _registry.snapshot()
+    _registry = Metrics(_registry.trace_memory)
+    return snapshot
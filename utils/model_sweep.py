@@ -0,0 +1,214 @@
+"""
+Latency-aware model selection for the heading classifier.
+
+sweep() fits one LightGBM candidate per combination of tree count, depth,
+leaf count and feature subset. Early stopping on a set of held-out
+training documents picks each candidate's number of boosting rounds (up
+to its tree count); the candidate is then refit on all of the training
+documents with that many rounds. Every candidate is exported to the
+CompiledForest arrays inference loads, and measured on three axes:
+
+    macro_f1        mean F1 over the heading labels (everything but 'O')
+                    on the validation split
+    ms_per_1k       inference time per 1,000 lines, predicted in
+                    page-sized batches as HeadingStructureBuilder does
+    size_bytes      size of the exported tree arrays on disk
+
+A candidate is on the Pareto front when no other one is at least as good
+on all three and better on one. select() picks the most accurate
+candidate within the latency and size budgets; with none inside them it
+falls back to the fastest.
+
+Feature subsets are trained with the dropped columns held constant, so no
+tree splits on them and the model still takes the full feature matrix.
+"""
+
+import hashlib
+import itertools
+import tempfile
+import time
+import warnings
+from pathlib import Path
+
+import numpy as np
+
+from utils.features import FEATURE_NAMES
+from utils.tree_model import export_lgbm
+
+DEFAULT_TREES = (25, 50, 100, 200)
+DEFAULT_DEPTHS = (3, 5, 7)
+DEFAULT_LEAVES = (7, 15, 31)
+FEATURE_SUBSETS = {
+    'all': FEATURE_NAMES,
+    'no_position': [f for f in FEATURE_NAMES if f != 'y_pct'],
+    'typography': ['font_size', 'is_bold', 'is_italic', 'text_len', 'whitespace_above'],
+}
+DEFAULT_SUBSETS = tuple(FEATURE_SUBSETS)
+# Share of training documents held out for early stopping
+EARLY_STOPPING_FRACTION = 0.2
+EARLY_STOPPING_ROUNDS = 10
+# Lines per predict call when timing (about one page)
+LATENCY_BATCH_LINES = 50
+LATENCY_MIN_LINES = 5000
+LATENCY_REPEAT = 3
+
+
+def early_stopping_rows(documents, fraction=EARLY_STOPPING_FRACTION):
+    """Boolean row mask of the training documents held out for early stopping.
+
+    Documents are picked by a hash of their name (independent of the
+    train/validation split); at least one is held out and at least one kept
+    whenever there are two or more.
+    """
+    def bucket(name):
+        return int(hashlib.sha1(f'early_stopping:{name}'.encode('utf-8')).hexdigest(), 16) % 1000
+
+    n_rows = documents[-1][2] if documents else 0
+    mask = np.zeros(n_rows, dtype=bool)
+    if len(documents) < 2:
+        return mask
+    ranked = sorted(documents, key=lambda doc: bucket(doc[0]))
+    held = [doc for doc in ranked if bucket(doc[0]) < fraction * 1000] or ranked[:1]
+    for _, start, stop in held[:len(documents) - 1]:
+        mask[start:stop] = True
+    return mask
+
+
+def candidates(trees=DEFAULT_TREES, depths=DEFAULT_DEPTHS, leaves=DEFAULT_LEAVES, subsets=DEFAULT_SUBSETS):
+    """Parameter dicts of the grid, skipping leaf counts a depth cannot reach."""
+    grid = []
+    for n_estimators, max_depth, num_leaves, subset in itertools.product(trees, depths, leaves, subsets):
+        if num_leaves > 2 ** max_depth:
+            continue
+        grid.append({'n_estimators': n_estimators, 'max_depth': max_depth,
+                     'num_leaves': num_leaves, 'features': subset})
+    return grid
+
+
+def _with_features(X, subset):
+    dropped = [FEATURE_NAMES.index(f) for f in FEATURE_NAMES if f not in FEATURE_SUBSETS[subset]]
+    if not dropped:
+        return X
+    X = np.array(X, dtype=np.float64)
+    X[:, dropped] = 0.0
+    return X
+
+
+def macro_f1(y_true, y_pred, labels):
+    """Mean F1 over labels (those absent from both truth and prediction are skipped)."""
+    scores = []
+    for label in labels:
+        true, pred = y_true == label, y_pred == label
+        if not true.any() and not pred.any():
+            continue
+        tp = int(np.sum(true & pred))
+        scores.append(2 * tp / (int(true.sum()) + int(pred.sum())))
+    return float(np.mean(scores)) if scores else 0.0
+
+
+def measure_latency(compiled, X, batch_lines=LATENCY_BATCH_LINES, min_lines=LATENCY_MIN_LINES,
+                    repeat=LATENCY_REPEAT):
+    """Milliseconds per 1,000 lines, best of repeat runs over page-sized batches."""
+    if not len(X):
+        return 0.0
+    reps = -(-min_lines // len(X))
+    X = np.ascontiguousarray(np.tile(X, (reps, 1)) if reps > 1 else X, dtype=np.float64)
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for offset in range(0, len(X), batch_lines):
+            compiled.predict_with_proba(X[offset:offset + batch_lines])
+        best = min(best, time.perf_counter() - start)
+    return best * 1e6 / len(X)
+
+
+def _directory_bytes(path):
+    return sum(p.stat().st_size for p in Path(path).iterdir())
+
+
+def boosting_rounds(params, X, y, stop_rows):
+    """Rounds early stopping settles on when the stop_rows of X are held out."""
+    import lightgbm as lgb
+    X = _with_features(X, params['features'])
+    X_fit, y_fit = X[~stop_rows], y[~stop_rows]
+    # LightGBM rejects early-stopping labels it was not trained on
+    known = np.isin(y[stop_rows], np.unique(y_fit))
+    X_stop, y_stop = X[stop_rows][known], y[stop_rows][known]
+    if not len(X_stop) or len(np.unique(y_fit)) < 2:
+        return params['n_estimators']
+    clf = lgb.LGBMClassifier(n_estimators=params['n_estimators'], max_depth=params['max_depth'],
+                             num_leaves=params['num_leaves'], verbose=-1)
+    with warnings.catch_warnings():
+        # eval_set is deprecated in newer LightGBM but the only spelling older ones accept
+        warnings.filterwarnings('ignore', message='.*eval_set.*deprecated')
+        clf.fit(X_fit, y_fit, eval_set=[(X_stop, y_stop)],
+                callbacks=[lgb.early_stopping(EARLY_STOPPING_ROUNDS, verbose=False)])
+    return clf.best_iteration_ or params['n_estimators']
+
+
+def fit_candidate(params, X, y, rounds=None):
+    import lightgbm as lgb
+    clf = lgb.LGBMClassifier(n_estimators=rounds or params['n_estimators'], max_depth=params['max_depth'],
+                             num_leaves=params['num_leaves'], verbose=-1)
+    clf.fit(_with_features(X, params['features']), y)
+    return clf
+
+
+def evaluate_candidate(clf, X_val, y_val, heading_labels, timing_X):
+    """Scores of a fitted candidate: macro_f1, ms_per_1k, size_bytes and trees.
+
+    trees counts every tree of the export, one per class per round.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        compiled = export_lgbm(clf, tmp)
+        size = _directory_bytes(tmp)
+        labels, _ = compiled.predict_with_proba(X_val) if len(X_val) else (np.empty(0), None)
+        ms_per_1k = measure_latency(compiled, timing_X)
+        trees = compiled.meta['num_trees']
+    return {'macro_f1': macro_f1(np.asarray(y_val), np.asarray(labels), heading_labels),
+            'ms_per_1k': ms_per_1k, 'size_bytes': size, 'trees': trees}
+
+
+def pareto_front(results):
+    """Mark each result dict 'pareto' unless another beats it on F1, latency or size without losing on any."""
+    def dominates(a, b):
+        no_worse = (a['macro_f1'] >= b['macro_f1'] and a['ms_per_1k'] <= b['ms_per_1k']
+                    and a['size_bytes'] <= b['size_bytes'])
+        better = (a['macro_f1'] > b['macro_f1'] or a['ms_per_1k'] < b['ms_per_1k']
+                  or a['size_bytes'] < b['size_bytes'])
+        return no_worse and better
+
+    for r in results:
+        r['pareto'] = not any(dominates(other, r) for other in results if other is not r)
+    return results
+
+
+def select(results, max_ms_per_1k=None, max_size_bytes=None):
+    """(best result within the budgets, whether any fit); the fastest one when none does."""
+    fitting = [r for r in results
+               if (max_ms_per_1k is None or r['ms_per_1k'] <= max_ms_per_1k)
+               and (max_size_bytes is None or r['size_bytes'] <= max_size_bytes)]
+    if not fitting:
+        return min(results, key=lambda r: (r['ms_per_1k'], r['size_bytes'])), False
+    return max(fitting, key=lambda r: (r['macro_f1'], -r['ms_per_1k'], -r['size_bytes'])), True
+
+
+def sweep(grid, X, y, X_val, y_val, heading_labels, stop_rows=None, progress=None):
+    """Fit and score every parameter dict of grid; return (results, fitted models).
+
+    stop_rows marks the rows of X held out for early stopping. progress,
+    if given, is called with each result as it is scored.
+    """
+    stop_rows = np.zeros(len(X), dtype=bool) if stop_rows is None else stop_rows
+    timing_X = X_val if len(X_val) else X[:LATENCY_MIN_LINES]
+    results, models = [], []
+    for params in grid:
+        rounds = boosting_rounds(params, X, y, stop_rows)
+        clf = fit_candidate(params, X, y, rounds)
+        result = dict(params, rounds=rounds, **evaluate_candidate(clf, X_val, y_val, heading_labels, timing_X))
+        results.append(result)
+        models.append(clf)
+        if progress:
+            progress(result)
+    pareto_front(results)
+    return results, models
@@ -0,0 +1,282 @@
+"""
+Interchangeable PDF text backends.
+
+Every backend opens a PDF and yields, page by page, the characters the line
+builder in utils.extract_text needs: dicts with text, x0, x1, top, bottom,
+size and fontname in pdfplumber's coordinates (points from the top-left of
+the page's MediaBox).
+
+pdfplumber is the reference. pdfminer drives the same pdfminer.six
+interpreter with a device that keeps only characters (no layout objects,
+paths or images) and produces identical characters in about half the time.
+pdfium reads the text layer through pypdfium2's C text-page API, several
+times faster again; positions, sizes and base font names are rebuilt from
+the glyph origin, matrix and font descent and agree with the reference to
+within a fraction of a point, but text may differ where the two engines
+decode fonts differently. src/r1a/check_backends.py compares them on a set
+of PDFs.
+
+pdfminer.six and pypdfium2 are both dependencies of pdfplumber.
+"""
+
+import ctypes
+from itertools import islice
+
+import pdfplumber
+import pypdfium2
+import pypdfium2.raw as pdfium_c
+from pdfminer.converter import PDFLayoutAnalyzer
+from pdfminer.layout import LTChar
+from pdfminer.pdfdocument import PDFDocument
+from pdfminer.pdfinterp import PDFResourceManager, PDFPageInterpreter
+from pdfminer.pdfpage import PDFPage
+from pdfminer.pdfparser import PDFParser
+
+BACKENDS = ('pdfplumber', 'pdfminer', 'pdfium')
+# Exact by default; pdfium and auto are opt-in since their text can differ
+DEFAULT_BACKEND = 'pdfminer'
+# Backends producing exactly the reference characters
+EXACT_BACKENDS = ('pdfplumber', 'pdfminer')
+# auto: documents with at least this many pages use pdfium, shorter ones
+# the exact pdfminer backend
+AUTO_FAST_MIN_PAGES = 100
+# pdfium drops some word spaces and generates its own; a generated space is
+# kept where the gap it fills is at least this fraction of the font size
+# (tight gaps after dashes and bullets are not word breaks for pdfplumber).
+GENERATED_SPACE_RATIO = 0.23
+
+
+def _page_transform(mediabox, rotation):
+    # pdfplumber reports x offset by the MediaBox origin and top measured
+    # from the (rotated) MediaBox top edge.
+    x0, y0, x1, y1 = mediabox
+    x0, x1 = min(x0, x1), max(x0, x1)
+    y0, y1 = min(y0, y1), max(y0, y1)
+    if rotation % 180 == 90:
+        x0, y0, x1, y1 = y0, x0, y1, x1
+    return y1 - y0, x0, -y0
+
+
+def _char(text, x0, x1, y0, y1, size, fontname, height, mb_x0, mb_top):
+    return {'text': text, 'x0': x0 + mb_x0, 'x1': x1 + mb_x0,
+            'top': height - y1 + mb_top, 'bottom': height - y0 + mb_top,
+            'size': size, 'fontname': fontname}
+
+
+class PdfplumberBackend:
+    name = 'pdfplumber'
+
+    def __init__(self, pdf_path):
+        self._pdf = pdfplumber.open(pdf_path)
+
+    def __len__(self):
+        return len(self._pdf.pages)
+
+    def iter_page_chars(self, start=0, stop=None):
+        """Yield (page number, chars) for pages[start:stop]."""
+        for page in self._pdf.pages[start:stop]:
+            chars = page.chars
+            # Drop the page's cached layout objects before moving on.
+            page.close()
+            yield page.page_number, chars
+
+    def close(self):
+        self._pdf.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PdfminerBackend(PdfplumberBackend):
+    name = 'pdfminer'
+
+    def __init__(self, pdf_path):
+        self._file = open(pdf_path, 'rb')
+        try:
+            document = PDFDocument(PDFParser(self._file))
+            self._pages = list(PDFPage.create_pages(document))
+        except Exception:
+            self._file.close()
+            raise
+        resources = PDFResourceManager(caching=True)
+        self._device = CharDevice(resources)
+        self._interpreter = PDFPageInterpreter(resources, self._device)
+
+    def __len__(self):
+        return len(self._pages)
+
+    def iter_page_chars(self, start=0, stop=None):
+        for number, page in enumerate(islice(self._pages, start, stop), start + 1):
+            self._device.chars = []
+            self._device.mediabox = page.mediabox
+            self._device.rotation = page.rotate
+            self._interpreter.process_page(page)
+            yield number, self._device.chars
+
+    def close(self):
+        self._file.close()
+
+
+class CharDevice(PDFLayoutAnalyzer):
+    """pdfminer device collecting characters as pdfplumber reports them.
+
+    Layout analysis is off and paths and images are dropped unprocessed.
+    """
+
+    def __init__(self, resources):
+        super().__init__(resources, laparams=None)
+        self.chars = []
+        self.mediabox = (0, 0, 0, 0)
+        self.rotation = 0
+
+    def paint_path(self, graphicstate, stroke, fill, evenodd, path):
+        pass
+
+    def render_image(self, name, stream):
+        pass
+
+    def receive_layout(self, ltpage):
+        height, mb_x0, mb_top = _page_transform(self.mediabox, self.rotation)
+        pending = list(ltpage)
+        pending.reverse()
+        while pending:
+            item = pending.pop()
+            if isinstance(item, LTChar):
+                self.chars.append(_char(item.get_text(), item.x0, item.x1, item.y0, item.y1,
+                                        item.size, item.fontname, height, mb_x0, mb_top))
+            elif hasattr(item, '_objs'):
+                # Characters inside Form XObjects (LTFigure), in order
+                pending.extend(reversed(item._objs))
+
+
+class PdfiumBackend(PdfplumberBackend):
+    name = 'pdfium'
+
+    def __init__(self, pdf_path):
+        self._pdf = pypdfium2.PdfDocument(pdf_path)
+
+    def __len__(self):
+        return len(self._pdf)
+
+    def iter_page_chars(self, start=0, stop=None):
+        stop = len(self) if stop is None else min(stop, len(self))
+        for index in range(start, stop):
+            page = self._pdf[index]
+            textpage = page.get_textpage()
+            try:
+                chars = self._page_chars(page, textpage)
+            finally:
+                textpage.close()
+                page.close()
+            yield index + 1, chars
+
+    def _page_chars(self, page, textpage):
+        c = pdfium_c
+        handle = textpage.raw
+        mediabox = page.get_mediabox()
+        rotation = page.get_rotation()
+        height, mb_x0, mb_top = _page_transform(mediabox, rotation)
+        # From unrotated page space to the displayed page, as pdfminer's
+        # PDFPageInterpreter.process_page does it
+        x0, y0, x1, y1 = mediabox
+        ma, mb, mc, md, me, mf = {90: (0, -1, 1, 0, -y0, x1), 180: (-1, 0, 0, -1, x1, y1),
+                                  270: (0, 1, -1, 0, y1, -x0)}.get(rotation, (1, 0, 0, 1, -x0, -y0))
+
+        text = textpage.get_text_range()
+        if len(text) != c.FPDFText_CountChars(handle):
+            # Characters outside the BMP take two code units in the text
+            text = [chr(c.FPDFText_GetUnicode(handle, i)) for i in range(c.FPDFText_CountChars(handle))]
+        box = c.FS_RECTF()
+        origin_x, origin_y = ctypes.c_double(), ctypes.c_double()
+        styles = {}
+        chars = []
+        generated_space = False
+        for i, char in enumerate(text):
+            if char.isspace() and c.FPDFText_IsGenerated(handle, i):
+                # pdfium replaces word spaces with spaces of its own and adds
+                # line breaks; the spaces are judged against the next glyph.
+                generated_space = generated_space or char == ' '
+                continue
+            if char == '\ufffe':
+                # Hyphen pdfium decided was soft
+                char = '-'
+            obj = c.FPDFText_GetTextObject(handle, i)
+            key = bytes(obj)
+            style = styles.get(key)
+            if style is None:
+                style = styles[key] = self._text_object_style(handle, i, obj)
+            fontname, descent, em = style
+            c.FPDFText_GetCharOrigin(handle, i, origin_x, origin_y)
+            c.FPDFText_GetLooseCharBox(handle, i, box)
+            # pdfminer's glyph box runs from the descent to one em above it
+            # and is as wide as the advance, which the loose box gives.
+            lx, ly = box.left, origin_y.value + descent
+            ux, uy = box.right, ly + em
+            px0, px1 = ma * lx + mc * ly + me, ma * ux + mc * uy + me
+            py0, py1 = mb * lx + md * ly + mf, mb * ux + md * uy + mf
+            if px0 > px1:
+                px0, px1 = px1, px0
+            if py0 > py1:
+                py0, py1 = py1, py0
+            # Like pdfminer, size is the box height on the displayed page
+            glyph = {'text': char, 'x0': px0 + mb_x0, 'x1': px1 + mb_x0,
+                     'top': height - py1 + mb_top, 'bottom': height - py0 + mb_top,
+                     'size': py1 - py0, 'fontname': fontname}
+            if generated_space and chars:
+                prev = chars[-1]
+                if (glyph['x0'] - prev['x1'] >= GENERATED_SPACE_RATIO * glyph['size']
+                        and abs(glyph['bottom'] - prev['bottom']) < glyph['size']):
+                    # Zero-width break just before the glyph, so whatever
+                    # pdfium ordered in between stays in front of it
+                    chars.append(dict(glyph, text=' ', x1=glyph['x0']))
+            generated_space = False
+            chars.append(glyph)
+        return chars
+
+    def _text_object_style(self, handle, index, obj):
+        # (base font name, descent, em height) of a text object in page
+        # units, using the matrix of its character at index
+        c = pdfium_c
+        font = c.FPDFTextObj_GetFont(obj)
+        size = ctypes.c_float()
+        c.FPDFTextObj_GetFontSize(obj, size)
+        name = ctypes.create_string_buffer(256)
+        c.FPDFFont_GetBaseFontName(font, name, len(name))
+        descent = ctypes.c_float()
+        c.FPDFFont_GetDescent(font, size, descent)
+        matrix = c.FS_MATRIX()
+        c.FPDFText_GetMatrix(handle, index, matrix)
+        return name.value.decode('utf-8', 'replace'), matrix.d * descent.value, matrix.d * size.value
+
+    def close(self):
+        self._pdf.close()
+
+
+_BACKEND_CLASSES = {cls.name: cls for cls in (PdfplumberBackend, PdfminerBackend, PdfiumBackend)}
+
+
+def count_pages(pdf_path):
+    pdf = pypdfium2.PdfDocument(pdf_path)
+    try:
+        return len(pdf)
+    finally:
+        pdf.close()
+
+
+def resolve_backend(backend, pdf_path=None, n_pages=None):
+    """Name of the backend to use for pdf_path, choosing by page count for 'auto'."""
+    if backend == 'auto':
+        if n_pages is None:
+            n_pages = count_pages(pdf_path)
+        return 'pdfium' if n_pages >= AUTO_FAST_MIN_PAGES else 'pdfminer'
+    if backend not in _BACKEND_CLASSES:
+        raise ValueError(f"Unknown PDF backend {backend!r}; expected 'auto' or one of {BACKENDS}")
+    return backend
+
+
+def open_pdf(pdf_path, backend=DEFAULT_BACKEND):
+    """Open pdf_path with the named backend; use as a context manager."""
+    return _BACKEND_CLASSES[resolve_backend(backend, pdf_path)](pdf_path)
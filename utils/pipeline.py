@@ -0,0 +1,148 @@
+import logging
+from pathlib import Path
+from utils.extract_text import extract_elements, EXTRACTOR_VERSION
+from utils.title_detector import detect_title
+from utils.detect_headings import detect_heading_structure, model_fingerprint
+from utils.features import FEATURE_SCHEMA_VERSION
+from utils.json_builder import build_outline
+from utils.pdf_backends import DEFAULT_BACKEND, EXACT_BACKENDS
+from utils.bookmarks import read_bookmarks, check_bookmarks, bookmarks_to_headings, bookmark_title
+from utils.deadline import Deadline
+from utils import metrics
+
+# Bump whenever a heuristic change alters the outlines produced for the
+# same PDF and model; previously processed documents are then redone.
+PIPELINE_VERSION = 3
+
+# prefer-bookmarks: use a sane embedded /Outlines tree instead of detecting
+#     headings, falling back to detection otherwise.
+# heuristic-only: always detect headings from the page text.
+# verify: like prefer-bookmarks, but also run detection and log how many
+#     bookmarks it recovers.
+OUTLINE_MODES = ('prefer-bookmarks', 'heuristic-only', 'verify')
+DEFAULT_OUTLINE_MODE = 'prefer-bookmarks'
+
+# Values of the source returned by resolve_outline
+SOURCE_BOOKMARKS = 'bookmarks'
+SOURCE_HEURISTIC = 'heuristic'
+SOURCE_REJECTED = 'bookmarks_rejected'
+
+
+def pipeline_version(outline_mode=DEFAULT_OUTLINE_MODE, backend=DEFAULT_BACKEND,
+                     doc_budget=None, batch_budget=None):
+    """Identify everything that determines an outline besides the PDF itself.
+
+    Time budgets are part of it: an outline degraded under one budget is
+    complete for that budget and is only redone when the budget changes.
+    """
+    version = (f"p{PIPELINE_VERSION}.x{EXTRACTOR_VERSION}.f{FEATURE_SCHEMA_VERSION}"
+               f".m-{model_fingerprint()}.o-{outline_mode}")
+    # The exact backends all produce the reference elements
+    if backend not in EXACT_BACKENDS:
+        version += f".b-{backend}"
+    if doc_budget is not None:
+        version += f".t-{doc_budget:g}"
+    if batch_budget is not None:
+        version += f".tb-{batch_budget:g}"
+    return version
+
+
+def _normalize(text):
+    return " ".join(text.split()).casefold()
+
+
+def log_furniture(name, outline):
+    stats = outline.get("furniture")
+    if stats and stats["lines_pruned"]:
+        logging.info(f"{Path(name).name}: skipped {stats['lines_pruned']} header/footer lines, "
+                     f"saving ~{stats['seconds_saved']:.3f}s of embedding and classification")
+
+
+def log_bookmark_agreement(name, bookmark_headings, result):
+    found = set()
+    pending = list(result["outline"])
+    while pending:
+        entry = pending.pop()
+        found.add(_normalize(entry["text"]))
+        pending.extend(entry["children"])
+    matched = sum(1 for h in bookmark_headings if _normalize(h["text"]) in found)
+    logging.info(f"Bookmark check for {name}: heading detection found "
+                 f"{matched} of {len(bookmark_headings)} bookmarked headings")
+
+
+def bookmark_outline(pdf_path, outline_mode=DEFAULT_OUTLINE_MODE, name=None):
+    """Return (outline dict or None, source, bookmark headings) from the PDF's bookmarks.
+
+    The outline is None when text-based detection has to produce it: in
+    heuristic-only mode and when the bookmarks are missing or rejected
+    (source tells which). In verify mode detection still has to run so its
+    agreement can be logged.
+    """
+    if outline_mode not in OUTLINE_MODES:
+        raise ValueError(f"Unknown outline mode {outline_mode!r}; expected one of {OUTLINE_MODES}")
+    name = Path(name or pdf_path).name
+    if outline_mode == 'heuristic-only':
+        return None, SOURCE_HEURISTIC, None
+    try:
+        with metrics.span('bookmarks'):
+            bookmarks = read_bookmarks(pdf_path)
+        if bookmarks is None:
+            return None, SOURCE_HEURISTIC, None
+        metadata_title, entries, n_pages = bookmarks
+        problem = check_bookmarks(entries, n_pages)
+    except Exception as e:
+        # A malformed outline (e.g. a /Next cycle) must not fail the document
+        logging.warning(f"Ignoring bookmarks of {name}: unreadable outline ({type(e).__name__}: {e})")
+        return None, SOURCE_REJECTED, None
+    if problem:
+        logging.info(f"Ignoring bookmarks of {name}: {problem}")
+        return None, SOURCE_REJECTED, None
+    headings = bookmarks_to_headings(entries)
+    return build_outline(bookmark_title(metadata_title, name), headings), SOURCE_BOOKMARKS, headings
+
+
+def resolve_outline(pdf_path, heuristic, outline_mode=DEFAULT_OUTLINE_MODE, name=None):
+    """Return (outline dict, source), reading bookmarks before calling heuristic().
+
+    heuristic is a zero-argument callable running text-based detection; it
+    is only called when the bookmarks are missing or rejected, or in
+    verify mode.
+    """
+    result, source, headings = bookmark_outline(pdf_path, outline_mode, name)
+    if result is None:
+        return heuristic(), source
+    if outline_mode == 'verify':
+        log_bookmark_agreement(Path(name or pdf_path).name, headings, heuristic())
+    return result, source
+
+
+def extract_outline_with_source(pdf_path, name=None, page_workers=1, use_cache=True,
+                                outline_mode=DEFAULT_OUTLINE_MODE, deadline=None,
+                                backend=DEFAULT_BACKEND):
+    """Like extract_outline, but return (outline dict, source)."""
+    deadline = deadline or Deadline()
+
+    def heuristic():
+        with deadline.stage('extract'):
+            elements = extract_elements(pdf_path, workers=page_workers, use_cache=use_cache,
+                                        backend=backend)
+        with deadline.stage('title'):
+            title = detect_title(elements, Path(name or pdf_path))
+        outline = detect_heading_structure(elements, deadline)
+        log_furniture(name or pdf_path, outline)
+        return build_outline(title, outline, deadline.degradations)
+    return resolve_outline(pdf_path, heuristic, outline_mode, name=name)
+
+
+def extract_outline(pdf_path, name=None, page_workers=1, use_cache=True,
+                    outline_mode=DEFAULT_OUTLINE_MODE, deadline=None, backend=DEFAULT_BACKEND):
+    """Run the full pipeline on one PDF and return the outline JSON as a dict.
+
+    name stands in for pdf_path wherever the file name matters (the title
+    fallback), e.g. when the PDF was spooled to a temporary file. With a
+    Deadline, cheaper modes are used as the budget runs out and listed
+    under "degradations" in the result. backend selects the PDF engine
+    (see utils.pdf_backends).
+    """
+    return extract_outline_with_source(pdf_path, name, page_workers, use_cache, outline_mode,
+                                       deadline, backend)[0]
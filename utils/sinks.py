@@ -0,0 +1,184 @@
+"""
+Output sinks for outlines.
+
+json (the default) writes one pretty-printed, atomically replaced JSON file
+per PDF, as save_outline_json always has.
+
+jsonl is for corpora too large for a file per document. Each outline is
+one compact JSON line, {"file": <pdf name>, "title": ..., "outline": ...},
+appended to numbered shard files (outlines-00000.jsonl, ...) that rotate
+every shard_records documents. Records are buffered and written in blocks;
+with gzip every block is one gzip member, so a shard is still a valid
+.jsonl.gz for zcat and friends. After each block, the offset index
+(outlines.index.jsonl) gets one line per document naming its shard, the
+byte offset and length of its record (or of its gzip member, plus the
+line within it). read_jsonl_outline uses the index to fetch a single
+outline without scanning a shard.
+
+A run never appends to an existing shard; it starts the next number. A
+document processed again is appended again and the later index line wins.
+"""
+
+import gzip
+import json
+import os
+from pathlib import Path
+
+from utils.json_builder import outline_json_path, write_json_atomic
+from utils import metrics
+
+OUTPUT_FORMATS = ('json', 'jsonl')
+DEFAULT_OUTPUT_FORMAT = 'json'
+DEFAULT_SHARD_RECORDS = 10000
+# Records are written once this many bytes of them are buffered
+BUFFER_BYTES = 1 << 20
+SHARD_PREFIX = 'outlines-'
+INDEX_NAME = 'outlines.index.jsonl'
+
+
+class JsonFileSink:
+    """One JSON file per PDF in output_dir."""
+
+    def __init__(self, output_dir, **dump_kwargs):
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.dump_kwargs = {'indent': 2, **dump_kwargs}
+
+    def has(self, pdf_path):
+        return outline_json_path(pdf_path, self.output_dir).exists()
+
+    def write(self, pdf_path, result):
+        write_json_atomic(outline_json_path(pdf_path, self.output_dir), result, **self.dump_kwargs)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def load_jsonl_index(output_dir):
+    """{pdf name: index entry} for the jsonl outlines in output_dir."""
+    index = {}
+    path = Path(output_dir) / INDEX_NAME
+    if path.exists():
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A crash mid-append can leave one partial line
+                    continue
+                index[entry['file']] = entry
+    return index
+
+
+def read_jsonl_outline(output_dir, name, index=None):
+    """The outline record of the PDF called name, or None if there is none."""
+    index = load_jsonl_index(output_dir) if index is None else index
+    entry = index.get(Path(name).name)
+    if entry is None:
+        return None
+    with open(Path(output_dir) / entry['shard'], 'rb') as f:
+        f.seek(entry['offset'])
+        data = f.read(entry['length'])
+    if 'line' in entry:
+        data = gzip.decompress(data).split(b'\n')[entry['line']]
+    return json.loads(data)
+
+
+class JsonlSink(JsonFileSink):
+    """Compact records in rotating (optionally gzipped) JSON-lines shards."""
+
+    def __init__(self, output_dir, shard_records=DEFAULT_SHARD_RECORDS, compress=False,
+                 buffer_bytes=BUFFER_BYTES):
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.shard_records = shard_records
+        self.compress = compress
+        self.buffer_bytes = buffer_bytes
+        self.index = load_jsonl_index(self.output_dir)
+        shards = [p.name[len(SHARD_PREFIX):].split('.')[0] for p in self.output_dir.glob(f'{SHARD_PREFIX}*')]
+        self._next_shard = max((int(n) for n in shards if n.isdigit()), default=-1) + 1
+        self._index_file = open(self.output_dir / INDEX_NAME, 'a', encoding='utf-8')
+        self._shard = None
+        self._shard_name = None
+        self._shard_count = 0
+        self._buffer = []
+        self._buffered = 0
+
+    def has(self, pdf_path):
+        return Path(pdf_path).name in self.index
+
+    def write(self, pdf_path, result):
+        name = Path(pdf_path).name
+        record = json.dumps({'file': name, **result}, ensure_ascii=False, separators=(',', ':'))
+        data = record.encode('utf-8') + b'\n'
+        self._buffer.append((name, data))
+        self._buffered += len(data)
+        self._shard_count += 1
+        if self._buffered >= self.buffer_bytes or self._shard_count >= self.shard_records:
+            self.flush()
+
+    def _open_shard(self):
+        suffix = '.jsonl.gz' if self.compress else '.jsonl'
+        self._shard_name = f'{SHARD_PREFIX}{self._next_shard:05d}{suffix}'
+        self._next_shard += 1
+        self._shard = open(self.output_dir / self._shard_name, 'wb')
+
+    def flush(self):
+        """Write the buffered records and their index entries."""
+        if not self._buffer:
+            return
+        with metrics.span('write_json'):
+            if self._shard is None:
+                self._open_shard()
+            offset = self._shard.tell()
+            entries = []
+            if self.compress:
+                member = gzip.compress(b''.join(data for _, data in self._buffer), mtime=0)
+                self._shard.write(member)
+                for line, (name, _) in enumerate(self._buffer):
+                    entries.append({'file': name, 'shard': self._shard_name, 'offset': offset,
+                                    'length': len(member), 'line': line})
+            else:
+                for name, data in self._buffer:
+                    entries.append({'file': name, 'shard': self._shard_name, 'offset': offset,
+                                    'length': len(data)})
+                    offset += len(data)
+                self._shard.write(b''.join(data for _, data in self._buffer))
+            # Records reach the shard before the index points at them
+            self._shard.flush()
+            self._index_file.write(''.join(json.dumps(e) + '\n' for e in entries))
+            self._index_file.flush()
+        self.index.update((e['file'], e) for e in entries)
+        self._buffer, self._buffered = [], 0
+        if self._shard_count >= self.shard_records:
+            self._close_shard()
+
+    def _close_shard(self):
+        if self._shard is not None:
+            os.fsync(self._shard.fileno())
+            self._shard.close()
+            self._shard = None
+        self._shard_count = 0
+
+    def close(self):
+        self.flush()
+        self._close_shard()
+        if not self._index_file.closed:
+            os.fsync(self._index_file.fileno())
+            self._index_file.close()
+
+
+def open_sink(output_format, output_dir, shard_records=DEFAULT_SHARD_RECORDS, compress=False,
+              **dump_kwargs):
+    """Open the sink for output_format; use as a context manager."""
+    if output_format == 'json':
+        return JsonFileSink(output_dir, **dump_kwargs)
+    if output_format == 'jsonl':
+        return JsonlSink(output_dir, shard_records, compress)
+    raise ValueError(f"Unknown output format {output_format!r}; expected one of {OUTPUT_FORMATS}")
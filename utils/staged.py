@@ -0,0 +1,249 @@
+"""
+Staged pipeline with cross-document micro-batching.
+
+Documents flow through three stages connected by bounded queues:
+
+    extract  -> elements, title, language and furniture per document
+                (run_batch, so optionally in a process pool)
+    embed    -> spaCy vectors for the lines of many documents at once
+    classify -> one classifier call over the lines of many documents
+
+The embed and classify stages each gather documents until the batch holds
+batch_lines lines or its first document has waited max_wait seconds, run
+the model once, and scatter the rows back to their documents. Outlines are
+then assembled per document exactly as detect_heading_structure would.
+
+Small documents pay the fixed cost of a spaCy or classifier call once per
+batch instead of once each, which is what raises throughput on corpora of
+many short PDFs. Stages share one process, so per-document time budgets do
+not apply here.
+"""
+
+import logging
+import queue
+import threading
+import time
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+
+from utils.batch import run_batch, POOL_START_METHOD
+from utils.deadline import Deadline
+from utils.detect_headings import (HeadingStructureBuilder, detect_language, embed_texts,
+                                   get_classifier, warm_up)
+from utils.extract_text import extract_elements
+from utils.features import extract_features
+from utils.furniture import furniture_mask
+from utils.language import page_language
+from utils.json_builder import build_outline
+from utils.pdf_backends import DEFAULT_BACKEND
+from utils.pipeline import (bookmark_outline, log_bookmark_agreement, log_furniture,
+                            DEFAULT_OUTLINE_MODE)
+from utils.title_detector import detect_title
+from utils.tree_model import predict_with_proba
+from utils import metrics
+
+DEFAULT_BATCH_LINES = 2048
+DEFAULT_MAX_WAIT = 0.05
+# Documents held between two stages
+QUEUE_DOCUMENTS = 64
+
+_DONE = object()
+
+
+def _prepare_document(pdf, use_cache=True, outline_mode=DEFAULT_OUTLINE_MODE, backend=DEFAULT_BACKEND):
+    """Extract stage: everything per document that needs no model batch."""
+    started = time.time()
+    result, source, bookmark_headings = bookmark_outline(pdf, outline_mode)
+    document = {'pdf': pdf, 'started': started, 'source': source, 'result': result,
+                'bookmark_headings': bookmark_headings}
+    if result is not None and outline_mode != 'verify':
+        return document
+    elements = extract_elements(pdf, use_cache=use_cache, backend=backend)
+    furniture = furniture_mask(elements)
+    texts = [t.strip() for t in elements.texts]
+    document.update(
+        elements=elements,
+        title=detect_title(elements, Path(pdf)),
+        lang=detect_language(elements),
+        furniture=furniture,
+        # As in detect_heading_structure: furniture is blanked, and blank
+        # lines are neither embedded nor classified
+        texts=['' if f else t for t, f in zip(texts, furniture.tolist())],
+    )
+    return document
+
+
+def _needs_models(document):
+    return 'elements' in document and 'error' not in document
+
+
+def _embed_batch(documents):
+    texts = [t for document in documents for t in document['texts']]
+    with metrics.span('embed'):
+        vectors = embed_texts(texts)
+    start = 0
+    for document in documents:
+        stop = start + len(document['texts'])
+        document['vectors'] = vectors[start:stop]
+        start = stop
+
+
+def _classify_batch(documents):
+    clf, label_map = get_classifier()
+    if clf is None:
+        return
+    features, owners = [], []
+    for document in documents:
+        elements = document['elements']
+        has_text = np.fromiter(map(bool, document['texts']), dtype=bool, count=len(elements))
+        # Features are built page by page, as HeadingStructureBuilder does
+        for start, stop in elements.page_bounds():
+            rows = np.flatnonzero(has_text[start:stop])
+            if len(rows):
+                page = elements[start:stop]
+                features.append(extract_features(page, page_language(page, document['lang']))[rows])
+                owners.append((document, rows + start))
+        document['labels'] = ['O'] * len(elements)
+        document['probs'] = [1.0] * len(elements)
+    if not features:
+        return
+    with metrics.span('predict'):
+        predicted, probas = predict_with_proba(clf, np.vstack(features))
+    labels = [label_map.get(idx, 'O') for idx in predicted.tolist()]
+    probs = np.max(probas, axis=1).tolist()
+    offset = 0
+    for document, rows in owners:
+        for row in rows.tolist():
+            document['labels'][row] = labels[offset]
+            document['probs'][row] = probs[offset]
+            offset += 1
+
+
+def _batch_stage(inbox, outbox, process, batch_lines, max_wait):
+    """Gather documents into batches of about batch_lines lines and run process on each."""
+    batch, lines, flush_at = [], 0, None
+
+    def flush():
+        nonlocal batch, lines, flush_at
+        if batch:
+            started = time.perf_counter()
+            try:
+                process(batch)
+            except Exception as e:
+                logging.error(f"Batch of {len(batch)} documents failed: {e}", exc_info=True)
+                for document in batch:
+                    document['error'] = f"{type(e).__name__}: {e}"
+            # Each document's share of the batch, for its furniture estimate
+            share = (time.perf_counter() - started) / max(lines, 1)
+            for document in batch:
+                document['model_seconds'] = document.get('model_seconds', 0.0) + share * len(document['texts'])
+                outbox.put(document)
+        batch, lines, flush_at = [], 0, None
+
+    while True:
+        try:
+            timeout = None if flush_at is None else max(0.0, flush_at - time.monotonic())
+            document = inbox.get(timeout=timeout)
+        except queue.Empty:
+            flush()
+            continue
+        if document is _DONE:
+            flush()
+            outbox.put(_DONE)
+            return
+        if not _needs_models(document):
+            outbox.put(document)
+            continue
+        batch.append(document)
+        lines += len(document['texts'])
+        if flush_at is None:
+            flush_at = time.monotonic() + max_wait
+        if lines >= batch_lines:
+            flush()
+
+
+def _extract_stage(pdf_files, outbox, workers, use_cache, outline_mode, backend):
+    task = partial(_prepare_document, use_cache=use_cache, outline_mode=outline_mode, backend=backend)
+    try:
+        # Models load in the main process; extraction workers need none.
+        # The pool starts while the embed and classify threads run.
+        for pdf, document, error, _ in run_batch(pdf_files, task, workers=workers, initializer=None,
+                                                 start_method=POOL_START_METHOD):
+            outbox.put(document if error is None else {'pdf': pdf, 'started': time.time(), 'error': error})
+    finally:
+        outbox.put(_DONE)
+
+
+def _finish_document(document):
+    pdf = Path(document['pdf'])
+    if document['result'] is not None and 'elements' not in document:
+        result = document['result']
+    else:
+        elements = document['elements']
+        builder = HeadingStructureBuilder(Deadline(), lang=document['lang'])
+        vectors = document.get('vectors')
+        labels = document.get('labels')
+        for start, stop in elements.page_bounds():
+            builder.add_page(elements[start:stop],
+                             None if vectors is None else vectors[start:stop],
+                             document['furniture'][start:stop],
+                             None if labels is None else (labels[start:stop], document['probs'][start:stop]))
+        builder.model_seconds += document.get('model_seconds', 0.0)
+        outline = builder.result()
+        log_furniture(pdf, outline)
+        result = build_outline(document['title'], outline)
+        if document['result'] is not None:
+            log_bookmark_agreement(pdf.name, document['bookmark_headings'], result)
+            result = document['result']
+    metrics.count('documents')
+    metrics.count(f"source_{document['source']}")
+    logging.info(f"Successfully processed: {pdf.name} ({document['source']})")
+    return result
+
+
+def run_staged(pdf_files, workers=1, use_cache=True, outline_mode=DEFAULT_OUTLINE_MODE,
+               backend=DEFAULT_BACKEND, batch_lines=DEFAULT_BATCH_LINES, max_wait=DEFAULT_MAX_WAIT,
+               collect_metrics=False, trace_memory=False):
+    """Process pdf_files through the staged pipeline, yielding (pdf, result, error, seconds).
+
+    Results have the shape process_pdfs expects from a task: (source,
+    degradations, metrics snapshot, outline), so the caller's manifest and metrics
+    handling is shared with run_batch.
+    """
+    if collect_metrics:
+        metrics.enable(trace_memory)
+    warm_up()
+    extracted = queue.Queue(QUEUE_DOCUMENTS)
+    embedded = queue.Queue(QUEUE_DOCUMENTS)
+    classified = queue.Queue(QUEUE_DOCUMENTS)
+    threads = [
+        threading.Thread(target=_extract_stage, name='extract', daemon=True,
+                         args=(pdf_files, extracted, workers, use_cache, outline_mode, backend)),
+        threading.Thread(target=_batch_stage, name='embed', daemon=True,
+                         args=(extracted, embedded, _embed_batch, batch_lines, max_wait)),
+        threading.Thread(target=_batch_stage, name='classify', daemon=True,
+                         args=(embedded, classified, _classify_batch, batch_lines, max_wait)),
+    ]
+    for thread in threads:
+        thread.start()
+    while True:
+        document = classified.get()
+        if document is _DONE:
+            break
+        pdf = document['pdf']
+        error = document.get('error')
+        if error is None:
+            try:
+                result = _finish_document(document)
+            except Exception as e:
+                logging.error(f"Failed to process {Path(pdf).name}: {e}", exc_info=True)
+                error = f"{type(e).__name__}: {e}"
+        seconds = time.time() - document['started']
+        if error:
+            yield pdf, None, error, seconds
+        else:
+            yield pdf, (document['source'], [], metrics.collect(), result), None, seconds
+    for thread in threads:
+        thread.join()
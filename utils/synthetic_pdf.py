@@ -0,0 +1,206 @@
+"""
+Deterministic synthetic PDFs for benchmarks.
+
+Documents are written directly as PDF objects with no third-party
+dependency. Latin text uses the standard 14 fonts; CJK and Devanagari
+text use a Type0/Identity-H font whose glyph ids are the Unicode code
+points, with a ToUnicode map, so extractors recover the text exactly
+(nothing is embedded, so viewers will not render those glyphs). The same
+spec and seed always produce byte-identical files.
+"""
+
+import random
+from pathlib import Path
+
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842  # A4 in points
+MARGIN = 56
+BODY_SIZE, BODY_LEADING = 10, 14
+HEADING_SIZES = {'H1': 18, 'H2': 14, 'H3': 12}
+
+# PDF resource name -> BaseFont
+LATIN_FONTS = {
+    'F1': 'Helvetica', 'F2': 'Helvetica-Bold', 'F3': 'Times-Roman', 'F4': 'Times-Italic',
+}
+UNICODE_FONT = 'F5'
+FONT_MIXES = {
+    'plain': {'body': 'F1', 'heading': 'F2'},
+    'mixed': {'body': 'F3', 'heading': 'F2', 'emphasis': 'F4'},
+}
+
+LATIN_WORDS = (
+    'system data model process result method analysis report section value table figure '
+    'design review project budget schedule team service quality policy approach network '
+    'library proposal digital business plan overview summary objective scope outcome'
+).split()
+CJK_CHARS = '日本語文書見出本文章節概要目的方法結果考察資料情報管理計画設計開発評価'
+CJK_PARTICLES = 'のはをにでとが'
+DEVANAGARI_WORDS = (
+    'भारत सरकार योजना विकास शिक्षा स्वास्थ्य परियोजना रिपोर्ट विवरण उद्देश्य परिणाम '
+    'विश्लेषण सारांश अध्याय खंड'
+).split()
+SCRIPTS = ('latin', 'cjk', 'devanagari')
+
+
+def _words(rng, script, n):
+    if script == 'cjk':
+        # CJK has no spaces; "words" are 2-3 kanji and a kana particle
+        return [''.join(rng.choice(CJK_CHARS) for _ in range(rng.randint(2, 3))) + rng.choice(CJK_PARTICLES)
+                for _ in range(n)]
+    if script == 'devanagari':
+        return [rng.choice(DEVANAGARI_WORDS) for _ in range(n)]
+    return [rng.choice(LATIN_WORDS) for _ in range(n)]
+
+
+def _join(words, script):
+    return ('' if script == 'cjk' else ' ').join(words)
+
+
+def _encode(text, font):
+    if font == UNICODE_FONT:
+        return '<' + ''.join(f'{ord(c):04X}' for c in text) + '>'
+    escaped = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return '(' + escaped.encode('latin-1', 'replace').decode('latin-1') + ')'
+
+
+def _char_width(script, size):
+    # Rough advance per character, only used to wrap lines
+    return size * (1.0 if script == 'cjk' else 0.5)
+
+
+def _page_content(rng, spec, page_no, counters):
+    script = spec['script']
+    fonts = FONT_MIXES[spec['fonts']]
+    columns = spec['columns']
+    gap = 18
+    col_width = (PAGE_WIDTH - 2 * MARGIN - gap * (columns - 1)) / columns
+    ops = []
+
+    def show(font, size, x, y, text):
+        if script != 'latin' and font in LATIN_FONTS and not text.isascii():
+            font = UNICODE_FONT
+        ops.append(f'BT /{font} {size} Tf {x:.2f} {y:.2f} Td {_encode(text, font)} Tj ET')
+
+    # Running header and footer, as on most real documents
+    show(fonts['body'], 8, MARGIN, PAGE_HEIGHT - 30, f'Synthetic document {spec["name"]}')
+    show(fonts['body'], 8, PAGE_WIDTH - MARGIN - 40, 24, f'Page {page_no}')
+
+    for col in range(columns):
+        x = MARGIN + col * (col_width + gap)
+        y = PAGE_HEIGHT - MARGIN - 10
+        while y > MARGIN + 20:
+            if rng.random() < spec['heading_density']:
+                level = rng.choice(('H1', 'H2', 'H2', 'H3', 'H3', 'H3'))
+                counters[level] += 1
+                if level == 'H1':
+                    counters['H2'] = counters['H3'] = 0
+                elif level == 'H2':
+                    counters['H3'] = 0
+                number = {'H1': f"{counters['H1']}.",
+                          'H2': f"{counters['H1']}.{counters['H2']}",
+                          'H3': f"{counters['H1']}.{counters['H2']}.{counters['H3']}"}[level]
+                size = HEADING_SIZES[level]
+                text = number + ' ' + _join(_words(rng, script, rng.randint(2, 5)), script)
+                y -= size * 0.6
+                show(fonts['heading'], size, x, y, text[:int(col_width / _char_width(script, size))])
+                y -= size * 1.4
+                continue
+            # A paragraph of 2-6 body lines
+            per_line = max(1, int(col_width / _char_width(script, BODY_SIZE) / (3 if script == 'cjk' else 8)))
+            for _ in range(rng.randint(2, 6)):
+                if y <= MARGIN + 20:
+                    break
+                font = fonts.get('emphasis', fonts['body']) if rng.random() < 0.05 else fonts['body']
+                show(font, BODY_SIZE, x, y, _join(_words(rng, script, per_line), script))
+                y -= BODY_LEADING
+            y -= BODY_LEADING * 0.5
+    return '\n'.join(ops).encode('latin-1')
+
+
+def _tounicode_cmap():
+    # Identity mapping for the whole BMP, one bfrange per high byte
+    ranges = '\n'.join(f'<{hi:02X}00> <{hi:02X}FF> <{hi:02X}00>' for hi in range(256))
+    return (
+        '/CIDInit /ProcSet findresource begin\n12 dict begin\nbegincmap\n'
+        '/CIDSystemInfo << /Registry (Adobe) /Ordering (UCS) /Supplement 0 >> def\n'
+        '/CMapName /Identity-UCS def\n/CMapType 2 def\n'
+        '1 begincodespacerange\n<0000> <FFFF>\nendcodespacerange\n'
+        f'256 beginbfrange\n{ranges}\nendbfrange\n'
+        'endcmap\nCMapName currentdict /CMap defineresource pop\nend\nend'
+    ).encode('ascii')
+
+
+def _serialize(objects):
+    # objects[i] is the body of object i + 1
+    out = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f'{number} 0 obj\n'.encode('ascii') + body + b'\nendobj\n'
+    xref = len(out)
+    out += f'xref\n0 {len(objects) + 1}\n0000000000 65535 f \n'.encode('ascii')
+    for offset in offsets:
+        out += f'{offset:010d} 00000 n \n'.encode('ascii')
+    out += (f'trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\n'
+            f'startxref\n{xref}\n%%EOF\n').encode('ascii')
+    return bytes(out)
+
+
+def _stream(data):
+    return f'<< /Length {len(data)} >>\nstream\n'.encode('ascii') + data + b'\nendstream'
+
+
+def make_spec(name, pages=10, heading_density=0.08, fonts='plain', columns=1, script='latin', seed=0):
+    """Describe a synthetic document; every field feeds the generator."""
+    if script not in SCRIPTS:
+        raise ValueError(f"Unknown script {script!r}; expected one of {SCRIPTS}")
+    if fonts not in FONT_MIXES:
+        raise ValueError(f"Unknown font mix {fonts!r}; expected one of {tuple(FONT_MIXES)}")
+    return {'name': name, 'pages': pages, 'heading_density': heading_density, 'fonts': fonts,
+            'columns': columns, 'script': script, 'seed': seed}
+
+
+def render_pdf(spec):
+    """Return the PDF bytes for a spec from make_spec."""
+    rng = random.Random(f"{spec['name']}:{spec['seed']}")
+    counters = {'H1': 0, 'H2': 0, 'H3': 0}
+    # 1 catalog, 2 pages, 3-7 fonts, 8 CID font, 9 ToUnicode, then pairs of
+    # (page, content) objects.
+    n_fixed = 9
+    page_ids = [n_fixed + 1 + 2 * i for i in range(spec['pages'])]
+    font_refs = ' '.join(f'/{name} {3 + i} 0 R' for i, name in enumerate([*LATIN_FONTS, UNICODE_FONT]))
+    objects = [
+        b'<< /Type /Catalog /Pages 2 0 R >>',
+        (f'<< /Type /Pages /Count {len(page_ids)} /Kids [{" ".join(f"{p} 0 R" for p in page_ids)}] >>'
+         ).encode('ascii'),
+    ]
+    for base_font in LATIN_FONTS.values():
+        objects.append(f'<< /Type /Font /Subtype /Type1 /BaseFont /{base_font} '
+                       f'/Encoding /WinAnsiEncoding >>'.encode('ascii'))
+    objects.append(b'<< /Type /Font /Subtype /Type0 /BaseFont /SyntheticUnicode /Encoding /Identity-H '
+                   b'/DescendantFonts [8 0 R] /ToUnicode 9 0 R >>')
+    objects.append(b'<< /Type /Font /Subtype /CIDFontType2 /BaseFont /SyntheticUnicode '
+                   b'/CIDSystemInfo << /Registry (Adobe) /Ordering (Identity) /Supplement 0 >> '
+                   b'/FontDescriptor << /Type /FontDescriptor /FontName /SyntheticUnicode /Flags 4 '
+                   b'/FontBBox [0 -200 1000 900] /ItalicAngle 0 /Ascent 880 /Descent -120 '
+                   b'/CapHeight 700 /StemV 80 >> /DW 1000 /CIDToGIDMap /Identity >>')
+    objects.append(_stream(_tounicode_cmap()))
+    for page_no, page_id in enumerate(page_ids, start=1):
+        objects.append(f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] '
+                       f'/Resources << /Font << {font_refs} >> >> /Contents {page_id + 1} 0 R >>'
+                       .encode('ascii'))
+        objects.append(_stream(_page_content(rng, spec, page_no, counters)))
+    return _serialize(objects)
+
+
+def write_corpus(specs, directory):
+    """Write each spec as <name>.pdf under directory, skipping identical files."""
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for spec in specs:
+        path = directory / f"{spec['name']}.pdf"
+        data = render_pdf(spec)
+        if not path.exists() or path.read_bytes() != data:
+            path.write_bytes(data)
+        paths.append(path)
+    return paths
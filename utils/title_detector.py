@@ -1,20 +1,33 @@
+from itertools import islice
 from pathlib import Path
+import numpy as np
+from utils.elements import DocumentElements
+
+# Only the opening lines of a document are considered for the title, so
+# streaming callers can stop buffering once they have this many.
+TITLE_WINDOW = 10
 
 def detect_title(elements, pdf_path):
-    if not elements:
+    if isinstance(elements, DocumentElements):
+        head = elements[:TITLE_WINDOW]
+    else:
+        head = DocumentElements.from_records(islice(elements, TITLE_WINDOW))
+    if not len(head):
         return Path(pdf_path).stem.replace("_", " ").title()
 
     # Look at the top 5 lines with the largest fonts
-    top = sorted(elements[:10], key=lambda e: -e["font_size"])
+    order = np.argsort(-head.font_size, kind="stable")
     title_lines = []
     used_fonts = set()
 
-    for el in top:
+    for i in order.tolist():
         if len(title_lines) >= 2:
             break
-        if el["font_size"] not in used_fonts and len(el["text"].split()) >= 2:
-            title_lines.append(el["text"].strip())
-            used_fonts.add(el["font_size"])
+        font_size = float(head.font_size[i])
+        text = head.text(i)
+        if font_size not in used_fonts and len(text.split()) >= 2:
+            title_lines.append(text.strip())
+            used_fonts.add(font_size)
 
     title = " ".join(title_lines)
-    return title.strip() + "  "  # match expected spacing
+    return title.strip() + "  "  # match expected spacing
\ No newline at end of file
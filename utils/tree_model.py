@@ -0,0 +1,179 @@
+import json
+import numpy as np
+from pathlib import Path
+
+# Layout of the exported tree arrays; bump on any incompatible change.
+COMPILED_FORMAT_VERSION = 1
+
+_ARRAYS = ('feature', 'threshold', 'left', 'right', 'default_left', 'missing_type', 'value', 'roots')
+# LightGBM missing_type values
+MISSING_NONE, MISSING_ZERO, MISSING_NAN = 0, 1, 2
+_MISSING_TYPES = {'None': MISSING_NONE, 'Zero': MISSING_ZERO, 'NaN': MISSING_NAN}
+ZERO_THRESHOLD = 1e-35
+
+
+class CompiledForest:
+    """LightGBM tree ensemble stored as flat NumPy arrays.
+
+    Every node of every tree is one row: split feature (-1 for leaves),
+    threshold, child indices, missing-value handling and leaf value. All
+    trees are walked together one level at a time, so a prediction for the
+    whole feature matrix costs max_depth vectorized steps. No lightgbm
+    import is needed.
+    """
+
+    def __init__(self, arrays, meta):
+        for name in _ARRAYS:
+            setattr(self, name, arrays[name])
+        self.meta = meta
+        self.num_class = meta['num_class']
+        self.max_depth = meta['max_depth']
+        self.classes_ = np.asarray(meta['classes'])
+        # Leaves point to themselves, so walking a fixed max_depth steps with
+        # any split feature leaves every row on its leaf.
+        self._split_feature = np.maximum(self.feature, 0)
+        self._children = np.column_stack([self.left, self.right]).ravel()
+        self._has_zero_missing = bool(np.any(np.asarray(self.missing_type) == MISSING_ZERO))
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        path = Path(path)
+        with open(path / 'meta.json', 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get('format_version') != COMPILED_FORMAT_VERSION:
+            raise ValueError(f"Unsupported compiled model format {meta.get('format_version')} in {path}")
+        mode = 'r' if mmap else None
+        arrays = {name: np.load(path / f'{name}.npy', mmap_mode=mode) for name in _ARRAYS}
+        return cls(arrays, meta)
+
+    def _go_left(self, x, node):
+        missing_type = self.missing_type[node]
+        is_nan = np.isnan(x)
+        # Except for NaN-type splits, LightGBM treats NaN as 0.0
+        x = np.where(is_nan & (missing_type != MISSING_NAN), 0.0, x)
+        is_missing = np.where(missing_type == MISSING_ZERO, np.abs(x) <= ZERO_THRESHOLD,
+                              (missing_type == MISSING_NAN) & is_nan)
+        return np.where(is_missing, self.default_left[node], x <= self.threshold[node])
+
+    def raw_scores(self, X):
+        X = np.ascontiguousarray(X, dtype=np.float64)
+        n_rows, n_trees = len(X), len(self.roots)
+        node = np.tile(np.asarray(self.roots, dtype=np.int64), (n_rows, 1))
+        row_offset = (np.arange(n_rows) * X.shape[1])[:, None]
+        flat_X = X.ravel()
+        # Missing-value routing only matters for NaN inputs or Zero-type splits
+        check_missing = self._has_zero_missing or bool(np.isnan(flat_X).any())
+        for _ in range(self.max_depth):
+            x = flat_X[row_offset + self._split_feature[node]]
+            if check_missing:
+                go_left = self._go_left(x, node)
+            else:
+                go_left = x <= self.threshold[node]
+            node = self._children[2 * node + ~go_left]
+        values = self.value[node]
+        per_iteration = 1 if self.num_class <= 2 else self.num_class
+        return values.reshape(n_rows, n_trees // per_iteration, per_iteration).sum(axis=1)
+
+    def predict_with_proba(self, X):
+        """Return (predicted classes, class probabilities) from a single pass."""
+        raw = self.raw_scores(X)
+        if self.num_class <= 2:
+            p = 1.0 / (1.0 + np.exp(-self.meta.get('sigmoid', 1.0) * raw[:, 0]))
+            proba = np.column_stack([1.0 - p, p])
+        else:
+            shifted = np.exp(raw - raw.max(axis=1, keepdims=True))
+            proba = shifted / shifted.sum(axis=1, keepdims=True)
+        return self.classes_[np.argmax(proba, axis=1)], proba
+
+    def predict_proba(self, X):
+        return self.predict_with_proba(X)[1]
+
+    def predict(self, X):
+        return self.predict_with_proba(X)[0]
+
+
+def predict_with_proba(model, X):
+    """Labels and probabilities in one pass, for compiled or sklearn-style models."""
+    if isinstance(model, CompiledForest):
+        return model.predict_with_proba(X)
+    proba = model.predict_proba(X)
+    return model.classes_[np.argmax(proba, axis=1)], proba
+
+
+def _flatten_tree(tree, columns):
+    def visit(node, depth):
+        idx = len(columns['feature'])
+        for name in ('feature', 'threshold', 'left', 'right', 'default_left', 'missing_type', 'value'):
+            columns[name].append(0)
+        if 'leaf_value' in node:
+            columns['feature'][idx] = -1
+            columns['value'][idx] = node['leaf_value']
+            columns['left'][idx] = columns['right'][idx] = idx
+            return depth
+        if node['decision_type'] != '<=':
+            raise ValueError(f"Unsupported split type {node['decision_type']!r} (categorical features?)")
+        columns['feature'][idx] = node['split_feature']
+        columns['threshold'][idx] = node['threshold']
+        columns['default_left'][idx] = node['default_left']
+        columns['missing_type'][idx] = _MISSING_TYPES[node['missing_type']]
+        columns['left'][idx] = len(columns['feature'])
+        left_depth = visit(node['left_child'], depth + 1)
+        columns['right'][idx] = len(columns['feature'])
+        right_depth = visit(node['right_child'], depth + 1)
+        return max(left_depth, right_depth)
+
+    return visit(tree['tree_structure'], 0)
+
+
+def export_lgbm(clf, path, **extra_meta):
+    """Write a fitted LGBMClassifier as a CompiledForest directory and return it."""
+    dump = clf.booster_.dump_model()
+    objective, *params = dump['objective'].split()
+    if objective not in ('binary', 'multiclass'):
+        raise ValueError(f"Unsupported objective {objective!r}")
+    params = dict(p.split(':', 1) for p in params if ':' in p)
+    columns = {name: [] for name in ('feature', 'threshold', 'left', 'right',
+                                     'default_left', 'missing_type', 'value')}
+    roots, max_depth = [], 0
+    for tree in dump['tree_info']:
+        roots.append(len(columns['feature']))
+        max_depth = max(max_depth, _flatten_tree(tree, columns))
+
+    arrays = {
+        'feature': np.array(columns['feature'], dtype=np.int32),
+        'threshold': np.array(columns['threshold'], dtype=np.float64),
+        'left': np.array(columns['left'], dtype=np.int32),
+        'right': np.array(columns['right'], dtype=np.int32),
+        'default_left': np.array(columns['default_left'], dtype=bool),
+        'missing_type': np.array(columns['missing_type'], dtype=np.int8),
+        'value': np.array(columns['value'], dtype=np.float64),
+        'roots': np.array(roots, dtype=np.int32),
+    }
+    meta = {
+        'format_version': COMPILED_FORMAT_VERSION,
+        'num_class': int(dump['num_class']) if objective == 'multiclass' else 2,
+        'classes': np.asarray(clf.classes_).tolist(),
+        'max_depth': max_depth,
+        'num_trees': len(roots),
+        'sigmoid': float(params.get('sigmoid', 1.0)),
+        **extra_meta,
+    }
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(path / f'{name}.npy', array)
+    with open(path / 'meta.json', 'w', encoding='utf-8') as f:
+        json.dump(meta, f, indent=2)
+    return CompiledForest(arrays, meta)
+
+
+def check_compiled_model(clf, compiled, X, atol=1e-6):
+    """Raise ValueError unless compiled predictions match the original model on X."""
+    expected_proba = clf.predict_proba(X)
+    labels, proba = compiled.predict_with_proba(X)
+    if not np.array_equal(labels, clf.predict(X)):
+        raise ValueError('Compiled model labels differ from the LightGBM model')
+    max_diff = float(np.max(np.abs(proba - expected_proba))) if len(X) else 0.0
+    if max_diff > atol:
+        raise ValueError(f'Compiled model probabilities differ by up to {max_diff:.2e}')
+    return max_diff
@@ -0,0 +1,200 @@
+"""
+Weak labels for the annotation tools.
+
+weak_label_document runs the outline pipeline (bookmarks when sane, else
+heuristics plus the classifier) on a raw PDF and writes three files to the
+weak directory, named after the PDF:
+
+    <stem>.json           weak gold outline, in the format of data/gold,
+                          with a confidence per entry and the source PDF's
+                          sha256 and pipeline version
+    <stem>.csv            every line pre-filled with its weak label, most
+                          uncertain first, for annotate.py / label_ui.py
+    <stem>.elements.npz   the extracted lines, so importing the edited CSV
+                          does not parse the PDF again
+
+Lines get labels exactly as training derives them from a gold outline
+(utils.dataset.get_labels). A line's confidence is the classifier's
+probability for that label when a model is trained, which also flags
+lines the heuristics labelled against its judgement. The probabilities
+come from the detection pass itself; lines it does not score (furniture,
+blank lines) keep the outline's confidence. Without a model it
+is typographic: body-text lines labelled as headings, and short larger or
+bold lines labelled O, are the doubtful ones. Documents whose PDF and
+pipeline version are unchanged are skipped.
+"""
+
+import csv
+import json
+from pathlib import Path
+
+import numpy as np
+
+from utils.cache import file_digest
+from utils.dataset import get_labels, load_gold_headings, normalize_heading_text
+from utils.detect_headings import detect_heading_structure, detect_language, get_classifier
+from utils.elements import DocumentElements
+from utils.extract_text import extract_elements
+from utils.features import extract_features
+from utils.json_builder import build_outline, write_json_atomic
+from utils.language import line_languages
+from utils.pipeline import pipeline_version, resolve_outline, DEFAULT_OUTLINE_MODE
+from utils.title_detector import detect_title
+from utils.tree_model import predict_with_proba
+
+# Bump when the weak files change; older ones are rebuilt
+WEAK_VERSION = 2
+DEFAULT_WEAK_DIR = 'data/weak'
+CSV_COLUMNS = ['idx', 'page', 'confidence', 'text', 'level']
+# Lines below this confidence count as uncertain in the review summary
+UNCERTAIN_BELOW = 0.6
+# Lines with more words than this never look like headings
+HEADING_MAX_WORDS = 12
+
+
+def weak_paths(pdf_path, weak_dir=DEFAULT_WEAK_DIR):
+    stem = Path(weak_dir) / Path(pdf_path).stem
+    return {'json': stem.with_suffix('.json'), 'csv': stem.with_suffix('.csv'),
+            'elements': stem.with_name(stem.name + '.elements.npz')}
+
+
+def weak_version(outline_mode=DEFAULT_OUTLINE_MODE):
+    return f"{pipeline_version(outline_mode)}.w{WEAK_VERSION}"
+
+
+def _read_source(json_path):
+    try:
+        with open(json_path, 'r', encoding='utf-8') as f:
+            return json.load(f).get('source', {})
+    except (OSError, ValueError):
+        return {}
+
+
+def flatten_outline(outline):
+    """Outline entries (nested under children or not) as a flat list, in document order."""
+    flat = []
+    pending = list(outline)
+    while pending:
+        entry = pending.pop(0)
+        flat.append({'level': entry['level'], 'text': entry['text'], 'page': entry['page'],
+                     'confidence': entry.get('confidence', 1.0)})
+        pending[:0] = entry.get('children', [])
+    return flat
+
+
+def line_confidences(elements, labels, gold, probabilities=None):
+    """Confidence in each line's weak label.
+
+    probabilities are the class probabilities of the detection pass
+    (detect_heading_structure with keep_probabilities); without them, as
+    for bookmarked outlines, the classifier scores the lines here.
+    """
+    confidence = {(normalize_heading_text(h['text']), h['page']): h['confidence'] for h in gold['outline']}
+    scores = np.array([confidence.get((normalize_heading_text(text), page), 1.0)
+                       for text, page in zip(elements.texts, elements.page.tolist())])
+    if not len(elements):
+        return scores
+    clf, label_map = get_classifier()
+    if clf is None:
+        return np.minimum(scores, _typographic_confidences(elements, labels))
+    probas = probabilities
+    if probas is None:
+        features = extract_features(elements, line_languages(elements, detect_language(elements)))
+        _, probas = predict_with_proba(clf, features)
+    column = {label: idx for idx, label in label_map.items()}
+    scored = ~np.isnan(probas).any(axis=1)
+    known = np.array([label in column for label in labels]) & scored
+    if known.any():
+        rows = np.flatnonzero(known)
+        scores[rows] = probas[rows, [column[labels[row]] for row in rows.tolist()]]
+    return scores
+
+
+def _typographic_confidences(elements, labels):
+    # How much each line looks like a heading: 0, 0.5 or 1 for being
+    # larger than the body text and for being bold, if it is short enough
+    sizes = np.round(elements.font_size, 1)
+    values, counts = np.unique(sizes, return_counts=True)
+    body_size = values[np.argmax(counts)]
+    short = np.array([0 < len(t.split()) <= HEADING_MAX_WORDS for t in elements.texts])
+    looks = ((sizes > body_size).astype(float) + elements.is_bold.astype(bool)) / 2 * short
+    is_heading = np.array([label != 'O' for label in labels])
+    return np.where(is_heading, 0.5 + looks / 2, 1.0 - looks / 2)
+
+
+def write_review_csv(elements, labels, confidences, csv_path):
+    """Write every line with its weak label, least confident first."""
+    order = np.argsort(confidences, kind='stable')
+    texts = elements.texts
+    pages = elements.page.tolist()
+    tmp_path = Path(csv_path).with_name(f'.{Path(csv_path).name}.tmp')
+    with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_COLUMNS)
+        for i in order.tolist():
+            writer.writerow([i, pages[i], f'{confidences[i]:.3f}', texts[i], labels[i]])
+    tmp_path.replace(csv_path)
+
+
+def read_review_csv(csv_path, n_lines=None):
+    """Labels by line index from an exported CSV, whatever its row order."""
+    labels = {}
+    with open(csv_path, 'r', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            labels[int(row['idx'])] = row.get('level') or 'O'
+    n_lines = max(labels, default=-1) + 1 if n_lines is None else n_lines
+    return [labels.get(i, 'O') for i in range(n_lines)]
+
+
+def load_elements(pdf_path, weak_dir=DEFAULT_WEAK_DIR, use_cache=True):
+    """The PDF's lines from its weak files when they match the PDF, else extracted."""
+    paths = weak_paths(pdf_path, weak_dir)
+    if paths['elements'].exists() and _read_source(paths['json']).get('sha256') == file_digest(pdf_path):
+        return DocumentElements.load(paths['elements'])
+    return extract_elements(pdf_path, use_cache=use_cache)
+
+
+def weak_label_document(pdf_path, weak_dir=DEFAULT_WEAK_DIR, use_cache=True,
+                        outline_mode=DEFAULT_OUTLINE_MODE, force=False, uncertain_below=UNCERTAIN_BELOW):
+    """Write the weak files of one PDF and return its review summary.
+
+    When the files are already up to date, the stored summary is returned
+    (status 'cached') and nothing is rewritten.
+    """
+    pdf_path = Path(pdf_path)
+    paths = weak_paths(pdf_path, weak_dir)
+    digest = file_digest(pdf_path)
+    version = weak_version(outline_mode)
+    source = _read_source(paths['json'])
+    if (not force and source.get('sha256') == digest and source.get('version') == version
+            and all(p.exists() for p in paths.values())):
+        return dict(source['review'], status='cached')
+
+    elements = extract_elements(pdf_path, use_cache=use_cache)
+    detected = {}
+
+    def heuristic():
+        outline = detect_heading_structure(elements, keep_probabilities=True)
+        detected['probabilities'] = outline['probabilities']
+        return build_outline(detect_title(elements, pdf_path), outline)
+
+    result, outline_source = resolve_outline(pdf_path, heuristic, outline_mode)
+    gold = {'title': result['title'], 'outline': flatten_outline(result['outline']),
+            'source': {'file': pdf_path.name, 'sha256': digest, 'version': version,
+                       'outline': outline_source}}
+    labels = get_labels(elements, load_gold_headings(gold))
+    confidences = line_confidences(elements, labels, gold, detected.get('probabilities'))
+    gold['source']['review'] = {
+        'file': pdf_path.name, 'lines': len(elements), 'headings': len(gold['outline']),
+        'uncertain': int((confidences < uncertain_below).sum()),
+        'min_confidence': round(float(confidences.min()), 3) if len(confidences) else 1.0,
+    }
+
+    Path(weak_dir).mkdir(parents=True, exist_ok=True)
+    tmp_elements = paths['elements'].with_name(f".{paths['elements'].name}.tmp.npz")
+    elements.save(tmp_elements)
+    tmp_elements.replace(paths['elements'])
+    write_review_csv(elements, labels, confidences, paths['csv'])
+    # Written last: its source record is what marks the files as complete
+    write_json_atomic(paths['json'], gold, indent=2, ensure_ascii=False)
+    return dict(gold['source']['review'], status='labelled')